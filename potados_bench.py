@@ -0,0 +1,112 @@
+if __name__ == "__main__":
+    import sys
+    import os
+    sys.path.append(os.getcwd())
+
+import os
+import sys
+import typing
+import time
+import argparse
+import subprocess
+from bitvec import Binary
+from potados_emulator import POTADOS_EMULATOR, BatchPotados
+
+# Benchmarks of emulator execution modes. Run with
+# python potados_bench.py
+# from \Lord-s-asm-for-mc\profiles\potados\
+
+def loop_program(iterations: int) -> dict:
+    return {
+        0: int(Binary("00 00000000 00000000 0001", 22)),                       # mov reg[1], 0
+        1: int(Binary("00" + format(iterations, '016b') + "0010", 22)),        # mov reg[2], iterations
+        2: int(Binary("01 001 0011 0 00000001 0011", 22)),                     # add reg[3], reg[3], reg[1]
+        3: int(Binary("01 011 0011 01000 0001 0100", 22)),                     # xor reg[4], reg[3], reg[1]
+        4: int(Binary("10 111 0010 0 11111110 0010", 22)),                     # jne reg[1]++, reg[2], -2
+        5: POTADOS_EMULATOR.INTERUPT_0_AS_INT,
+    }
+
+def float_program(iterations: int) -> dict:
+    return {
+        0: int(Binary("00 00000000 00000001 0001", 22)),                       # mov reg[1], 1
+        1: int(Binary("00" + format(iterations, '016b') + "0010", 22)),        # mov reg[2], iterations
+        2: int(Binary("01 000 0000 00110 0001 0011", 22)),                     # itof reg[3], reg[1]
+        3: int(Binary("01 000 0011 00001 0011 0100", 22)),                     # fadd reg[4], reg[3], reg[3]
+        4: int(Binary("01 000 0011 00100 0100 0101", 22)),                     # fdiv reg[5], reg[4], reg[3]
+        5: int(Binary("01 000 0000 00101 0101 0110", 22)),                     # ftoi reg[6], reg[5]
+        6: int(Binary("10 111 0010 0 11111100 0010", 22)),                     # jne reg[1]++, reg[2], -4
+        7: POTADOS_EMULATOR.INTERUPT_0_AS_INT,
+    }
+
+PROGRAMS: typing.Dict[str, typing.Callable[[int], dict]] = {
+    'loop': loop_program,
+    'float': float_program,
+}
+
+def make_emulator(program: dict, trace: bool, blocks: bool) -> POTADOS_EMULATOR:
+    potados = POTADOS_EMULATOR()
+    if not trace:
+        potados.disable_disassembly_trace()
+    if not blocks:
+        potados.disable_block_translation()
+    potados.rom.program_rom(program)
+    return potados
+
+def measure(run: typing.Callable[[], int], repeat: int) -> float:
+    """Returns best instructions per second of `repeat` runs (`run` returns number of executed instructions)"""
+    best = 0.0
+    for _ in range(repeat):
+        start = time.perf_counter()
+        ticks = run()
+        best = max(best, ticks / (time.perf_counter() - start))
+    return best
+
+def bench_modes(program: dict, repeat: int) -> typing.Dict[str, float]:
+    results = {}
+    for name, trace, blocks in (('trace', True, False), ('fast', False, False), ('blocks', False, True)):
+        results[name] = measure(lambda: make_emulator(program, trace, blocks).run(10**8).ticks, repeat)
+    return results
+
+def bench_batch(program: dict, machines: int, repeat: int) -> float:
+    def run() -> int:
+        batch = BatchPotados(machines)
+        batch.program_rom(program)
+        batch.run(10**8)
+        return int(batch.ticks.sum())
+    return measure(run, repeat)
+
+def bench_startup(repeat: int) -> float:
+    """Returns best wall time (seconds) of `import potados_emulator` in fresh interpreter, minus bare interpreter start"""
+    def best(code: str) -> float:
+        times = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            subprocess.run([sys.executable, '-c', code], check=True, cwd=os.path.dirname(os.path.abspath(__file__)))
+            times.append(time.perf_counter() - start)
+        return min(times)
+    return best('import potados_emulator') - best('pass')
+
+def main(argv: typing.Optional[typing.List[str]] = None):
+    parser = argparse.ArgumentParser(description='PotaDOS emulator benchmarks')
+    parser.add_argument('--iterations', type=int, default=20000, help='loop iterations of each program')
+    parser.add_argument('--machines', type=int, default=1024, help='machines run by `BatchPotados`')
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--startup', action='store_true', help='only measure import time of the emulator')
+    args = parser.parse_args(argv)
+
+    print(f'startup: import potados_emulator {bench_startup(max(args.repeat, 5)) * 1e3:.1f} ms')
+    if args.startup:
+        return
+
+    for name, make_program in PROGRAMS.items():
+        program = make_program(args.iterations)
+        results = bench_modes(program, args.repeat)
+        results['batch'] = bench_batch(make_program(args.iterations // 100), args.machines, args.repeat)
+
+        print(f'{name}:')
+        for mode, speed in results.items():
+            print(f'    {mode:<8} {speed / 1e6:8.3f} MIPS')
+        print(f'    trace overhead over fast dispatch: {(results["fast"] / results["trace"] - 1) * 100:.1f}%')
+
+if __name__ == "__main__":
+    main()
@@ -4,19 +4,547 @@ if __name__ == "__main__":
     sys.path.append(os.getcwd())
 
 import typing
+import enum
+import sys
+import time
+import struct
+import operator
+import heapq
+import re
+from array import array
 from bitvec import Binary, arithm as ops
-from bitvec.alias import  u16, i16, u4, u6
+from bitvec.alias import  u16, i16
 import core.config as config
 import core.error as error
 import core.emulate as emulate
 import numpy as np
-import unittest
-from core.profile.profile import load_profile_from_file
+import os
+
+# Assembler, process pool, shared memory and profile cache are imported where they are used - 
+# plain `import potados_emulator` (e.g. by `core.emulate`) pays only for numpy and bitvec
+
+PROFILE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'potados.jsonc')
+COMPILED_PROFILE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'potados.profile.pickle')
+
+class StopReason(enum.Enum):
+    HALTED = "halted"          # `int 0` was executed (or emulator was not running)
+    BREAKPOINT = "breakpoint"  # pc reached one of breakpoints
+    UNTIL = "until"            # `until` predicate returned True
+    TICK_LIMIT = "tick limit"  # `max_ticks` was executed
+    DEADLINE = "deadline"      # wall-clock deadline passed
+
+class RunResult(typing.NamedTuple):
+    ticks: int
+    reason: StopReason
+    pc: int
+    cycles: typing.Optional[int] = None # only with cycle accounting enabled
+
+class TRACE_RECORDER:
+    """
+    Execution trace kept in preallocated numpy ring buffer - only last `capacity` instructions are kept.
+    Each record holds tick, pc, raw instruction word, last written register (and its value) and accessed ram address.
+    Fields that instruction didn't touch are -1 (for stores `value` is the stored value).
+    """
+    DTYPE = np.dtype([('tick', '<u8'), ('pc', '<u2'), ('word', '<u4'), ('dst', '<i1'), ('value', '<i4'), ('address', '<i4')])
+    DEFAULT_CAPACITY = 1_000_000
+
+    def __init__(self, capacity: int = DEFAULT_CAPACITY) -> None:
+        self.buffer = np.zeros((capacity), dtype=self.DTYPE)
+        self.dst = self.buffer['dst']
+        self.value = self.buffer['value']
+        self.address = self.buffer['address']
+        self.count = 0 # number of recorded instructions
+        self.slot = -1 # record of currently executed instruction
+
+    def __len__(self) -> int:
+        return min(self.count, len(self.buffer))
+
+    def begin(self, pc: int, word: int):
+        self.slot = self.count % len(self.buffer)
+        self.buffer[self.slot] = (self.count, pc, word, -1, -1, -1)
+        self.count += 1
+    def end(self):
+        self.slot = -1
+
+    def register_write(self, index: int, value: int):
+        if self.slot >= 0:
+            self.dst[self.slot] = index
+            self.value[self.slot] = value
+    def memory_access(self, address: int, value: int):
+        if self.slot >= 0:
+            self.address[self.slot] = address
+            self.value[self.slot] = value
+
+    def records(self) -> np.ndarray:
+        """Returns copy of kept records, oldest first"""
+        if self.count <= len(self.buffer):
+            return self.buffer[:self.count].copy()
+        oldest = self.count % len(self.buffer)
+        return np.concatenate((self.buffer[oldest:], self.buffer[:oldest]))
+
+    def dump(self, path: str) -> np.memmap:
+        """Writes kept records (oldest first) to `.npy` file. Returns it memory-mapped"""
+        records = self.records()
+        out = np.lib.format.open_memmap(path, mode='w+', dtype=self.DTYPE, shape=records.shape)
+        out[:] = records
+        out.flush()
+        return out
+
+    @staticmethod
+    def load(path: str) -> np.ndarray:
+        return np.load(path, mmap_mode='r')
+
+class Snapshot(typing.NamedTuple):
+    """
+    Complete machine state. Arrays are read-only, so snapshots can share them (rom is shared until it is reprogrammed).
+    `devices` are states of io devices with their scheduled events (`IO_BUS.state`), together with time counters
+    they are relative to
+    """
+    regs: bytes
+    pc_modified: bool
+    is_running: bool
+    ram: np.ndarray
+    rom: np.ndarray
+    ticks: int = 0
+    idle_cycles: int = 0
+    cycles: int = 0 # `CYCLE_COUNTER.total`
+    devices: typing.Tuple[dict, ...] = ()
+
+    def save(self, path: str):
+        devices = {f'device{i}_{name}': value for i, state in enumerate(self.devices) for name, value in state.items()}
+        np.savez_compressed(path, regs=np.frombuffer(self.regs, dtype='uint16'), pc_modified=self.pc_modified, 
+                            is_running=self.is_running, ram=self.ram, rom=self.rom, ticks=self.ticks, 
+                            idle_cycles=self.idle_cycles, cycles=self.cycles, **devices)
+
+    @staticmethod
+    def load(path: str) -> 'Snapshot':
+        with np.load(path) as data:
+            ram, rom = data['ram'], data['rom']
+            ram.flags.writeable = False
+            rom.flags.writeable = False
+            devices: typing.Dict[int, dict] = {}
+            for key in data.files:
+                if key.startswith('device'):
+                    index, name = key[len('device'):].split('_', 1)
+                    devices.setdefault(int(index), {})[name] = data[key]
+            counters = [int(data[name]) if name in data.files else 0 for name in ('ticks', 'idle_cycles', 'cycles')]
+            return Snapshot(data['regs'].astype('uint16').tobytes(), bool(data['pc_modified']), bool(data['is_running']), ram, rom,
+                            *counters, tuple(devices[index] for index in sorted(devices)))
+
+class JOURNAL:
+    """
+    Undo journal for reverse execution. Before each tick pc and flags are saved, and every register / ram write
+    saves old value of what it overwrites, so going back costs only as much as undone ticks wrote.
+    Full snapshots are taken every `snapshot_interval` ticks - journal older than `max_ticks` is dropped and ticks
+    before it are reached by restoring snapshot and executing forward. State of io devices is saved before the first
+    io access of a tick and brought back when the tick is undone - output already passed to sinks is not undone.
+    """
+    REGISTER_LOCATIONS = 16 # locations below are registers, above - ram index + 16
+
+    def __init__(self, potados: 'POTADOS_EMULATOR', snapshot_interval: int = 10000, max_ticks: int = 1_000_000) -> None:
+        self.cpu = potados
+        self.snapshot_interval = snapshot_interval
+        self.max_ticks = max_ticks
+
+        self.tick = 0                       # ticks executed since journal was enabled
+        self.first_tick = 0                 # tick of first journaled tick
+        self.log = array('l')               # (location, old value) pairs
+        self.starts = array('l')            # index in `log` where each tick starts
+        self.pcs = array('H')               # pc before each tick
+        self.states = array('B')            # pc_modified | is_running << 1 before each tick
+        self.devices: typing.Dict[int, typing.Tuple[dict, ...]] = {} # tick -> device state before its first io access
+        self.snapshots: typing.List[typing.Tuple[int, Snapshot]] = [(0, potados.snapshot())]
+
+    def __len__(self) -> int:
+        """Number of ticks that can be undone without replaying"""
+        return len(self.starts)
+
+    def begin_tick(self):
+        if self.tick - self.snapshots[-1][0] >= self.snapshot_interval:
+            self.snapshots.append((self.tick, self.cpu.snapshot()))
+            if len(self.starts) > 2 * self.max_ticks:
+                self.trim()
+
+        self.starts.append(len(self.log))
+        self.pcs.append(self.cpu.regs.regs[self.cpu.PC])
+        self.states.append(self.cpu.regs.pc_modified | self.cpu.is_running_flag << 1)
+        self.tick += 1
+
+    def register_write(self, index: int, old: int):
+        self.log.append(index)
+        self.log.append(old)
+    def ram_write(self, index: int, old: int):
+        self.log.append(index + self.REGISTER_LOCATIONS)
+        self.log.append(old)
+    def device_access(self):
+        if self.tick not in self.devices:
+            self.devices[self.tick] = self.cpu.ram.io.state()
+
+    def trim(self):
+        """Drops journal older than `max_ticks`, cutting at a snapshot"""
+        keep_from = max(tick for tick, _ in self.snapshots if tick <= self.tick - self.max_ticks)
+        if keep_from <= self.first_tick:
+            return
+
+        cut = keep_from - self.first_tick
+        offset = self.starts[cut]
+        self.log = self.log[offset:]
+        self.starts = array('l', (start - offset for start in self.starts[cut:]))
+        self.pcs = self.pcs[cut:]
+        self.states = self.states[cut:]
+        self.devices = {tick: state for tick, state in self.devices.items() if tick > keep_from}
+        self.first_tick = keep_from
+
+    def undo_tick(self):
+        regs = self.cpu.regs.regs
+        ram = self.cpu.ram.ram
+        log = self.log
+
+        start = self.starts.pop()
+        for i in range(len(log) - 2, start - 2, -2):
+            location, old = log[i], log[i + 1]
+            if location < self.REGISTER_LOCATIONS:
+                regs[location] = old
+            else:
+                ram[location - self.REGISTER_LOCATIONS] = old
+        del log[start:]
+
+        devices = self.devices.pop(self.tick, None)
+        if devices is not None:
+            self.cpu.ram.io.restore(devices)
+
+        state = self.states.pop()
+        regs[self.cpu.PC] = self.pcs.pop()
+        self.cpu.regs.pc_modified = bool(state & 1)
+        self.cpu.is_running_flag = bool(state & 2)
+        self.cpu.ticks -= 1
+        self.tick -= 1
+
+    def step_back(self, n: int) -> int:
+        """Goes `n` ticks back (at most to the first recorded state). Returns number of ticks gone back"""
+        target = max(self.tick - n, 0)
+        start = self.tick
+
+        while self.tick > target and self.tick > self.first_tick:
+            self.undo_tick()
+
+        if self.tick > target:
+            # older than journal - go to snapshot before target and execute forward
+            snapshot_tick, snapshot = max((entry for entry in self.snapshots if entry[0] <= target), key=lambda entry: entry[0])
+            self.snapshots = [entry for entry in self.snapshots if entry[0] <= snapshot_tick]
+            self.cpu.restore(snapshot)
+            self.tick = self.first_tick = snapshot_tick
+            self.log, self.starts, self.pcs, self.states = array('l'), array('l'), array('H'), array('B')
+            self.devices = {}
+            while self.tick < target:
+                self.cpu.next_tick()
+
+        del self.snapshots[1 + max(i for i, (tick, _) in enumerate(self.snapshots) if tick <= self.tick):]
+        return start - self.tick
+
+    def find_write(self, location: int) -> typing.Optional[int]:
+        """Returns how many ticks back `location` was last written (1 - by the last tick), None if it isn't in journal"""
+        log = self.log
+        end = len(log)
+        for back, start in enumerate(reversed(self.starts), 1):
+            if location in log[start:end:2]:
+                return back
+            end = start
+        return None
+
+class PROFILER:
+    """
+    Guest level hot-spot profiler. Counts executions of every rom address and how many times instruction at given
+    address changed pc (taken branches). Opcode classes are derived from rom when report is made.
+    Labels are `{name: rom address}` - `context.physical_adresses` returned by assembler.
+    """
+    OPCODE_CLASSES = ('load_imm', 'jump', 'call', 'branch_taken', 'branch_not_taken', 'alu_long', 'alu_short', 'fpu',
+                      'ptr_load', 'ptr_store', 'push', 'pop', 'other')
+
+    def __init__(self, potados: 'POTADOS_EMULATOR') -> None:
+        self.cpu = potados
+        self.counts = np.zeros(len(potados.rom.rom), dtype='uint64')
+        self.taken = np.zeros(len(potados.rom.rom), dtype='uint64')
+
+    def reset(self):
+        self.counts[:] = 0
+        self.taken[:] = 0
+
+    def classify(self, handler: typing.Callable) -> str:
+        """Opcode class of decoded `handler` (branches are reported as `branch_taken`)"""
+        cpu = type(self.cpu)
+        handler = UNDECORATED.get(handler, handler)
+        same = lambda *handlers: handler in [UNDECORATED.get(h, h) for h in handlers]
+
+        if same(cpu.load_imm):
+            return 'load_imm'
+        if same(cpu.jump):
+            return 'jump'
+        if same(cpu.call):
+            return 'call'
+        if same(*cpu.BRANCHES, cpu.jge_inc_dec, cpu.jne_inc_dec):
+            return 'branch_taken'
+        if same(*cpu.ALU_SHORT.values()):
+            return 'alu_short'
+        if same(*filter(None, cpu.ALU_LONG_IMM + cpu.ALU_LONG_REG)):
+            return 'alu_long'
+        if same(*filter(None, cpu.FPU)):
+            return 'fpu'
+        if same(cpu.load_ptr_imm, cpu.load_ptr_lsh):
+            return 'ptr_load'
+        if same(cpu.store_ptr_imm, cpu.store_ptr_lsh):
+            return 'ptr_store'
+        if same(cpu.push):
+            return 'push'
+        if same(cpu.pop):
+            return 'pop'
+        return 'other'
+
+    def opcode_counts(self) -> typing.Dict[str, int]:
+        """Executed instructions per opcode class"""
+        result = dict.fromkeys(self.OPCODE_CLASSES, 0)
+        cache: typing.Dict[typing.Callable, str] = {}
+        for pc in np.flatnonzero(self.counts):
+            handler = self.cpu.rom.decoded[pc][0]
+            if handler not in cache:
+                cache[handler] = self.classify(handler)
+            count, taken = int(self.counts[pc]), int(self.taken[pc])
+
+            if cache[handler] == 'branch_taken':
+                result['branch_taken'] += taken
+                result['branch_not_taken'] += count - taken
+            else:
+                result[cache[handler]] += count
+        return result
+
+    @staticmethod
+    def locate(pc: int, labels: typing.Optional[typing.Dict[str, int]]) -> str:
+        """`pc` as `LABEL+offset` of the closest label at or before it"""
+        if not labels:
+            return hex(pc)
+        candidates = [(address, name) for name, address in labels.items() if address <= pc]
+        if not candidates:
+            return hex(pc)
+        address, name = max(candidates)
+        return name if address == pc else f'{name}+{pc - address}'
+
+    def hot_spots(self, top: int = 10, labels: typing.Optional[typing.Dict[str, int]] = None) -> typing.List[typing.Tuple[int, int, str]]:
+        """`(pc, executions, location)` of `top` most executed addresses"""
+        executed = np.flatnonzero(self.counts)
+        order = executed[np.argsort(-self.counts[executed].astype('int64'), kind='stable')][:top]
+        return [(int(pc), int(self.counts[pc]), self.locate(int(pc), labels)) for pc in order]
+
+    def functions(self, labels: typing.Dict[str, int]) -> typing.Dict[str, int]:
+        """Executions summed from each label up to the next one (code before first label is under `None`)"""
+        return self.by_labels(self.counts, labels)
+
+    @staticmethod
+    def by_labels(values: np.ndarray, labels: typing.Dict[str, int]) -> typing.Dict[str, int]:
+        """Per address `values` summed from each label up to the next one, most significant first"""
+        starts = sorted((address, name) for name, address in labels.items())
+        bounds = [0] + [address for address, _ in starts] + [len(values)]
+        names = [None] + [name for _, name in starts]
+
+        result = {}
+        for name, begin, end in zip(names, bounds, bounds[1:]):
+            total = int(values[begin:end].sum())
+            if total:
+                result[name] = result.get(name, 0) + total
+        return dict(sorted(result.items(), key=lambda item: item[1], reverse=True))
+
+    def report(self, top: int = 10, labels: typing.Optional[typing.Dict[str, int]] = None) -> str:
+        total = int(self.counts.sum())
+        lines = [f'executed instructions: {total}', 'hot spots:']
+        for pc, count, location in self.hot_spots(top, labels):
+            lines.append(f'    {pc:5} {location:<24} {count:10} {count / total:7.2%}')
+
+        lines.append('opcode classes:')
+        for name, count in self.opcode_counts().items():
+            if count:
+                lines.append(f'    {name:<24} {count:10} {count / total:7.2%}')
+
+        if labels:
+            lines.append('labels:')
+            for name, count in self.functions(labels).items():
+                lines.append(f'    {str(name):<24} {count:10} {count / total:7.2%}')
+        return '\n'.join(lines)
+
+class CYCLE_COUNTER:
+    """
+    Cycle accounting with per instruction costs from `CYCLES` section of the profile. Cost of instruction is looked up
+    by command name, then by its command layout, then `default`. Every instruction that changes pc costs additional
+    `branch_taken` cycles. Time is estimated as cycles * `time_per_cycle` (in the unit used by the profile)
+    """
+    profile: typing.Optional[dict] = None
+
+    # handler name -> (names of profile commands decoded into it, command layout). Commands that share encoding
+    # (e.g. `jle` is `jge` with swapped registers) share handler, so they have to have the same cost
+    COMMANDS: typing.Dict[str, typing.Tuple[typing.Tuple[str, ...], typing.Optional[str]]] = {
+        'nop': (('nop',), 'const16'),
+        'halt': (('int',), 'other'),
+        'interupt': (('int',), 'other'),
+        'invalid_command': ((), None),
+        'load_imm': (('load imm',), 'const16'),
+        'jump': (('jmp',), 'const16'),
+        'call': (('call',), 'const16'),
+        'jge': (('branch jge imm', 'branch jle '), 'branch'),
+        'jl': (('branch jl imm', 'branch jg '), 'branch'),
+        'je': (('branch je ',), 'branch'),
+        'jne': (('branch jne ',), 'branch'),
+        'jae': (('branch jae ', 'branch jbe imm'), 'branch'),
+        'jb': (('branch jb ', 'branch ja imm'), 'branch'),
+        'jge_inc_dec': (('branch jge ++', 'branch jge --'), 'branch'),
+        'jne_inc_dec': (('branch jne ++', 'branch jne --'), 'branch'),
+        **{f'alu_{name}_imm': ((f'{name} const',), 'aluimm') for name in ('add', 'sub', 'arsh', 'rsh', 'lsh', 'mul')},
+        **{f'alu_{name}_reg': ((name,), 'aluimm') for name in ('add', 'sub', 'arsh', 'rsh', 'lsh', 'mul')},
+        **{f'alu_{name}': ((name,), 'alufpu') for name in ('xor', 'xnor', 'or', 'nor')},
+        **{name: ((name,), 'alufpu') for name in ('fadd', 'fsub', 'fmul', 'fdiv', 'ftoi', 'itof', 'utof')},
+        'load_ptr_lsh': (('load ptr lsh',), 'indirectlsh'),
+        'load_ptr_imm': (('load ptr imm',), 'indirect'),
+        'store_ptr_lsh': (('store ptr lsh',), 'indirectlsh'),
+        'store_ptr_imm': (('store ptr imm',), 'indirect'),
+        'push': (('push',), 'other'),
+        'pop': (('pop',), 'other'),
+    }
+
+    def __init__(self, potados: 'POTADOS_EMULATOR', costs: typing.Optional[dict] = None, time_per_cycle: typing.Optional[float] = None) -> None:
+        """`costs` and `time_per_cycle` default to values from the profile. Unknown command / layout names raise"""
+        profile = self.load_profile()
+        costs = costs if costs is not None else profile.get('CYCLES', {})
+        time_per_cycle = time_per_cycle if time_per_cycle is not None else profile.get('time_per_cycle', 1.0)
+        self.check_costs(costs, profile)
 
-import core.quick as quick
+        self.cpu = potados
+        self.default = costs.get('default', 1)
+        self.branch_taken = costs.get('branch_taken', 0)
+        self.layouts: typing.Dict[str, int] = costs.get('layouts', {})
+        self.commands: typing.Dict[str, int] = costs.get('commands', {})
+        self.time_per_cycle = time_per_cycle
+
+        self.cache: typing.Dict[typing.Callable, int] = {}
+        self.total = 0
+        self.last = 1
+        self.per_pc = np.zeros(len(potados.rom.rom), dtype='uint64')
+
+    @classmethod
+    def load_profile(cls) -> dict:
+        if cls.profile is None:
+            import json
+            with open(PROFILE_PATH) as f:
+                cls.profile = json.load(f)['CPU']
+        return cls.profile
+
+    def check_costs(self, costs: dict, profile: dict):
+        unknown = [name for name in costs.get('commands', {}) if name not in profile['COMMANDS']]
+        unknown += [f'layout {name}' for name in costs.get('layouts', {}) if name not in profile['ARGUMENTS']['variants']]
+        if unknown:
+            raise error.EmulationError(f'Cycle costs of unknown commands: {", ".join(unknown)}')
+
+        for names, _ in self.COMMANDS.values():
+            shared = {costs['commands'][name] for name in names if name in costs.get('commands', {})}
+            if len(shared) > 1:
+                raise error.EmulationError(f'Commands {", ".join(names)} share encoding, they need the same cost')
+
+    def reset(self):
+        self.total = 0
+        self.per_pc[:] = 0
+
+    def cost(self, handler: typing.Callable) -> int:
+        """Cycles of instruction decoded into `handler` (without `branch_taken`)"""
+        cost = self.cache.get(handler)
+        if cost is None:
+            names, layout = self.COMMANDS.get(UNDECORATED.get(handler, handler).__name__, ((), None))
+            command = next((name for name in names if name in self.commands), None)
+            cost = self.commands[command] if command is not None else self.layouts.get(layout, self.default)
+            self.cache[handler] = cost
+        return cost
+
+    def account(self, pc: int, handler: typing.Callable, taken: bool):
+        cycles = self.cost(handler) + (self.branch_taken if taken else 0)
+        self.last = cycles
+        self.total += cycles
+        self.per_pc[pc] += cycles
+
+    def time(self, cycles: typing.Optional[int] = None) -> float:
+        """Estimated time of `cycles` (all accounted cycles by default)"""
+        return (self.total if cycles is None else cycles) * self.time_per_cycle
+
+    def functions(self, labels: typing.Dict[str, int]) -> typing.Dict[str, typing.Tuple[int, float]]:
+        """`(cycles, time)` spent from each label up to the next one"""
+        return {name: (cycles, self.time(cycles)) for name, cycles in PROFILER.by_labels(self.per_pc, labels).items()}
+
+class SHARED_STATE:
+    """
+    Registers and ram of machine placed in `multiprocessing.shared_memory` block (by `name`) or in memory-mapped
+    file (by `path`), so other processes can watch live machine without copying it or pausing emulator.
+    Layout is 16 registers followed by 256 words of ram, all uint16.
+    Viewer attaches with `SHARED_STATE(name=..., create=False)` (or `path=...`) and reads `regs` and `ram` arrays.
+    """
+    REGISTERS = 16
+    RAM_SIZE = 256
+    SIZE = 2 * (REGISTERS + RAM_SIZE)
+
+    def __init__(self, name: typing.Optional[str] = None, path: typing.Optional[str] = None, create: bool = True) -> None:
+        self.create = create
+        self.shm: typing.Optional['shared_memory.SharedMemory'] = None
+        self.memmap: typing.Optional[np.memmap] = None
+
+        if path is not None:
+            self.memmap = np.memmap(path, dtype='uint16', mode='w+' if create else 'r+', shape=(self.REGISTERS + self.RAM_SIZE,))
+            words = self.memmap
+        else:
+            from multiprocessing import shared_memory
+            self.shm = shared_memory.SharedMemory(name, create=create, size=self.SIZE if create else 0)
+            words = np.ndarray((self.REGISTERS + self.RAM_SIZE,), dtype='uint16', buffer=self.shm.buf)
+
+        self.regs: np.ndarray = words[:self.REGISTERS]
+        self.ram: np.ndarray = words[self.REGISTERS:]
+
+    @property
+    def name(self) -> typing.Optional[str]:
+        return self.shm.name if self.shm is not None else None
+
+    def close(self):
+        """Detaches from state (and removes shared memory block if it was created here). No views can be used after it"""
+        del self.regs, self.ram
+        if self.memmap is not None:
+            self.memmap.flush()
+            self.memmap = None
+        if self.shm is not None:
+            self.shm.close()
+            if self.create:
+                self.shm.unlink()
+            self.shm: typing.Optional['shared_memory.SharedMemory'] = None
+
+# undecorated implementation of every handler wrapped with `log_disassembly` (dispatched when trace is disabled)
+UNDECORATED: typing.Dict[typing.Callable, typing.Callable] = {}
+
+def log_disassembly(format: str):
+    """`emulate.log_disassembly` that also remembers undecorated handler"""
+    def decorator(handler: typing.Callable) -> typing.Callable:
+        traced = emulate.log_disassembly(format=format)(handler)
+        UNDECORATED[traced] = handler
+        return traced
+    return decorator
+
+def undecorated(entry: typing.Tuple[typing.Callable, typing.Tuple]) -> typing.Tuple[typing.Callable, typing.Tuple]:
+    handler, args = entry
+    return UNDECORATED.get(handler, handler), args
+
+def fp16_to_int_table() -> typing.List[typing.Optional[int]]:
+    """`ftoi` result of every fp16 bit pattern (truncated, wrapped to 16 bits), None for inf / nan"""
+    values = np.arange(0x10000, dtype='uint16').view('float16')
+    finite = np.isfinite(values)
+    table = np.zeros(0x10000, dtype='int64')
+    table[finite] = np.trunc(values[finite]).astype('int64') & 0xFFFF
+    out: typing.List[typing.Optional[int]] = table.tolist()
+    for index in np.flatnonzero(~finite).tolist():
+        out[index] = None
+    return out
 
 class POTADOS_EMULATOR(emulate.EmulatorBase):
     DEBUG_HALT_ON_NOP = False
+    DEBUG_TRACE_DISASSEMBLY = True
     INTERUPT_0_AS_INT = Binary("01 000 0000 01011 0000 0000", lenght=22).int()
     NOP_AS_INT = Binary("0 0000000000000000 0000", lenght=22).int()
 
@@ -28,216 +556,298 @@ class POTADOS_EMULATOR(emulate.EmulatorBase):
     def __init__(self) -> None:
         self.regs = REGS(self)
         self.ram = RAM(self, None)
+        self.blocks = BLOCK_CACHE(self)
         self.rom = ROM(self, 1024)
         self.is_running_flag = True
         self.pc_modified = False
-
+        self.block_translation = True
+        self.recorder: typing.Optional[TRACE_RECORDER] = None
+        self.journal: typing.Optional[JOURNAL] = None
+        self.profiler: typing.Optional[PROFILER] = None
+        self.cycles: typing.Optional[CYCLE_COUNTER] = None
+        self.shared: typing.Optional[SHARED_STATE] = None
+        self.ticks = 0        # executed instructions
+        self.idle_cycles = 0  # cycles skipped by `fast_forward`
+
+
+    def snapshot(self) -> Snapshot:
+        ram = self.ram.ram.copy()
+        ram.flags.writeable = False
+        return Snapshot(bytes(self.regs.regs), self.regs.pc_modified, self.is_running_flag, ram, self.rom.frozen(),
+                        self.ticks, self.idle_cycles, self.cycles.total if self.cycles is not None else 0, self.ram.io.state())
+
+    def restore(self, snapshot: Snapshot):
+        """
+        Brings back state from `snapshot`, including time and io devices with their scheduled events.
+        Rom is reprogrammed (and decoded) only if it differs from the current one
+        """
+        self.regs.regs[:] = array('H', snapshot.regs)
+        self.regs.pc_modified = snapshot.pc_modified
+        self.is_running_flag = snapshot.is_running
+        self.ram.ram[:] = snapshot.ram
+        self.ticks = snapshot.ticks
+        self.idle_cycles = snapshot.idle_cycles
+        if self.cycles is not None:
+            self.cycles.total = snapshot.cycles
+        if snapshot.devices:
+            self.ram.io.restore(snapshot.devices)
+        if self.ram.io.spin is not None:
+            self.ram.io.spin.reset()
+        if snapshot.rom is not self.rom.frozen_rom:
+            self.rom.load(snapshot.rom)
 
     def get_current_pos(self, chunk_name: typing.Optional[str]) -> int:
-        return int(self.regs[self.PC])
+        return self.regs[self.PC]
 
     def is_running(self) -> bool:
         return self.is_running_flag
 
+    def now(self) -> int:
+        """Machine time in cycles (executed instructions without cycle accounting) - time base of io devices"""
+        return (self.cycles.total if self.cycles is not None else self.ticks) + self.idle_cycles
+
+    def fast_forward(self) -> int:
+        """Skips idle time up to the next scheduled device event (and fires it). Returns number of skipped cycles"""
+        scheduler = self.ram.io.scheduler
+        at = scheduler.next_time()
+        if at is None:
+            return 0
+        skipped = max(at - self.now(), 0)
+        self.idle_cycles += skipped
+        scheduler.fire(self.now())
+        return skipped
+
     def get_machine_cycles(self) -> int:
-        return 1
+        """Cycles of the last executed instruction (always 1 without cycle accounting)"""
+        return self.cycles.last if self.cycles is not None else 1
 
     def next_tick(self,) -> typing.Optional[str]:
-        command = self.rom[self.get_current_pos(None)]
-        
+        pc = self.get_current_pos(None)
+        handler, args = self.get_decoded()[pc]
+
+        if self.recorder is not None:
+            self.recorder.begin(pc, int(self.rom.rom[pc]))
+        if self.journal is not None:
+            self.journal.begin_tick()
+        handler(self, *args)
+        if self.recorder is not None:
+            self.recorder.end()
+        if self.profiler is not None:
+            self.profiler.counts[pc] += 1
+            if self.regs.pc_modified:
+                self.profiler.taken[pc] += 1
+        if self.cycles is not None:
+            self.cycles.account(pc, handler, self.regs.pc_modified)
+        if not self.is_running_flag:
+            self.ram.io.flush()
+
+        self.ticks += 1
+        self.regs.increment_pc()
+
+    DEADLINE_CHECK_INTERVAL = 4096
+
+    def run(self, max_ticks: int, until: typing.Optional[typing.Callable[['POTADOS_EMULATOR'], bool]] = None, breakpoints: typing.Optional[typing.Iterable[int]] = None, deadline: typing.Optional[float] = None) -> RunResult:
+        """
+        Executes up to `max_ticks` instructions in one call. Stops early when:
+        * machine halts (`int 0`)
+        * pc reaches any address from `breakpoints` (checked after each instruction, so run can be resumed from breakpoint)
+        * `until(emulator)` returns True (checked after each instruction)
+        * `deadline` (seconds from now) passes (checked every `DEADLINE_CHECK_INTERVAL` ticks)
+
+        With disassembly trace disabled (and without `until` and `breakpoints`) whole basic blocks are executed at once (see `BLOCK_CACHE`)
+        """
+        breakpoints = frozenset(breakpoints) if breakpoints is not None else frozenset()
+        deadline_at = time.perf_counter() + deadline if deadline is not None else None
+        use_blocks = self.block_translation and until is None and not breakpoints and self.blocks.is_applicable()
+
+        decoded = self.get_decoded()
+        regs = self.regs
+        pc_ref = regs.regs
+        PC = self.PC
+        recorder = self.recorder
+        journal = self.journal
+        profiler = self.profiler
+        cycles = self.cycles
+        start_cycles = cycles.total if cycles is not None else None
+        spin = self.ram.io.spin
+
+        ticks = 0
+        reason = None
+
+        while reason is None and self.is_running_flag:
+            if ticks >= max_ticks:
+                reason = StopReason.TICK_LIMIT
+                break
+            if deadline_at is not None and time.perf_counter() >= deadline_at:
+                reason = StopReason.DEADLINE
+                break
+
+            chunk = min(max_ticks - ticks, self.DEADLINE_CHECK_INTERVAL)
+
+            if use_blocks:
+                ticks += self.blocks.run(chunk)
+                continue
+
+            for _ in range(chunk):
+                pc = pc_ref[PC]
+                handler, args = decoded[pc]
+                if recorder is not None:
+                    recorder.begin(pc, int(self.rom.rom[pc]))
+                if journal is not None:
+                    journal.begin_tick()
+                if spin is not None:
+                    spin.budget = max_ticks - ticks - 1
+                handler(self, *args)
+                if recorder is not None:
+                    recorder.end()
+                if profiler is not None:
+                    profiler.counts[pc] += 1
+                    if regs.pc_modified:
+                        profiler.taken[pc] += 1
+                if cycles is not None:
+                    cycles.account(pc, handler, regs.pc_modified)
+                self.ticks += 1
+
+                if regs.pc_modified:
+                    regs.pc_modified = False
+                else:
+                    pc_ref[PC] = (pc_ref[PC] + 1) & 0xFFFF
+                ticks += 1
+                if spin is not None and spin.pending:
+                    ticks += spin.pending
+                    spin.pending = 0
+                    if ticks >= max_ticks:
+                        break
+
+                if not self.is_running_flag:
+                    break
+                if pc_ref[PC] in breakpoints:
+                    reason = StopReason.BREAKPOINT
+                    break
+                if until is not None and until(self):
+                    reason = StopReason.UNTIL
+                    break
+
+        if not self.is_running_flag:
+            reason = StopReason.HALTED
+        if spin is not None:
+            spin.budget = 0
+        self.ram.io.flush()
+
+        return RunResult(ticks, reason, pc_ref[PC], cycles.total - start_cycles if cycles is not None else None)
+
+    def get_decoded(self) -> typing.List[typing.Tuple[typing.Callable, typing.Tuple]]:
+        """Decoded rom to dispatch from - with disassembly logging wrappers only when trace is enabled"""
+        return self.rom.decoded if self.DEBUG_TRACE_DISASSEMBLY else self.rom.fast_decoded
+
+    @classmethod
+    def decode(cls, command: int) -> typing.Tuple[typing.Callable, typing.Tuple]:
+        """
+        Decodes raw 22 bit instruction word into `(handler, args)` pair. 
+        Handler is called as `handler(emulator, *args)`, so it can be stored without reference to any emulator instance.
+        Invalid words are decoded into `invalid_command` - they raise only when executed (ROM can hold data as well)
+        """
         # nop
-        if command == POTADOS_EMULATOR.NOP_AS_INT:
-            self.nop()
-            self.regs.increment_pc()
-            return
+        if command == cls.NOP_AS_INT:
+            return cls.nop, ()
 
         # int 0 (early stop)
-        if command == POTADOS_EMULATOR.INTERUPT_0_AS_INT:
-            self.halt()
-            self.regs.increment_pc()
-            return
+        if command == cls.INTERUPT_0_AS_INT:
+            return cls.halt, ()
 
         # parse command
-        pri_decoder = int(command[20:22])  # primary decoder 2 bit
-        destination = int(command[0:4])    # dst register 4 bit
+        pri_decoder = (command >> 20) & 0b11   # primary decoder 2 bit
+        destination = command & 0b1111         # dst register 4 bit
 
         if pri_decoder == 0:   # load imm
-            constant = Binary(command[4:20]) # const 16 bit
+            constant = (command >> 4) & 0xFFFF # const 16 bit
 
-            if destination == self.PC:
-                self.jump(constant)  # type: ignore
+            if destination == cls.PC:
+                return cls.jump, (constant,)
             else:
-                self.load_imm(constant, destination)
+                return cls.load_imm, (constant, destination)
         elif pri_decoder == 3: # call
-            constant = Binary(command[4:20]) # const 16 bit
-            self.call(constant)
+            constant = (command >> 4) & 0xFFFF # const 16 bit
+            return cls.call, (constant,)
         elif pri_decoder == 2: # jumps
-            sec_decoder = int(command[17:20])
-            r2_value = int(command[13:17])
-            offset = Binary(command[4:12])
-            r1_value = int(command[0:4])
-
-            offset = ops.pad_sign_extend(offset, 16)
-
-            if sec_decoder == 0:   # jge
-                self.jge(r1_value, r2_value, offset)
-            elif sec_decoder == 1: # jl
-                self.jl(r1_value, r2_value, offset)
-            elif sec_decoder == 2: # je
-                self.je(r1_value, r2_value, offset)
-            elif sec_decoder == 3: # jne
-                self.jne(r1_value, r2_value, offset)
-            elif sec_decoder == 4: # jae
-                self.jae(r1_value, r2_value, offset)
-            elif sec_decoder == 5: # jb 
-                self.jb(r1_value, r2_value, offset)
-            elif sec_decoder == 6: # jge imm
-                self.jge_inc_dec("++" if r1_value == 2 else "--", r2_value, offset)
+            sec_decoder = (command >> 17) & 0b111
+            r2_value = (command >> 13) & 0b1111
+            offset = cls.sign_extend_8((command >> 4) & 0xFF)
+            r1_value = command & 0b1111
+
+            if sec_decoder == 6:   # jge imm
+                return cls.jge_inc_dec, ("++" if r1_value == 2 else "--", r2_value, offset)
             elif sec_decoder == 7: # je imm
-                self.jne_inc_dec("++" if r1_value == 2 else "--", r2_value, offset)
+                return cls.jne_inc_dec, ("++" if r1_value == 2 else "--", r2_value, offset)
             else:
-                raise error.EmulationError("Unreachable")
+                return cls.BRANCHES[sec_decoder], (r1_value, r2_value, offset)
         else:                      # rest
-            flags       = command[8:13]
-            sec_decoder = command[17:20].int()
+            flags       = (command >> 8) & 0b11111
+            sec_decoder = (command >> 17) & 0b111
+            r1          = (command >> 4) & 0b1111
+            r2          = (command >> 13) & 0b1111
 
             if sec_decoder in [1, 2, 4, 5, 6, 7]: # alu long
-                self.alu_long(sec_decoder, destination, command)
+                if command & (1 << 12):
+                    imm = cls.sign_extend_8((command >> 4) & 0xFF)
+                    return cls.ALU_LONG_IMM[sec_decoder], (imm, r2, destination)
+                else:
+                    return cls.ALU_LONG_REG[sec_decoder], (r1, r2, destination)
             elif sec_decoder == 3:                # alu short / fpu
-                self.alu_short(destination, flags, command) 
-            elif sec_decoder == 0:      # other
-                dec = flags[2:].int()
-                r1    = command[4:8].int()
-                r2    = command[13:17].int()
-                fpu   = command[8:11].int()
+                op_flag      = flags & 0b1000
+                neg_r2_flag  = flags & 0b0100
+                neg_r1_flag  = flags & 0b0010
+                neg_out_flag = flags & 0b0001
+
+                handler = cls.ALU_SHORT[(bool(op_flag), bool(neg_out_flag))]
+                return handler, (r1, r2, destination, "~" if neg_r1_flag else "", "~" if neg_r2_flag else "")
+            else:                                 # other
+                dec = flags >> 2
+                fpu = flags & 0b111
 
                 if dec == 0 or dec == 1:
-                    self.fpu(r1, r2, destination, fpu)
+                    if fpu == 0:
+                        return cls.invalid_command, ("Unreachable",)
+                    elif fpu in [5, 6, 7]:
+                        return cls.FPU[fpu], (r1, destination)
+                    else:
+                        return cls.FPU[fpu], (r1, r2, destination)
                 elif dec == 6:        # load ptr lsh
-                    lsh = command[8:10].int()
-                    offset = command[4:8].int()
-                    self.load_ptr_lsh(2**lsh, offset, r2, destination)
+                    lsh = (command >> 8) & 0b11
+                    return cls.load_ptr_lsh, (2**lsh, r1, r2, destination)
                 elif dec == 7:        # load ptr imm
-                    offset = command[4:10].int()
-                    self.load_ptr_imm(offset, r2, destination)
+                    offset = (command >> 4) & 0b111111
+                    return cls.load_ptr_imm, (offset, r2, destination)
                 elif dec == 4:        # store ptr lsh
-                    lsh = command[8:10].int()
-                    offset = command[4:8].int()
-                    self.store_ptr_lsh(2**lsh, offset, r2, destination)
+                    lsh = (command >> 8) & 0b11
+                    return cls.store_ptr_lsh, (2**lsh, r1, r2, destination)
                 elif dec == 5:        # store ptr imm
-                    offset = command[4:10].int()
-                    self.store_ptr_imm(offset, r2, destination)
+                    offset = (command >> 4) & 0b111111
+                    return cls.store_ptr_imm, (offset, r2, destination)
                 elif flags == 9:        # pop
-                    self.pop(destination)
-                elif flags == 6:        # push
-                    self.push(r1)
-                elif flags == 7:        # converts & interupt
-                    third = command[8:10].int()
-                    if third == 0:
-                        self.ftoi(r1, destination)
-                    elif third == 1:
-                        self.itof(r1, destination)
-                    elif third == 2:
-                        self.utof(r1, destination)
-                    elif third == 3:
-                        self.interupt(destination)
-                    else:
-                        raise error.EmulationError("Unrachable 1")
-                elif flags == 10:        # push
-                    self.push(r2)
-                elif flags == 11:        # int
-                    self.interupt(destination)
+                    return cls.pop, (destination,)
+                elif flags == 10:       # push
+                    return cls.push, (r2,)
+                elif flags == 11:       # int
+                    return cls.interupt, (destination,)
                 else:
-                    raise error.EmulationError("Invalid Command")
-            else:
-                raise error.EmulationError("Unrachable 3")
-        
-        self.regs.increment_pc()
+                    return cls.invalid_command, ("Invalid Command",)
+
+    @staticmethod
+    def sign_extend_8(value: int) -> int:
+        """8 bit value sign extended to 16 bits (as unsigned int)"""
+        return value | 0xFF00 if value & 0x80 else value
 
-    
     def load(self, address):
-        return self.ram[address]
+        value = self.ram[address]
+        if self.recorder is not None:
+            self.recorder.memory_access(address, value)
+        return value
     def store(self, address, value):
+        if self.recorder is not None:
+            self.recorder.memory_access(address, value & 0xFFFF)
         self.ram[address] = value
 
-    def alu_long(self, sec_decoder: int, destination: int, command: Binary):
-        I = command[12]
-        r1_value = command[4:12]        # 8 bit
-        r2_value = command[13:17].int() # 4 bit
-
-        if I:
-            imm = ops.pad_sign_extend(r1_value, 16) # type: ignore
-            if sec_decoder == 1:
-                self.alu_add_imm(imm, r2_value, destination)
-            elif sec_decoder == 2:
-                self.alu_sub_imm(imm, r2_value, destination)
-            elif sec_decoder == 4:
-                self.alu_arsh_imm(imm, r2_value, destination)
-            elif sec_decoder == 5:
-                self.alu_rsh_imm(imm, r2_value, destination)
-            elif sec_decoder == 6:
-                self.alu_lsh_imm(imm, r2_value, destination)
-            elif sec_decoder == 7:
-                self.alu_mul_imm(imm, r2_value, destination)
-            else: 
-                raise error.EmulationError("Unreachable")
-        else:
-            r1 = int(r1_value[:4]) # type: ignore
-            if sec_decoder == 1:
-                self.alu_add_reg(r1, r2_value, destination)
-            elif sec_decoder == 2:
-                self.alu_sub_reg(r1, r2_value, destination)
-            elif sec_decoder == 4:
-                self.alu_arsh_reg(r1, r2_value, destination)
-            elif sec_decoder == 5:
-                self.alu_lsh_reg(r1, r2_value, destination)
-            elif sec_decoder == 6:
-                self.alu_rsh_reg(r1, r2_value, destination)
-            elif sec_decoder == 7:
-                self.alu_mul_reg(r1, r2_value, destination)
-            else:
-                raise error.EmulationError("Unreachable")
-    def alu_short(self, destination: int, flags: Binary, command: Binary):
-        r1 = int(command[4:8])
-        r2 = int(command[13:17])
-
-        op_flag      = flags[3]
-        neg_r2_flag  = flags[2]
-        neg_r1_flag  = flags[1]
-        neg_out_flag = flags[0]
-
-        if op_flag:  # xor
-            if neg_out_flag:
-                self.alu_xnor(r1, r2, destination, "~" if neg_r1_flag else "", "~" if neg_r2_flag else "")
-            else:
-                self.alu_xor(r1, r2, destination, "~" if neg_r1_flag else "", "~" if neg_r2_flag else "")
-        else:        # or
-            if neg_out_flag:
-                self.alu_nor(r1, r2, destination, "~" if neg_r1_flag else "", "~" if neg_r2_flag else "")
-            else:
-                self.alu_or(r1, r2, destination, "~" if neg_r1_flag else "", "~" if neg_r2_flag else "")
-    
-    def fpu(self, r1: int, r2: int, destination: int, cmd: int):
-        if cmd == 0:
-            pass
-        if cmd == 1:
-            self.fadd(r1, r2, destination)
-        elif cmd == 2:
-            self.fsub(r1, r2, destination)
-        elif cmd == 3:
-            self.fmul(r1, r2, destination)
-        elif cmd == 4:
-            self.fdiv(r1, r2, destination)
-        elif cmd == 5:
-            self.ftoi(r1, destination)
-        elif cmd == 6:
-            self.itof(r1, destination)
-        elif cmd == 7:
-            self.utof(r1, destination)
-        else:
-            raise error.EmulationError("Unreachable")
-        
-    
     ##################
     #    FL update   #
     ##################
@@ -245,31 +855,35 @@ class POTADOS_EMULATOR(emulate.EmulatorBase):
     def update_flags_for_jump(self, r1, r2):
         pass
 
-    def update_flags_for_add_sub(self, flags: ops.Flags):
-        self.regs[self.FL][0] = flags.zeroflag
-        self.regs[self.FL][1] = flags.overflow #TODO check if it works fine for subtraction (tzn czy to jest borrow flag)
-        self.regs[self.FL][2] = flags.signflag
-        self.regs[self.FL][3] = flags.overflow
+    def update_flags_for_add_sub(self, out: int, overflow: int):
+        zeroflag = out == 0
+        signflag = out >> 15
+
+        # bits: 0 - zero, 1 - overflow (TODO check if it works fine for subtraction (tzn czy to jest borrow flag)), 2 - sign, 3 - overflow
+        self.regs[self.FL] = (self.regs[self.FL] & 0xFFF0) | zeroflag | overflow << 1 | signflag << 2 | overflow << 3
 
     ###############
     #     nops    #
     ###############
 
-    @emulate.log_disassembly(format='nop')
+    @log_disassembly(format='nop')
     def nop(self):
         if self.DEBUG_HALT_ON_NOP:
             print("Halting on nop")
             self.halt()
 
-    @emulate.log_disassembly(format='int 0')   
+    @log_disassembly(format='int 0')   
     def halt(self):
         self.is_running_flag = False
 
+    def invalid_command(self, message: str):
+        raise error.EmulationError(message)
+
     ########
     # ints #
     ########
 
-    @emulate.log_disassembly(format='int {i}')
+    @log_disassembly(format='int {i}')
     def interupt(self, i):
         if i == 0:
             self.is_running_flag = False
@@ -282,113 +896,126 @@ class POTADOS_EMULATOR(emulate.EmulatorBase):
     #######
     # FPU #
     #######
-    def cast_to_fp16(self, value: Binary) -> float:
-        return np.frombuffer(value.raw_bytes, dtype='float16')[0]
-    def cast_from_fp16(self, value: float) -> Binary:
-        return Binary(np.array([value], dtype='float16').tobytes(), lenght=16)
-    @emulate.log_disassembly(format='fadd reg[{dst}], reg[{r1}], reg[{r2}]')
-    def fadd(self, r1, r2, dst):
-        a = self.cast_to_fp16(self.regs[r1])
-        b = self.cast_to_fp16(self.regs[r2])
+    # fp16 value of every bit pattern (exact as python float) and conversion tables indexed by register value
+    FP16_VALUES: typing.List[float] = np.arange(0x10000, dtype='uint16').view('float16').astype('float64').tolist()
+    FTOI_TABLE: typing.List[typing.Optional[int]] = fp16_to_int_table()
+    ITOF_TABLE: typing.List[int] = np.arange(0x10000, dtype='uint16').view('int16').astype('float16').view('uint16').tolist()
+    with np.errstate(over='ignore'): # values above fp16 max saturate to inf
+        UTOF_TABLE: typing.List[int] = np.arange(0x10000, dtype='uint16').astype('float16').view('uint16').tolist()
+    FP16 = struct.Struct('<e')
+
+    def cast_to_fp16(self, value: int) -> float:
+        return np.array([value], dtype='uint16').view('float16')[0]
+    def cast_from_fp16(self, value: float) -> int:
+        with np.errstate(over='ignore'):
+            return int(np.array([value], dtype='float16').view('uint16')[0])
+
+    def pack_fp16(self, value: float) -> typing.Optional[int]:
+        """
+        Rounds python float to fp16 bits. Sum, difference, product and quotient of two fp16 values in double precision 
+        rounded to fp16 is the same as numpy fp16 result (double rounding is innocuous for such narrow operands).
+        Returns None for nan (its bits depend on operands)
+        """
+        if value != value:
+            return None
+        try:
+            return int.from_bytes(self.FP16.pack(value), 'little')
+        except OverflowError:
+            return 0x7C00 if value > 0 else 0xFC00
 
-        self.regs[dst] = ops.cast(self.cast_from_fp16(a+b), 'unsigned')
+    def fpu_operation(self, a: int, b: int, dst: int, operation: typing.Callable[[float, float], float]):
+        try:
+            out = self.pack_fp16(operation(self.FP16_VALUES[a], self.FP16_VALUES[b]))
+        except ZeroDivisionError:
+            out = None
 
-    @emulate.log_disassembly(format='fsub reg[{dst}], reg[{r1}], reg[{r2}]')
-    def fsub(self, r1, r2, dst):
-        a = self.cast_to_fp16(self.regs[r1])
-        b = self.cast_to_fp16(self.regs[r2])
+        if out is None:
+            # nans and division by zero go through numpy, so results stay bit identical
+            out = self.cast_from_fp16(operation(self.cast_to_fp16(a), self.cast_to_fp16(b)))
+
+        self.regs[dst] = out
 
-        self.regs[dst] = ops.cast(self.cast_from_fp16(b-a), 'unsigned') 
+    @log_disassembly(format='fadd reg[{dst}], reg[{r1}], reg[{r2}]')
+    def fadd(self, r1, r2, dst):
+        self.fpu_operation(self.regs[r1], self.regs[r2], dst, operator.add)
+
+    @log_disassembly(format='fsub reg[{dst}], reg[{r1}], reg[{r2}]')
+    def fsub(self, r1, r2, dst):
+        self.fpu_operation(self.regs[r2], self.regs[r1], dst, operator.sub)
     
-    @emulate.log_disassembly(format='fmul reg[{dst}], reg[{r1}], reg[{r2}]')
+    @log_disassembly(format='fmul reg[{dst}], reg[{r1}], reg[{r2}]')
     def fmul(self, r1, r2, dst):
-        a = self.cast_to_fp16(self.regs[r1])
-        b = self.cast_to_fp16(self.regs[r2])
-
-        self.regs[dst] = ops.cast(self.cast_from_fp16(a*b), 'unsigned')
+        self.fpu_operation(self.regs[r1], self.regs[r2], dst, operator.mul)
 
-    @emulate.log_disassembly(format='fdiv reg[{dst}], reg[{r1}], reg[{r2}]')
+    @log_disassembly(format='fdiv reg[{dst}], reg[{r1}], reg[{r2}]')
     def fdiv(self, r1, r2, dst):
-        a = self.cast_to_fp16(self.regs[r1])
-        b = self.cast_to_fp16(self.regs[r2])
-        
-        self.regs[dst] = ops.cast(self.cast_from_fp16(a/b), 'unsigned')
+        self.fpu_operation(self.regs[r1], self.regs[r2], dst, operator.truediv)
 
-    @emulate.log_disassembly(format='ftoi reg[{dst}], reg[{src}]')
+    @log_disassembly(format='ftoi reg[{dst}], reg[{src}]')
     def ftoi(self, src, dst):
-        self.regs[dst] = u16(int(self.cast_to_fp16(self.regs[src])))
+        out = self.FTOI_TABLE[self.regs[src]]
+        if out is None:
+            out = int(self.cast_to_fp16(self.regs[src])) # inf / nan raise
 
-    @emulate.log_disassembly(format='itof reg[{dst}], reg[{src}]')
-    def itof(self, src, dst):
-        val = self.cast_from_fp16(ops.cast(self.regs[src], 'signed').int())
+        self.regs[dst] = out
 
-        self.regs[dst] = u16(val)
+    @log_disassembly(format='itof reg[{dst}], reg[{src}]')
+    def itof(self, src, dst):
+        self.regs[dst] = self.ITOF_TABLE[self.regs[src]]
     
-    @emulate.log_disassembly(format='utof reg[{dst}], reg[{src}]')
+    @log_disassembly(format='utof reg[{dst}], reg[{src}]')
     def utof(self, src, dst):
-        val = self.cast_from_fp16(ops.cast(self.regs[src], 'unsigned').int())
-
-        self.regs[dst] = u16(val)
+        self.regs[dst] = self.UTOF_TABLE[self.regs[src]]
 
     #########
     # stack #
     #########
 
-    @emulate.log_disassembly(format='pop reg[{dst}]')
+    @log_disassembly(format='pop reg[{dst}]')
     def pop(self, dst):
         self.regs[self.SP] = self.regs[self.SP] - 1
-        self.regs[dst] = self.load(int(self.regs[self.SP]))
+        self.regs[dst] = self.load(self.regs[self.SP])
 
-    @emulate.log_disassembly(format='push reg[{src}]')
+    @log_disassembly(format='push reg[{src}]')
     def push(self, src):
-        self.store(int(self.regs[self.SP]), self.regs[src])
+        self.store(self.regs[self.SP], self.regs[src])
         self.regs[self.SP] = self.regs[self.SP] + 1
 
     ###########
     # ptr ops #
     ###########
 
-    @emulate.log_disassembly(format='mov reg[{dst}], ram[reg[{ptr}] + {lsh}*reg[1] + {offset}]')
+    @log_disassembly(format='mov reg[{dst}], ram[reg[{ptr}] + {lsh}*reg[1] + {offset}]')
     def load_ptr_lsh(self, lsh, offset, ptr, dst):
-        ptr_val = self.regs[ptr]
-        
-        offset = ops.pad_sign_extend(u4(offset), 16)
+        offset = offset - ((offset & 0b1000) << 1) # 4 bit sign extend
 
-        address = ops.wrapping_mul(self.regs[self.PT], lsh) + offset + ptr_val
+        address = (self.regs[self.PT] * lsh + offset + self.regs[ptr]) & 0xFFFF
 
         self.regs[dst] = self.load(address)
 
-    @emulate.log_disassembly(format='mov reg[{dst}], ram[reg[{ptr}] + {offset}]')
+    @log_disassembly(format='mov reg[{dst}], ram[reg[{ptr}] + {offset}]')
     def load_ptr_imm(self, offset, ptr, dst):
-        ptr_val = self.regs[ptr]
-        
-        offset = ops.pad_sign_extend(u6(offset), 16)
+        offset = offset - ((offset & 0b100000) << 1) # 6 bit sign extend
 
-        address = offset + ptr_val
+        address = (offset + self.regs[ptr]) & 0xFFFF
 
         self.regs[dst] = self.load(address)
 
-    @emulate.log_disassembly(format='mov ram[reg[{ptr}] + {lsh}*reg[1] + {offset}], reg[{src}]')
+    @log_disassembly(format='mov ram[reg[{ptr}] + {lsh}*reg[1] + {offset}], reg[{src}]')
     def store_ptr_lsh(self, lsh, offset, ptr, src):
-        ptr_val = self.regs[ptr]
-        src_val = self.regs[src]
-
-        offset = ops.pad_sign_extend(u4(offset), 16)
+        offset = offset - ((offset & 0b1000) << 1) # 4 bit sign extend
         
-        address = ops.wrapping_mul(self.regs[self.PT], Binary(lsh, lenght=2)) + offset + ptr_val
+        address = (self.regs[self.PT] * lsh + offset + self.regs[ptr]) & 0xFFFF
 
-        self.store(address, src_val)
+        self.store(address, self.regs[src])
     
-    @emulate.log_disassembly(format='mov ram[reg[{ptr}] + {offset}], reg[{src}]')
+    @log_disassembly(format='mov ram[reg[{ptr}] + {offset}], reg[{src}]')
     def store_ptr_imm(self, offset, ptr, src):
-        ptr_val = self.regs[ptr]
-        src_val = self.regs[src]
-        
-        offset = ops.pad_sign_extend(u6(offset), 16)
+        offset = offset - ((offset & 0b100000) << 1) # 6 bit sign extend
         
-        address = offset + ptr_val
+        address = (offset + self.regs[ptr]) & 0xFFFF
 
-        self.store(address, src_val)
+        self.store(address, self.regs[src])
 
     ############
     # ALU LONG #
@@ -397,219 +1024,152 @@ class POTADOS_EMULATOR(emulate.EmulatorBase):
     # add implementation #
     ######################
 
-    def alu_add(self, imm_r1: Binary, imm_r2: Binary, dst: int):
-        r1 = ops.cast(imm_r1.extended_low(), 'unsigned')
-        r2 = ops.cast(imm_r2.extended_low(), 'unsigned')
-        
-        out, flags = ops.flaged_add(r1, r2)
+    def alu_add(self, r1: int, r2: int, dst: int):
+        out = r1 + r2
 
-        self.update_flags_for_add_sub(flags)
+        self.update_flags_for_add_sub(out & 0xFFFF, out >> 16)
 
         self.regs[dst] = out
-    @emulate.log_disassembly(format='add reg[{dst}], reg[{r2_reg}], {r1_imm}')
-    def alu_add_imm(self, r1_imm: Binary, r2_reg: int, dst: int):
-        r2_imm = self.regs[r2_reg]
-
-        self.alu_add(r1_imm, r2_imm, dst)
-    @emulate.log_disassembly(format='add reg[{dst}], reg[{r2_reg}], reg[{r1_reg}]')
+    @log_disassembly(format='add reg[{dst}], reg[{r2_reg}], {r1_imm}')
+    def alu_add_imm(self, r1_imm: int, r2_reg: int, dst: int):
+        self.alu_add(r1_imm, self.regs[r2_reg], dst)
+    @log_disassembly(format='add reg[{dst}], reg[{r2_reg}], reg[{r1_reg}]')
     def alu_add_reg(self, r1_reg: int, r2_reg: int, dst: int):
-        r1_imm = self.regs[r1_reg]
-        r2_imm = self.regs[r2_reg]
-
-        self.alu_add(r1_imm, r2_imm, dst)
+        self.alu_add(self.regs[r1_reg], self.regs[r2_reg], dst)
 
     ######################
     # sub implementation #
     ######################
 
-    def alu_sub(self, imm_r1: Binary, imm_r2: Binary, dst: int):
-        r1 = ops.cast(imm_r1.extended_low(), 'unsigned')
-        r2 = ops.cast(imm_r2.extended_low(), 'unsigned')
-        
-        out, flags = ops.flaged_sub(r2, r1)
+    def alu_sub(self, r1: int, r2: int, dst: int):
+        out = r2 + (r1 ^ 0xFFFF) + 1 # r2 - r1 with carry out
 
-        self.update_flags_for_add_sub(flags)
+        self.update_flags_for_add_sub(out & 0xFFFF, out >> 16)
 
         self.regs[dst] = out
-    @emulate.log_disassembly(format='sub reg[{dst}], reg[{r2_reg}], {r1_imm}')
-    def alu_sub_imm(self, r1_imm: Binary, r2_reg: int, dst: int):
-        r2_imm = self.regs[r2_reg]
-
-        self.alu_sub(r1_imm, r2_imm, dst)
-    @emulate.log_disassembly(format='sub reg[{dst}], reg[{r2_reg}], reg[{r1_reg}]')
+    @log_disassembly(format='sub reg[{dst}], reg[{r2_reg}], {r1_imm}')
+    def alu_sub_imm(self, r1_imm: int, r2_reg: int, dst: int):
+        self.alu_sub(r1_imm, self.regs[r2_reg], dst)
+    @log_disassembly(format='sub reg[{dst}], reg[{r2_reg}], reg[{r1_reg}]')
     def alu_sub_reg(self, r1_reg: int, r2_reg: int, dst: int):
-        r1_imm = self.regs[r1_reg]
-        r2_imm = self.regs[r2_reg]
-
-        self.alu_sub(r1_imm, r2_imm, dst)
+        self.alu_sub(self.regs[r1_reg], self.regs[r2_reg], dst)
         
     #######################
     # arsh implementation #
     #######################
 
-    def alu_arsh(self, imm_r1: Binary, imm_r2: Binary, dst: int):
-        r1 = ops.cast(imm_r1.extended_low(), 'unsigned')
-        r2 = ops.cast(imm_r2.extended_low(), 'unsigned')
-        
-        out = ops.arithmetic_wrapping_rsh(r1, r2)
-
-        #self.update_flags_for_add_sub(flags)
-
-        self.regs[dst] = out
-    @emulate.log_disassembly(format='arsh reg[{dst}], reg[{r2_reg}], {r1_imm}')
-    def alu_arsh_imm(self, r1_imm: Binary, r2_reg: int, dst: int):
-        r2_imm = self.regs[r2_reg]
-
-        self.alu_arsh(r1_imm, r2_imm, dst)
-    @emulate.log_disassembly(format='arsh reg[{dst}], reg[{r2_reg}], reg[{r1_reg}]')
+    def alu_arsh(self, r1: int, r2: int, dst: int):
+        # operands are unsigned, so there is no sign to extend (same as casting to unsigned before `arithmetic_wrapping_rsh`)
+        self.regs[dst] = r1 >> r2
+    @log_disassembly(format='arsh reg[{dst}], reg[{r2_reg}], {r1_imm}')
+    def alu_arsh_imm(self, r1_imm: int, r2_reg: int, dst: int):
+        self.alu_arsh(r1_imm, self.regs[r2_reg], dst)
+    @log_disassembly(format='arsh reg[{dst}], reg[{r2_reg}], reg[{r1_reg}]')
     def alu_arsh_reg(self, r1_reg: int, r2_reg: int, dst: int):
-        r1_imm = self.regs[r1_reg]
-        r2_imm = self.regs[r2_reg]
-
-        self.alu_arsh(r1_imm, r2_imm, dst)
+        self.alu_arsh(self.regs[r1_reg], self.regs[r2_reg], dst)
     
     ######################
     # rsh implementation #
     ######################
 
-    def alu_rsh(self, imm_r1: Binary, imm_r2: Binary, dst: int):
-        r1 = ops.cast(imm_r1.extended_low(), 'unsigned')
-        r2 = ops.cast(imm_r2.extended_low(), 'unsigned')
-        
-        out = ops.logical_wrapping_rsh(r2, r1)
-
-        #self.update_flags_for_add_sub(flags)
-
-        self.regs[dst] = out
-    @emulate.log_disassembly(format='rsh reg[{dst}], reg[{r2_reg}], {r1_imm}')
-    def alu_rsh_imm(self, r1_imm: Binary, r2_reg: int, dst: int):
-        r2_imm = self.regs[r2_reg]
-
-        self.alu_rsh(r1_imm, r2_imm, dst)
-    @emulate.log_disassembly(format='rsh reg[{dst}], reg[{r2_reg}], reg[{r1_reg}]')
+    def alu_rsh(self, r1: int, r2: int, dst: int):
+        self.regs[dst] = r2 >> r1
+    @log_disassembly(format='rsh reg[{dst}], reg[{r2_reg}], {r1_imm}')
+    def alu_rsh_imm(self, r1_imm: int, r2_reg: int, dst: int):
+        self.alu_rsh(r1_imm, self.regs[r2_reg], dst)
+    @log_disassembly(format='rsh reg[{dst}], reg[{r2_reg}], reg[{r1_reg}]')
     def alu_rsh_reg(self, r1_reg: int, r2_reg: int, dst: int):
-        r1_imm = self.regs[r1_reg]
-        r2_imm = self.regs[r2_reg]
-
-        self.alu_rsh(r1_imm, r2_imm, dst)
+        self.alu_rsh(self.regs[r1_reg], self.regs[r2_reg], dst)
 
     ######################
     # lsh implementation #
     ######################
 
-    def alu_lsh(self, imm_r1: Binary, imm_r2: Binary, dst: int):
-        r1 = ops.cast(imm_r1.extended_low(), 'unsigned')
-        r2 = ops.cast(imm_r2.extended_low(), 'unsigned')
-        
-        out = ops.wrapping_lsh(r2, r1)
-
-        #self.update_flags_for_add_sub(flags)
-
-        self.regs[dst] = out
-    @emulate.log_disassembly(format='lsh reg[{dst}], reg[{r2_reg}], {r1_imm}')
-    def alu_lsh_imm(self, r1_imm: Binary, r2_reg: int, dst: int):
-        r2_imm = self.regs[r2_reg]
-
-        self.alu_lsh(r1_imm, r2_imm, dst)
-    @emulate.log_disassembly(format='lsh reg[{dst}], reg[{r2_reg}], reg[{r1_reg}]')
+    def alu_lsh(self, r1: int, r2: int, dst: int):
+        self.regs[dst] = r2 << r1 if r1 < 16 else 0
+    @log_disassembly(format='lsh reg[{dst}], reg[{r2_reg}], {r1_imm}')
+    def alu_lsh_imm(self, r1_imm: int, r2_reg: int, dst: int):
+        self.alu_lsh(r1_imm, self.regs[r2_reg], dst)
+    @log_disassembly(format='lsh reg[{dst}], reg[{r2_reg}], reg[{r1_reg}]')
     def alu_lsh_reg(self, r1_reg: int, r2_reg: int, dst: int):
-        r1_imm = self.regs[r1_reg]
-        r2_imm = self.regs[r2_reg]
-
-        self.alu_lsh(r1_imm, r2_imm, dst)
+        self.alu_lsh(self.regs[r1_reg], self.regs[r2_reg], dst)
 
     ######################
     # mul implementation #
     ######################
 
-    def alu_mul(self, imm_r1: Binary, imm_r2: Binary, dst: int):
-        r1 = ops.cast(imm_r1.extended_low(), 'unsigned')
-        r2 = ops.cast(imm_r2.extended_low(), 'unsigned')
-        
-        out, _ = ops.overflowing_mul(r2, r1)
-
-        #self.update_flags_for_add_sub(flags)
-
-        self.regs[dst] = out
-    @emulate.log_disassembly(format='mul reg[{dst}], reg[{r2_reg}], {r1_imm}')
-    def alu_mul_imm(self, r1_imm: Binary, r2_reg: int, dst: int):
-        r2_imm = self.regs[r2_reg]
-
-        self.alu_mul(r1_imm, r2_imm, dst)
-    @emulate.log_disassembly(format='mul reg[{dst}], reg[{r2_reg}], reg[{r1_reg}]')
+    def alu_mul(self, r1: int, r2: int, dst: int):
+        self.regs[dst] = r2 * r1
+    @log_disassembly(format='mul reg[{dst}], reg[{r2_reg}], {r1_imm}')
+    def alu_mul_imm(self, r1_imm: int, r2_reg: int, dst: int):
+        self.alu_mul(r1_imm, self.regs[r2_reg], dst)
+    @log_disassembly(format='mul reg[{dst}], reg[{r2_reg}], reg[{r1_reg}]')
     def alu_mul_reg(self, r1_reg: int, r2_reg: int, dst: int):
-        r1_imm = self.regs[r1_reg]
-        r2_imm = self.regs[r2_reg]
-
-        self.alu_mul(r1_imm, r2_imm, dst)
+        self.alu_mul(self.regs[r1_reg], self.regs[r2_reg], dst)
     
     #############
     # ALU SHORT #
     #############
     
-    @emulate.log_disassembly(format='adc reg[{dst}], reg[{r2}], reg[{r1}]')
+    @log_disassembly(format='adc reg[{dst}], reg[{r2}], reg[{r1}]')
     def alu_adc(self, r1: int, r2: int, dst: int):
-        r1_imm = self.regs[r1]
-        r2_imm = self.regs[r2]
-        carry = self.regs[self.FL][1]
+        carry = self.regs[self.FL] & 0b10
         
-        out, flags = ops.flaged_add(r2_imm, r1_imm + 1 if carry else 0)
+        out = self.regs[r2] + (((self.regs[r1] + 1) & 0xFFFF) if carry else 0)
         
-        self.update_flags_for_add_sub(flags)
+        self.update_flags_for_add_sub(out & 0xFFFF, out >> 16)
 
         self.regs[dst] = out
-    @emulate.log_disassembly(format='sbc reg[{dst}], reg[{r2}], reg[{r1}]')
+    @log_disassembly(format='sbc reg[{dst}], reg[{r2}], reg[{r1}]')
     def alu_sbc(self, r1: int, r2: int, dst: int):
-        r1_imm = self.regs[r1]
-        r2_imm = self.regs[r2]
-        carry = self.regs[self.FL][1]
+        carry = self.regs[self.FL] & 0b10
         
-        out, flags = ops.flaged_sub(r2_imm, r1_imm + 1 if carry else 0)
+        out = self.regs[r2] + ((((self.regs[r1] + 1) & 0xFFFF) if carry else 0) ^ 0xFFFF) + 1
         
-        self.update_flags_for_add_sub(flags)
+        self.update_flags_for_add_sub(out & 0xFFFF, out >> 16)
 
         self.regs[dst] = out
     
-    @emulate.log_disassembly(format='xor reg[{dst}], {r1_neg}reg[{r2}], {r2_neg}reg[{r1}]')
+    @log_disassembly(format='xor reg[{dst}], {r1_neg}reg[{r2}], {r2_neg}reg[{r1}]')
     def alu_xor(self, r1: int, r2: int, dst: int, r1_neg: str, r2_neg: str):
-        r1_imm = self.regs[r1] if r1_neg == "" else ops.bitwise_not(self.regs[r1])
-        r2_imm = self.regs[r2] if r2_neg == "" else ops.bitwise_not(self.regs[r1])
+        r1_imm = self.regs[r1] if r1_neg == "" else self.regs[r1] ^ 0xFFFF
+        r2_imm = self.regs[r2] if r2_neg == "" else self.regs[r1] ^ 0xFFFF
         
-        self.regs[dst] = ops.bitwise_xor(r2_imm, r1_imm)
-    @emulate.log_disassembly(format='xnor reg[{dst}], {r1_neg}reg[{r2}], {r2_neg}reg[{r1}]')
+        self.regs[dst] = r2_imm ^ r1_imm
+    @log_disassembly(format='xnor reg[{dst}], {r1_neg}reg[{r2}], {r2_neg}reg[{r1}]')
     def alu_xnor(self, r1: int, r2: int, dst: int, r1_neg: str, r2_neg: str):
-        r1_imm = self.regs[r1] if r1_neg == "" else ops.bitwise_not(self.regs[r1])
-        r2_imm = self.regs[r2] if r2_neg == "" else ops.bitwise_not(self.regs[r1])
+        r1_imm = self.regs[r1] if r1_neg == "" else self.regs[r1] ^ 0xFFFF
+        r2_imm = self.regs[r2] if r2_neg == "" else self.regs[r1] ^ 0xFFFF
         
-        self.regs[dst] = ops.bitwise_not(ops.bitwise_xor(r2_imm, r1_imm))
+        self.regs[dst] = r2_imm ^ r1_imm ^ 0xFFFF
 
-    @emulate.log_disassembly(format='or reg[{dst}], {r1_neg}reg[{r2}], {r2_neg}reg[{r1}]')
+    @log_disassembly(format='or reg[{dst}], {r1_neg}reg[{r2}], {r2_neg}reg[{r1}]')
     def alu_or(self, r1: int, r2: int, dst: int, r1_neg: str, r2_neg: str):
-        r1_imm = self.regs[r1] if r1_neg == "" else ops.bitwise_not(self.regs[r1])
-        r2_imm = self.regs[r2] if r2_neg == "" else ops.bitwise_not(self.regs[r1])
+        r1_imm = self.regs[r1] if r1_neg == "" else self.regs[r1] ^ 0xFFFF
+        r2_imm = self.regs[r2] if r2_neg == "" else self.regs[r1] ^ 0xFFFF
         
-        self.regs[dst] = ops.bitwise_or(r2_imm, r1_imm)
-    @emulate.log_disassembly(format='nor reg[{dst}], {r1_neg}reg[{r2}], {r2_neg}reg[{r1}]')
+        self.regs[dst] = r2_imm | r1_imm
+    @log_disassembly(format='nor reg[{dst}], {r1_neg}reg[{r2}], {r2_neg}reg[{r1}]')
     def alu_nor(self, r1: int, r2: int, dst: int, r1_neg: str, r2_neg: str):
-        r1_imm = self.regs[r1] if r1_neg == "" else ops.bitwise_not(self.regs[r1])
-        r2_imm = self.regs[r2] if r2_neg == "" else ops.bitwise_not(self.regs[r1])
+        r1_imm = self.regs[r1] if r1_neg == "" else self.regs[r1] ^ 0xFFFF
+        r2_imm = self.regs[r2] if r2_neg == "" else self.regs[r1] ^ 0xFFFF
         
-        self.regs[dst] = ops.bitwise_not(ops.bitwise_or(r2_imm, r1_imm))
+        self.regs[dst] = (r2_imm | r1_imm) ^ 0xFFFF
     
     
     ######################
     # mov implementation #
     ######################
 
-    @emulate.log_disassembly(format='mov reg[{dst}], {const}')
-    def load_imm(self, const: Binary, dst: int):
+    @log_disassembly(format='mov reg[{dst}], {const}')
+    def load_imm(self, const: int, dst: int):
         self.regs[dst] = const
-    @emulate.log_disassembly(format='jmp {const}')
-    def jump(self, const: Binary):
+    @log_disassembly(format='jmp {const}')
+    def jump(self, const: int):
         self.regs[self.PC] = const
-    @emulate.log_disassembly(format='call {const}')
-    def call(self, const: Binary):
-        self.store(int(self.regs[self.SP]), self.regs[self.PC] + 1)
+    @log_disassembly(format='call {const}')
+    def call(self, const: int):
+        self.store(self.regs[self.SP], self.regs[self.PC] + 1)
         self.regs[self.SP] += 1
         self.regs[self.PC] = const
     
@@ -617,26 +1177,27 @@ class POTADOS_EMULATOR(emulate.EmulatorBase):
     ########################
     # cjmps implementation #
     ########################
+    # signed comparisons flip sign bit, so signed order becomes unsigned order
     
-    @emulate.log_disassembly(format='jge reg[{r1_value}], reg[{r2_value}], {offset}')
+    @log_disassembly(format='jge reg[{r1_value}], reg[{r2_value}], {offset}')
     def jge(self, r1_value, r2_value, offset):
-        r1 = ops.cast(self.regs[r1_value], 'signed')
-        r2 = ops.cast(self.regs[r2_value], 'signed')
+        r1 = self.regs[r1_value]
+        r2 = self.regs[r2_value]
 
         self.update_flags_for_jump(r1, r2)
 
-        if r1 >= r2:
-            self.regs[self.PC] = self.regs[self.PC] + ops.cast(offset, 'unsigned')
-    @emulate.log_disassembly(format='jl reg[{r1_value}], reg[{r2_value}], {offset}')
+        if r1 ^ 0x8000 >= r2 ^ 0x8000:
+            self.regs[self.PC] = self.regs[self.PC] + offset
+    @log_disassembly(format='jl reg[{r1_value}], reg[{r2_value}], {offset}')
     def jl(self, r1_value, r2_value, offset):
-        r1 = ops.cast(self.regs[r1_value], 'signed')
-        r2 = ops.cast(self.regs[r2_value], 'signed')
+        r1 = self.regs[r1_value]
+        r2 = self.regs[r2_value]
 
         self.update_flags_for_jump(r1, r2)
 
-        if r1 < r2:
-            self.regs[self.PC] = self.regs[self.PC] + ops.cast(offset, 'unsigned')
-    @emulate.log_disassembly(format='je reg[{r1_value}], reg[{r2_value}], {offset}')
+        if r1 ^ 0x8000 < r2 ^ 0x8000:
+            self.regs[self.PC] = self.regs[self.PC] + offset
+    @log_disassembly(format='je reg[{r1_value}], reg[{r2_value}], {offset}')
     def je(self, r1_value, r2_value, offset):
         r1 = self.regs[r1_value]
         r2 = self.regs[r2_value]
@@ -644,8 +1205,8 @@ class POTADOS_EMULATOR(emulate.EmulatorBase):
         self.update_flags_for_jump(r1, r2)
 
         if r1 == r2:
-            self.regs[self.PC] = self.regs[self.PC] + ops.cast(offset, 'unsigned')
-    @emulate.log_disassembly(format='jne reg[{r1_value}], reg[{r2_value}], {offset}')
+            self.regs[self.PC] = self.regs[self.PC] + offset
+    @log_disassembly(format='jne reg[{r1_value}], reg[{r2_value}], {offset}')
     def jne(self, r1_value, r2_value, offset):
         r1 = self.regs[r1_value]
         r2 = self.regs[r2_value]
@@ -653,8 +1214,8 @@ class POTADOS_EMULATOR(emulate.EmulatorBase):
         self.update_flags_for_jump(r1, r2)
 
         if r1 != r2:
-            self.regs[self.PC] = self.regs[self.PC] + ops.cast(offset, 'unsigned')
-    @emulate.log_disassembly(format='jae reg[{r1_value}], reg[{r2_value}], {offset}')
+            self.regs[self.PC] = self.regs[self.PC] + offset
+    @log_disassembly(format='jae reg[{r1_value}], reg[{r2_value}], {offset}')
     def jae(self, r1_value, r2_value, offset):
         r1 = self.regs[r1_value]
         r2 = self.regs[r2_value]
@@ -662,8 +1223,8 @@ class POTADOS_EMULATOR(emulate.EmulatorBase):
         self.update_flags_for_jump(r1, r2)
 
         if r1 >= r2:
-            self.regs[self.PC] = self.regs[self.PC] + ops.cast(offset, 'unsigned')
-    @emulate.log_disassembly(format='jb reg[{r1_value}], reg[{r2_value}], {offset}')
+            self.regs[self.PC] = self.regs[self.PC] + offset
+    @log_disassembly(format='jb reg[{r1_value}], reg[{r2_value}], {offset}')
     def jb(self, r1_value, r2_value, offset):
         r1 = self.regs[r1_value]
         r2 = self.regs[r2_value]
@@ -671,39 +1232,44 @@ class POTADOS_EMULATOR(emulate.EmulatorBase):
         self.update_flags_for_jump(r1, r2)
 
         if r1 < r2:
-            self.regs[self.PC] = self.regs[self.PC] + ops.cast(offset, 'unsigned')
+            self.regs[self.PC] = self.regs[self.PC] + offset
 
     # Version 11
-    @emulate.log_disassembly(format='jge reg[1]{r1_value}, reg[{r2_value}], {offset}')
+    @log_disassembly(format='jge reg[1]{r1_value}, reg[{r2_value}], {offset}')
     def jge_inc_dec(self, r1_value, r2_value, offset):
         if r1_value == "++":
             self.regs[1] += 1
         elif r1_value == "--":
             self.regs[1] -= 1
         
-        r1 = ops.cast(self.regs[1], 'signed')
-        r2 = ops.cast(self.regs[r2_value], 'signed')
+        r1 = self.regs[1]
+        r2 = self.regs[r2_value]
 
         self.update_flags_for_jump(r1, r2)
 
-        if r1 >= r2:
-            self.regs[self.PC] = self.regs[self.PC] + ops.cast(offset, 'unsigned')
-    @emulate.log_disassembly(format='jne reg[1]{r1_value}, reg[{r2_value}], {offset}')
+        if r1 ^ 0x8000 >= r2 ^ 0x8000:
+            self.regs[self.PC] = self.regs[self.PC] + offset
+    @log_disassembly(format='jne reg[1]{r1_value}, reg[{r2_value}], {offset}')
     def jne_inc_dec(self, r1_value, r2_value, offset):
         if r1_value == "++":
             self.regs[1] += 1
         elif r1_value == "--":
             self.regs[1] -= 1
         
-        r1 = ops.cast(self.regs[1], 'signed')
-        r2 = ops.cast(self.regs[r2_value], 'signed')
+        r1 = self.regs[1]
+        r2 = self.regs[r2_value]
 
         self.update_flags_for_jump(r1, r2)
 
         if r1 != r2:
-            self.regs[self.PC] = self.regs[self.PC] + ops.cast(offset, 'unsigned')
-
+            self.regs[self.PC] = self.regs[self.PC] + offset
 
+    # decoder tables (indexed by secondary decoder / flags)
+    BRANCHES = [jge, jl, je, jne, jae, jb]
+    ALU_LONG_IMM = [None, alu_add_imm, alu_sub_imm, None, alu_arsh_imm, alu_rsh_imm, alu_lsh_imm, alu_mul_imm]
+    ALU_LONG_REG = [None, alu_add_reg, alu_sub_reg, None, alu_arsh_reg, alu_lsh_reg, alu_rsh_reg, alu_mul_reg]
+    ALU_SHORT = {(True, True): alu_xnor, (True, False): alu_xor, (False, True): alu_nor, (False, False): alu_or}
+    FPU = [None, fadd, fsub, fmul, fdiv, ftoi, itof, utof]
 
     def write_memory(self, chunk_name: typing.Optional[str], type: emulate.DataTypes, data: dict):
         if type == emulate.DataTypes.DATA:
@@ -737,6 +1303,91 @@ class POTADOS_EMULATOR(emulate.EmulatorBase):
     def disable_ram_freeze(self):
         self.ram.DEBUG_FREEZE_RAM_WRITES = False
 
+    def enable_disassembly_trace(self):
+        self.DEBUG_TRACE_DISASSEMBLY = True
+    def disable_disassembly_trace(self):
+        self.DEBUG_TRACE_DISASSEMBLY = False
+
+    def enable_trace_recorder(self, capacity: int = TRACE_RECORDER.DEFAULT_CAPACITY):
+        self.recorder = self.regs.recorder = TRACE_RECORDER(capacity)
+    def disable_trace_recorder(self):
+        self.recorder = self.regs.recorder = None
+
+    def enable_time_travel(self, snapshot_interval: int = 10000, max_ticks: int = 1_000_000):
+        self.journal = self.regs.journal = self.ram.journal = JOURNAL(self, snapshot_interval, max_ticks)
+    def disable_time_travel(self):
+        self.journal = self.regs.journal = self.ram.journal = None
+
+    def enable_profiler(self):
+        self.profiler = PROFILER(self)
+    def disable_profiler(self):
+        self.profiler = None
+
+    def enable_cycle_accounting(self, costs: typing.Optional[dict] = None, time_per_cycle: typing.Optional[float] = None):
+        self.cycles = CYCLE_COUNTER(self, costs, time_per_cycle)
+    def disable_cycle_accounting(self):
+        self.cycles = None
+
+    def step_back(self, n: int = 1) -> int:
+        """Reverts last `n` ticks (time travel has to be enabled). Returns number of reverted ticks"""
+        if self.journal is None:
+            raise error.EmulationError("Time travel is not enabled")
+        return self.journal.step_back(n)
+    def run_back_to_write(self, address: int) -> typing.Optional[int]:
+        """
+        Goes back to the state right before the last write to ram[`address`]. 
+        Returns number of reverted ticks, None (without going back) when there is no such write in journal
+        """
+        if self.journal is None:
+            raise error.EmulationError("Time travel is not enabled")
+        back = self.journal.find_write(JOURNAL.REGISTER_LOCATIONS + (address & 0xFF))
+        if back is not None:
+            self.journal.step_back(back)
+        return back
+
+    def enable_shared_memory(self, name: typing.Optional[str] = None, path: typing.Optional[str] = None) -> SHARED_STATE:
+        """
+        Moves registers and ram into shared memory block `name` (random name if None) or memory-mapped file `path`.
+        Returns `SHARED_STATE` - its `name` (or `path`) is what viewers attach to
+        """
+        self.disable_shared_memory()
+        shared = SHARED_STATE(name, path)
+        shared.regs[:] = self.regs.regs
+        shared.ram[:] = self.ram.ram
+        self.regs.regs = memoryview(shared.regs)
+        self.ram.ram = shared.ram
+        self.shared = shared
+        return shared
+    def disable_shared_memory(self):
+        """Moves registers and ram back to private memory and releases shared block"""
+        if self.shared is None:
+            return
+        shared_regs = self.regs.regs
+        self.regs.regs = array('H', shared_regs)
+        self.ram.ram = self.ram.ram.copy()
+        shared_regs.release()
+        self.shared.close()
+        self.shared = None
+
+    def enable_spin_detection(self):
+        self.ram.io.spin = SPIN_DETECTOR(self)
+    def disable_spin_detection(self):
+        self.ram.io.spin = None
+
+    def attach_device(self, device: typing.Any, start: int, end: typing.Optional[int] = None):
+        """Maps io `device` (object with `read(port)` and `write(port, value)`) on ports `start`..`end`"""
+        self.ram.io.attach(device, start, end)
+    def set_io_output(self, target: typing.Union[None, list, typing.TextIO, typing.Callable[[typing.List[str]], None]] = None, batch: int = 256):
+        """Redirects console / debug output (see `OUTPUT_SINK`)"""
+        self.ram.io.output.flush()
+        self.ram.io.output.target = target
+        self.ram.io.output.batch = batch
+
+    def enable_block_translation(self):
+        self.block_translation = True
+    def disable_block_translation(self):
+        self.block_translation = False
+
     def get_ram_ref(self):
         return self.ram.ram
     def get_regs_ref(self):
@@ -748,61 +1399,545 @@ class REGS:
 
     def __init__(self, potados: POTADOS_EMULATOR):
         self.potados = potados
-        self.regs = [u16(0) for _ in range(0, 16)]
+        self.regs = array('H', bytes(2*16))
         self.pc_modified = False
-    def __getitem__(self, key: int) -> Binary: 
-        if key == 0:
-            return u16(0)
+        self.recorder: typing.Optional[TRACE_RECORDER] = None
+        self.journal: typing.Optional[JOURNAL] = None
+    def __getitem__(self, key: int) -> int: 
         return self.regs[key]
-    def __setitem__(self, key: int, val: Binary):
+    def __setitem__(self, key: int, val: typing.Union[int, Binary]):
         if self.DEBUG_FREEZE_WRITES:
             return
         if key == 0:
             return
 
-        if len(val) != 16:
-            val = val.extended_low()
-        val = ops.cast(val, 'unsigned')
-
         if key == self.potados.PC:
             self.pc_modified = True
 
-        self.regs[key] = val
+        if self.journal is not None:
+            self.journal.register_write(key, self.regs[key])
+        self.regs[key] = int(val) & 0xFFFF
+        if self.recorder is not None:
+            self.recorder.register_write(key, self.regs[key])
+    def view(self, key: int) -> Binary:
+        """Returns register value as `u16` (for debugging)"""
+        return u16(self.regs[key])
     def __str__(self) -> str:
-        return str(self.regs)
+        return str([self.view(key) for key in range(len(self.regs))])
     def enable_dummy_reg_writes(self):
         self.DEBUG_FREEZE_WRITES = True
     def disable_dummy_reg_writes(self):
         self.DEBUG_FREEZE_WRITES = False
     def increment_pc(self):
         if not self.pc_modified:
-            self.regs[self.potados.PC] += 1
+            self.regs[self.potados.PC] = (self.regs[self.potados.PC] + 1) & 0xFFFF
         self.pc_modified = False
 
-class IO:
-    def __init__(self, potados: typing.Optional[POTADOS_EMULATOR]):
-        self.potados = potados if potados is not None else POTADOS_EMULATOR()
-    def Null(self, val) -> int:
-        return 0
-    def ClockFlag(self, val) -> int:
-        return 0
-    def TimerValue(self, val) -> int:
-        raise error.EmulationError("TODO")
-    def TimerFlags(self, val) -> int:
-        raise error.EmulationError("TODO")
-    def Out0(self, val: Binary) -> int:
-        return 0
-    def Out1(self, val: Binary) -> int:
-        print(f"\tBINARY DISPLAY  -  {val.bin()}  -")
-        return 0
-    def Out2(self, val: Binary) -> int:
-        print(f"\tDBG  -  {int(val)}  -  {Binary(val).hex()} ")
-        return 0
-    def Out3(self, val) -> int:
+class OUTPUT_SINK:
+    """
+    Buffered text output of io devices. `target` is a list (lines are appended), file-like object or callback
+    taking list of lines (stdout by default). Lines are passed on in batches of `batch` lines and on `flush`
+    """
+    def __init__(self, target: typing.Union[None, list, typing.TextIO, typing.Callable[[typing.List[str]], None]] = None, batch: int = 256) -> None:
+        self.target = target
+        self.batch = batch
+        self.lines: typing.List[str] = []
+
+    def write(self, line: str):
+        self.lines.append(line)
+        if len(self.lines) >= self.batch:
+            self.flush()
+
+    def flush(self):
+        if not self.lines:
+            return
+        lines, self.lines = self.lines, []
+
+        target = self.target if self.target is not None else sys.stdout
+        if isinstance(target, list):
+            target.extend(lines)
+        elif callable(target):
+            target(lines)
+        else:
+            target.write('\n'.join(lines) + '\n')
+            target.flush()
+
+class CONSOLE_DEVICE:
+    """Write only device - every written value is formatted into line of `sink`"""
+    def __init__(self, sink: OUTPUT_SINK, format: typing.Callable[[int], str]) -> None:
+        self.sink = sink
+        self.format = format
+
+    def read(self, port: int) -> typing.Optional[int]:
+        return None
+    def write(self, port: int, value: int):
+        self.sink.write(self.format(value))
+
+class EVENT_SCHEDULER:
+    """
+    Device events ordered by machine time (`POTADOS_EMULATOR.now`). Events are fired lazily - before every io access 
+    and by `POTADOS_EMULATOR.fast_forward` - so devices only have to be consistent when they are observed.
+    """
+    def __init__(self) -> None:
+        self.events: typing.List[list] = [] # heap of [time, sequence, callback]
+        self.sequence = 0
+
+    def schedule(self, time: int, callback: typing.Callable[[int], None]) -> list:
+        """Calls `callback(time)` once machine time reaches `time`. Returned event can be cancelled"""
+        event = [time, self.sequence, callback]
+        self.sequence += 1
+        heapq.heappush(self.events, event)
+        return event
+
+    @staticmethod
+    def cancel(event: typing.Optional[list]):
+        if event is not None:
+            event[2] = None
+
+    NO_EVENT = (-1, -1)
+
+    @classmethod
+    def event_state(cls, event: typing.Optional[list]) -> typing.Tuple[int, int]:
+        """(time, sequence) of pending `event` for device state, `NO_EVENT` if there is none"""
+        return cls.NO_EVENT if event is None or event[2] is None else (event[0], event[1])
+
+    def rearm(self, state: typing.Sequence[int], callback: typing.Callable[[int], None]) -> typing.Optional[list]:
+        """Schedules event again from `event_state` (keeping its order among events of the same time)"""
+        time, sequence = (int(value) for value in state)
+        if time < 0:
+            return None
+        event = [time, sequence, callback]
+        heapq.heappush(self.events, event)
+        return event
+
+    def state(self) -> dict:
+        return {'sequence': self.sequence}
+    def restore(self, state: dict):
+        """Drops every event - devices rearm theirs in their `restore`"""
+        self.events = []
+        self.sequence = int(state['sequence'])
+
+    def next_time(self) -> typing.Optional[int]:
+        while self.events and self.events[0][2] is None:
+            heapq.heappop(self.events)
+        return self.events[0][0] if self.events else None
+
+    def fire(self, now: int):
+        """Fires every event due at `now` (in order, including events scheduled by fired ones)"""
+        while self.events and self.events[0][0] <= now:
+            time, _, callback = heapq.heappop(self.events)
+            if callback is not None:
+                callback(time)
+
+class CLOCK_DEVICE:
+    """
+    Clock at port 0x0001. Writing sets period in cycles (0 stops it). 
+    Read returns 1 if period elapsed since last read (and clears it), 0 otherwise
+    """
+    def __init__(self, bus: 'IO_BUS') -> None:
+        self.bus = bus
+        self.period = 0
+        self.flag = 0
+        self.event: typing.Optional[list] = None
+
+    def tick(self, time: int):
+        self.flag = 1
+        self.event = self.bus.scheduler.schedule(time + self.period, self.tick)
+
+    def read(self, port: int) -> typing.Optional[int]:
+        flag, self.flag = self.flag, 0
+        return flag
+    def write(self, port: int, value: int):
+        EVENT_SCHEDULER.cancel(self.event)
+        self.event = None
+        self.period = value
+        self.flag = 0
+        if value:
+            self.event = self.bus.scheduler.schedule(self.bus.now() + value, self.tick)
+
+    def state(self) -> dict:
+        return {'period': self.period, 'flag': self.flag, 'event': EVENT_SCHEDULER.event_state(self.event)}
+    def restore(self, state: dict):
+        self.period = int(state['period'])
+        self.flag = int(state['flag'])
+        self.event = self.bus.scheduler.rearm(state['event'], self.tick)
+
+class TIMER_DEVICE:
+    """
+    Countdown timer at ports 0x0002 (value) and 0x0003 (flags). Value is reload value in cycles, reads return
+    cycles left while timer is enabled. Flags: bit 0 - enabled, bit 1 - expired (write 0 to clear), bit 2 - repeat
+    (reload and count again on expiry, otherwise timer disables itself)
+    """
+    VALUE = 0x0002
+    FLAGS = 0x0003
+
+    ENABLED = 0b001
+    EXPIRED = 0b010
+    REPEAT  = 0b100
+
+    def __init__(self, bus: 'IO_BUS') -> None:
+        self.bus = bus
+        self.reload = 0
+        self.flags = 0
+        self.deadline = 0
+        self.event: typing.Optional[list] = None
+
+    def start(self, now: int):
+        EVENT_SCHEDULER.cancel(self.event)
+        self.deadline = now + self.reload
+        self.event = self.bus.scheduler.schedule(self.deadline, self.expire)
+
+    def expire(self, time: int):
+        self.event = None
+        self.flags |= self.EXPIRED
+        if self.flags & self.REPEAT and self.reload:
+            self.start(time)
+        else:
+            self.flags &= ~self.ENABLED
+
+    def read(self, port: int) -> typing.Optional[int]:
+        if port == self.FLAGS:
+            return self.flags
+        if self.flags & self.ENABLED:
+            return max(self.deadline - self.bus.now(), 0)
+        return self.reload
+
+    def write(self, port: int, value: int):
+        if port == self.VALUE:
+            self.reload = value
+            if self.flags & self.ENABLED:
+                self.start(self.bus.now())
+            return
+
+        was_enabled = self.flags & self.ENABLED
+        self.flags = value & (self.ENABLED | self.EXPIRED | self.REPEAT)
+        if self.flags & self.ENABLED and not was_enabled:
+            self.start(self.bus.now())
+        elif not self.flags & self.ENABLED:
+            EVENT_SCHEDULER.cancel(self.event)
+            self.event = None
+
+    def state(self) -> dict:
+        return {'reload': self.reload, 'flags': self.flags, 'deadline': self.deadline, 'event': EVENT_SCHEDULER.event_state(self.event)}
+    def restore(self, state: dict):
+        self.reload = int(state['reload'])
+        self.flags = int(state['flags'])
+        self.deadline = int(state['deadline'])
+        self.event = self.bus.scheduler.rearm(state['event'], self.expire)
+
+class GPU_DEVICE:
+    """
+    Gpu at ports 0x000c (status) and 0x000d (invoke) drawing into `WIDTH` x `HEIGHT` framebuffer of 4 bit colors.
+    Writing to invoke port executes command list from ram at written address. Every command is opcode word followed
+    by its arguments, list ends with `END`. Commands are drawn at once (each as one NumPy operation) - busy time is
+    only modeled: status reads `BUSY` until `COMMAND_CYCLES` per command plus one cycle per `PIXELS_PER_CYCLE` drawn
+    pixels pass. Invocations made while busy are queued after the current one. Bad command sets `ERROR` (cleared by next invoke).
+    """
+    STATUS = 0x000c
+    INVOKE = 0x000d
+
+    WIDTH = 32
+    HEIGHT = 32
+    COMMAND_CYCLES = 2
+    PIXELS_PER_CYCLE = 16
+    MAX_COMMANDS = 256
+
+    BUSY = 0b01
+    ERROR = 0b10
+
+    END = 0     # END
+    CLEAR = 1   # CLEAR color
+    PIXEL = 2   # PIXEL x, y, color
+    RECT = 3    # RECT x, y, width, height, color
+    LINE = 4    # LINE x0, y0, x1, y1, color
+    BLIT = 5    # BLIT x, y, width, height, address (width * height colors, row by row)
+    PRESENT = 6 # PRESENT (back buffer is copied to front buffer)
+    ARGUMENTS = {END: 0, CLEAR: 1, PIXEL: 3, RECT: 5, LINE: 5, BLIT: 5, PRESENT: 0}
+
+    # minecraft concrete colors (rgb) indexed by 4 bit color
+    PALETTE = [
+        (207, 213, 214), (224, 97, 0), (169, 48, 159), (35, 137, 198), (241, 175, 21), (94, 168, 24), (213, 101, 142), (54, 57, 61),
+        (125, 125, 115), (21, 119, 136), (100, 31, 156), (44, 46, 143), (96, 59, 31), (73, 91, 36), (142, 32, 32), (8, 10, 15),
+    ]
+
+    def __init__(self, bus: 'IO_BUS') -> None:
+        self.bus = bus
+        self.back = np.zeros((self.HEIGHT, self.WIDTH), dtype='uint8')
+        self.front = np.zeros((self.HEIGHT, self.WIDTH), dtype='uint8')
+        self.frames = 0
+        self.busy_until = 0
+        self.status = 0
+        self.event: typing.Optional[list] = None
+
+    def read(self, port: int) -> typing.Optional[int]:
+        if port == self.STATUS:
+            return self.status
+        return None
+
+    def write(self, port: int, value: int):
+        if port != self.INVOKE:
+            return
+
+        self.status &= ~self.ERROR
+        try:
+            pixels, commands = self.execute(value)
+        except error.EmulationError:
+            self.status |= self.ERROR
+            return
+
+        now = self.bus.now()
+        self.busy_until = max(self.busy_until, now) + commands * self.COMMAND_CYCLES + -(-pixels // self.PIXELS_PER_CYCLE)
+        EVENT_SCHEDULER.cancel(self.event)
+        self.status |= self.BUSY
+        self.event = self.bus.scheduler.schedule(self.busy_until, self.done)
+
+    def done(self, time: int):
+        self.event = None
+        self.status &= ~self.BUSY
+
+    def state(self) -> dict:
+        back, front = self.back.copy(), self.front.copy()
+        back.flags.writeable = front.flags.writeable = False
+        return {'back': back, 'front': front, 'frames': self.frames, 'busy_until': self.busy_until, 'status': self.status, 
+                'event': EVENT_SCHEDULER.event_state(self.event)}
+    def restore(self, state: dict):
+        self.back[:] = state['back']
+        self.front[:] = state['front']
+        self.frames = int(state['frames'])
+        self.busy_until = int(state['busy_until'])
+        self.status = int(state['status'])
+        self.event = self.bus.scheduler.rearm(state['event'], self.done)
+
+    def execute(self, address: int) -> typing.Tuple[int, int]:
+        """Draws command list at `address`. Returns number of drawn pixels and executed commands"""
+        ram = self.bus.memory.ram if self.bus.memory is not None else np.zeros((256), dtype='uint16')
+        word = lambda offset: int(ram[(address + offset) & 0xFF])
+        pixels = 0
+
+        offset = 0
+        for commands in range(1, self.MAX_COMMANDS + 1):
+            opcode = word(offset)
+            if opcode not in self.ARGUMENTS:
+                raise error.EmulationError(f"Invalid gpu command {opcode} at {(address + offset) & 0xFFFF}")
+            args = [word(offset + 1 + i) for i in range(self.ARGUMENTS[opcode])]
+            offset += 1 + len(args)
+
+            if opcode == self.END:
+                return pixels, commands
+            pixels += self.draw(opcode, args, ram)
+        raise error.EmulationError(f"Gpu command list at {address} has no END")
+
+    def draw(self, opcode: int, args: typing.List[int], ram: np.ndarray) -> int:
+        back = self.back
+        if opcode == self.CLEAR:
+            back[:] = args[0] & 0xF
+            return back.size
+        if opcode == self.PIXEL:
+            x, y, color = args
+            if x < self.WIDTH and y < self.HEIGHT:
+                back[y, x] = color & 0xF
+            return 1
+        if opcode == self.RECT:
+            x, y, width, height, color = args
+            area = back[y:y + height, x:x + width]
+            area[:] = color & 0xF
+            return area.size
+        if opcode == self.LINE:
+            x0, y0, x1, y1, color = args
+            n = max(abs(x1 - x0), abs(y1 - y0)) + 1
+            xs = np.rint(np.linspace(x0, x1, n)).astype('int64')
+            ys = np.rint(np.linspace(y0, y1, n)).astype('int64')
+            inside = (xs < self.WIDTH) & (ys < self.HEIGHT)
+            back[ys[inside], xs[inside]] = color & 0xF
+            return n
+        if opcode == self.BLIT:
+            x, y, width, height, source = args
+            area = back[y:y + height, x:x + width]
+            rows, columns = area.shape
+            # only the visible part of sprite is read, rows of it are `width` words apart
+            area[:] = ram[(source + np.arange(rows)[:, None] * width + np.arange(columns)) & 0xFF] & 0xF
+            return area.size
+        if opcode == self.PRESENT:
+            self.front[:] = back
+            self.frames += 1
+            return 0
         return 0
 
-    ADDRESSES = [Null, ClockFlag, TimerValue, TimerFlags, Out0, Out1, Out2, Out3]        
+    def rgb(self, frame: typing.Optional[np.ndarray] = None) -> np.ndarray:
+        """Front buffer (or `frame`) as (height, width, 3) uint8 image"""
+        return np.array(self.PALETTE, dtype='uint8')[self.front if frame is None else frame]
+
+    def save(self, path: str, frame: typing.Optional[np.ndarray] = None):
+        """Saves front buffer (or `frame`) as .png image or raw .npy color indices"""
+        frame = self.front if frame is None else frame
+        if path.endswith('.npy'):
+            np.save(path, frame)
+            return
 
+        import zlib
+        def chunk(kind: bytes, data: bytes) -> bytes:
+            return struct.pack('>I', len(data)) + kind + data + struct.pack('>I', zlib.crc32(kind + data))
+
+        height, width = frame.shape
+        rows = b''.join(b'\x00' + row.tobytes() for row in frame.astype('uint8'))
+        with open(path, 'wb') as f:
+            f.write(b'\x89PNG\r\n\x1a\n')
+            f.write(chunk(b'IHDR', struct.pack('>IIBBBBB', width, height, 8, 3, 0, 0, 0)))
+            f.write(chunk(b'PLTE', bytes(value for color in self.PALETTE for value in color)))
+            f.write(chunk(b'IDAT', zlib.compress(rows)))
+            f.write(chunk(b'IEND', b''))
+
+class SPIN_DETECTOR:
+    """
+    Detects programs spinning on io port. When device read at some pc returns the same value as the previous device
+    access did, with identical registers and ram, execution in between is a loop that will repeat until device state
+    changes - and devices change state only in scheduled events. Loop iterations before the next event are skipped
+    by advancing tick / cycle counters. Io writes and reads of other ports break detection.
+    Skipping happens only inside `run` - skipped ticks count towards its `max_ticks` (and are never skipped past it).
+    """
+    def __init__(self, potados: 'POTADOS_EMULATOR') -> None:
+        self.cpu = potados
+        self.last: typing.Optional[tuple] = None    # (state, now, ticks, cycles, per pc cycles) of the last device read
+        self.skipped_iterations = 0
+        self.skipped_ticks = 0
+        self.budget = 0  # ticks that can be skipped, set by `run`
+        self.pending = 0 # skipped ticks not yet counted by `run`
+
+    def reset(self):
+        self.last = None
+
+    def poll(self, port: int, value: typing.Optional[int]):
+        cpu = self.cpu
+        state = (port, value, bytes(cpu.regs.regs), cpu.ram.ram.tobytes())
+        now, ticks = cpu.now(), cpu.ticks
+        cycles = cpu.cycles.total if cpu.cycles is not None else 0
+        per_pc = cpu.cycles.per_pc.copy() if cpu.cycles is not None else None
+
+        last, self.last = self.last, (state, now, ticks, cycles, per_pc)
+        if last is None or last[0] != state:
+            return
+        if cpu.journal is not None or cpu.recorder is not None or cpu.profiler is not None:
+            return # they need every tick
+
+        period, period_ticks, period_cycles = now - last[1], ticks - last[2], cycles - last[3]
+        at = cpu.ram.io.scheduler.next_time()
+        if at is None or period <= 0 or period_ticks <= 0:
+            return
+
+        # polls before `at` would read the same value
+        iterations = min((at - now - 1) // period, self.budget // period_ticks)
+        if iterations <= 0:
+            return
+        skipped = iterations * period_ticks
+        cpu.ticks += skipped
+        if cpu.cycles is not None:
+            cpu.cycles.total += iterations * period_cycles
+            cpu.cycles.per_pc += np.uint64(iterations) * (per_pc - last[4])
+            per_pc = cpu.cycles.per_pc.copy()
+
+        self.budget -= skipped
+        self.pending += skipped
+        self.skipped_iterations += iterations
+        self.skipped_ticks += skipped
+        self.last = (state, cpu.now(), cpu.ticks, cycles + iterations * period_cycles, per_pc)
+
+class IO_BUS:
+    """
+    Memory mapped io (addresses 0x0000 - 0x00FF). Devices are attached to port ranges and dispatched through
+    256 entry tables of their `read(port)` / `write(port, value)` methods. `read` returning None (and every unmapped port) 
+    reads ram word underneath, as io writes are mirrored into ram. Devices with `flush` are flushed by `flush`.
+    Due device events are fired before every access. Devices with `state` / `restore` are part of snapshots.
+    """
+    PORTS = 0x0100
+
+    def __init__(self, potados: typing.Optional[POTADOS_EMULATOR], memory: typing.Optional['RAM'] = None, 
+                 output: typing.Optional[OUTPUT_SINK] = None) -> None:
+        self.potados = potados
+        self.memory = memory
+        self.readers: typing.List[typing.Optional[typing.Callable[[int], typing.Optional[int]]]] = [None] * self.PORTS
+        self.writers: typing.List[typing.Optional[typing.Callable[[int, int], None]]] = [None] * self.PORTS
+        self.devices: typing.List[typing.Tuple[int, int, typing.Any]] = []
+        self.output = OUTPUT_SINK() if output is None else output
+        self.scheduler = EVENT_SCHEDULER()
+        self.spin: typing.Optional[SPIN_DETECTOR] = None # see `POTADOS_EMULATOR.enable_spin_detection`
+
+        self.attach(CLOCK_DEVICE(self), 0x0001)
+        self.attach(TIMER_DEVICE(self), TIMER_DEVICE.VALUE, TIMER_DEVICE.FLAGS)
+        self.attach(CONSOLE_DEVICE(self.output, lambda value: f"\tBINARY DISPLAY  -  {value:016b}  -"), 0x0005)
+        self.attach(CONSOLE_DEVICE(self.output, lambda value: f"[PotaDOS] [DBG] {value}"), 0x0006)
+        self.gpu = GPU_DEVICE(self)
+        self.attach(self.gpu, GPU_DEVICE.STATUS, GPU_DEVICE.INVOKE)
+
+    def attach(self, device: typing.Any, start: int, end: typing.Optional[int] = None):
+        """Maps `device` on ports `start`..`end` (inclusive), replacing whatever was mapped there"""
+        end = start if end is None else end
+        if not 0 <= start <= end < self.PORTS:
+            raise error.EmulationError(f"Invalid io port range: {start}..{end}")
+
+        self.detach(start, end)
+        self.devices.append((start, end, device))
+        for port in range(start, end + 1):
+            self.readers[port] = device.read
+            self.writers[port] = device.write
+
+    def detach(self, start: int, end: typing.Optional[int] = None):
+        """Unmaps ports `start`..`end` (devices that still have other ports mapped stay attached)"""
+        end = start if end is None else end
+        for port in range(start, end + 1):
+            self.readers[port] = None
+            self.writers[port] = None
+        self.devices = [(first, last, device) for first, last, device in self.devices
+                        if any(self.writers[port] == device.write for port in range(first, last + 1))]
+
+    def now(self) -> int:
+        return self.potados.now() if self.potados is not None else 0
+
+    def stateful_devices(self) -> typing.List[typing.Any]:
+        return [device for _, _, device in self.devices if hasattr(device, 'state')]
+
+    def state(self) -> typing.Tuple[dict, ...]:
+        """State of scheduler followed by states of devices (with their pending events)"""
+        return (self.scheduler.state(),) + tuple(device.state() for device in self.stateful_devices())
+
+    def restore(self, state: typing.Tuple[dict, ...]):
+        """Brings back `state`. Events of devices without `state` are dropped"""
+        devices = self.stateful_devices()
+        if len(state) != len(devices) + 1:
+            raise error.EmulationError(f'Device state of {len(state) - 1} devices can\'t be restored into {len(devices)} devices')
+        self.scheduler.restore(state[0])
+        for device, device_state in zip(devices, state[1:]):
+            device.restore(device_state)
+
+    def read(self, port: int) -> typing.Optional[int]:
+        reader = self.readers[port]
+        if reader is None:
+            return None
+        if self.potados is not None and self.potados.journal is not None:
+            self.potados.journal.device_access()
+        if self.scheduler.events:
+            self.scheduler.fire(self.now())
+        value = reader(port)
+        if self.spin is not None:
+            self.spin.poll(port, value)
+        return value
+
+    def write(self, port: int, value: int):
+        writer = self.writers[port]
+        if writer is None:
+            return
+        if self.potados is not None and self.potados.journal is not None:
+            self.potados.journal.device_access()
+        if self.scheduler.events:
+            self.scheduler.fire(self.now())
+        if self.spin is not None:
+            self.spin.reset()
+        writer(port, value)
+
+    def flush(self):
+        self.output.flush()
+        for _, _, device in self.devices:
+            if hasattr(device, 'flush'):
+                device.flush()
 
 class RAM:
     DEBUG_LOG_RAM_MOVMENT = False 
@@ -816,33 +1951,34 @@ class RAM:
         else:
             self.ram: np.ndarray = ram.astype('uint16')
         self.ram = self.ram[:256]
-        self.io = IO(potados)
+        self.io = IO_BUS(potados, self)
+        self.journal: typing.Optional[JOURNAL] = None
 
     
-    def __getitem__(self, key: typing.Union[int, Binary]) -> Binary:
+    def __getitem__(self, key: typing.Union[int, Binary]) -> int:
         key = int(key)
 
-        bus = u16(0)
-        if key < 0x0100:
-            bus = self.io_get(key)
         if key >= 0x0200:
             if self.DEBUG_RISE_ON_OUT_OF_BOUNDS:
                 raise error.EmulationError(f"Ram address out of bounds: {key}")
-            bus = u16(0)
+            bus = 0
         else:
-            bus = u16(int(self.ram[key-0x0100]))
+            bus = int(self.ram[key-0x0100])
+            if key < 0x0100:
+                device = self.io_get(key)
+                if device is not None:
+                    bus = device & 0xFFFF
 
         if self.DEBUG_LOG_RAM_MOVMENT:
-            print(f"READ {key} (BUS: {bus.extended_low()})")
+            print(f"READ {key} (BUS: {u16(bus)})")
         return bus
         
     def __setitem__(self, key: typing.Union[int, Binary], val: typing.Union[int, Binary]):
         key = int(key)
-        if not isinstance(val, Binary):
-            val = Binary(val, lenght=16)
+        val = int(val) & 0xFFFF
         if key < 0x0100:
             if self.DEBUG_LOG_RAM_MOVMENT:
-                print(f"WRITE: {key} (BUS: {val.extended_low()})")
+                print(f"WRITE: {key} (BUS: {u16(val)})")
             self.io_set(key, val)
         if key >= 0x0200:
             if self.DEBUG_RISE_ON_OUT_OF_BOUNDS:
@@ -851,28 +1987,18 @@ class RAM:
         if self.DEBUG_FREEZE_RAM_WRITES:
             return
         if self.DEBUG_LOG_RAM_MOVMENT:
-                print(f"WRITE: {key} (BUS: {val.extended_low()})")
-        self.ram[key-0x0100] = int(val.extended_low())
-
+                print(f"WRITE: {key} (BUS: {u16(val)})")
+        if self.journal is not None:
+            self.journal.ram_write(key & 0xFF, int(self.ram[key-0x0100]))
+        self.ram[key-0x0100] = val
 
-    def io_set(self, index: int, val: Binary):
-        if index > 0x0100:
-            raise
-
-        if index <= 0x001f:
-            self.io.ADDRESSES[index](self.io, val)
-        
-        if index == 6:
-            print(f"[PotaDOS] [DBG] {val.int()}")
 
-    def io_get(self, index: int) -> Binary:
-        if index > 0x0100:
-            raise
+    def io_set(self, index: int, val: int):
+        self.io.write(index, val)
 
-        if index <= 0x001f:
-            return self.io.ADDRESSES[index](self.io, 0)
-        
-        return u16(0)
+    def io_get(self, index: int) -> typing.Optional[int]:
+        """Value read from device at port `index`, None if it reads ram underneath"""
+        return self.io.read(index)
     
     def enable_ram_bus_logging(self):
         self.DEBUG_LOG_RAM_MOVMENT = True
@@ -885,403 +2011,1153 @@ class RAM:
         self.DEBUG_FREEZE_RAM_WRITES = False
 
 
+#############
+# rom image #
+#############
+# Prebuilt program as 16 byte header (magic, word size in bits, number of words) followed by little-endian uint32 
+# words - loaded with one memory-mapped copy, without profile and assembler. Plain `.npy` arrays are accepted as well
+
+ROM_IMAGE_MAGIC = b'POTADOS\x00'
+ROM_IMAGE_HEADER = struct.Struct('<8sII')
+ROM_WORD_BITS = 22
+
+def check_rom_words(words: np.ndarray, source: str):
+    """Raises when `words` are not 1d integers in [0, 2**ROM_WORD_BITS)"""
+    if words.ndim != 1 or words.dtype.kind not in 'ui':
+        raise error.EmulationError(f'{source} is not 1d array of integer words')
+    if words.size and (int(words.min()) < 0 or int(words.max()) >> ROM_WORD_BITS):
+        raise error.EmulationError(f'{source} words have to fit in {ROM_WORD_BITS} bits')
+
+def rom_image_words(program: typing.Union[dict, np.ndarray, typing.Sequence[int]]) -> np.ndarray:
+    if isinstance(program, dict):
+        words = np.zeros(max(program, default=-1) + 1, dtype='int64')
+        words[list(program.keys())] = list(program.values())
+    else:
+        words = np.asarray(program)
+        if words.size == 0:
+            words = np.zeros(0, dtype='<u4')
+    check_rom_words(words, 'Rom image')
+    return words.astype('<u4')
+
+def save_rom_image(path: str, program: typing.Union[dict, np.ndarray, typing.Sequence[int]]):
+    """Writes `program` (`{address: word}` from assembler or array of words) as rom image, or as `.npy` by extension"""
+    words = rom_image_words(program)
+    if path.endswith('.npy'):
+        np.save(path, words)
+        return
+    with open(path, 'wb') as f:
+        f.write(ROM_IMAGE_HEADER.pack(ROM_IMAGE_MAGIC, ROM_WORD_BITS, len(words)))
+        f.write(words.tobytes())
+
+def load_rom_image(path: str) -> np.ndarray:
+    """Read-only memory-mapped words of rom image (or `.npy` file), checked to fit in rom words"""
+    with open(path, 'rb') as f:
+        header = f.read(ROM_IMAGE_HEADER.size)
+    if header.startswith(b'\x93NUMPY'):
+        words = np.load(path, mmap_mode='r')
+        check_rom_words(words, f'"{path}"')
+        return words
+
+    if len(header) != ROM_IMAGE_HEADER.size:
+        raise error.EmulationError(f'"{path}" is too short to be rom image')
+    magic, bits, count = ROM_IMAGE_HEADER.unpack(header)
+    if magic != ROM_IMAGE_MAGIC or bits != ROM_WORD_BITS:
+        raise error.EmulationError(f'"{path}" is not PotaDOS rom image')
+    if os.path.getsize(path) != ROM_IMAGE_HEADER.size + 4 * count:
+        raise error.EmulationError(f'Rom image "{path}" should have {count} words')
+    if count == 0:
+        return np.zeros(0, dtype='<u4')
+    words = np.memmap(path, dtype='<u4', mode='r', offset=ROM_IMAGE_HEADER.size, shape=(count,))
+    check_rom_words(words, f'"{path}"')
+    return words
+
 class ROM:
     def __init__(self, potados: typing.Optional[POTADOS_EMULATOR], ROM_SIZE) -> None: 
         self.cpu = potados
         self.rom = np.zeros((ROM_SIZE), dtype='uint32')
+        self.decoded = [POTADOS_EMULATOR.decode(0)] * ROM_SIZE
+        self.fast_decoded = [undecorated(POTADOS_EMULATOR.decode(0))] * ROM_SIZE
+        self.frozen_rom: typing.Optional[np.ndarray] = None
 
     def program_rom(self, data: dict):
+        self.frozen_rom = None
         for address, value in data.items():
             self.rom[address] = value
+            self.decoded[address] = POTADOS_EMULATOR.decode(int(self.rom[address]))
+            self.fast_decoded[address] = undecorated(self.decoded[address])
+        
+        if self.cpu is not None:
+            self.cpu.blocks.invalidate(data.keys())
     
+    def invalidate(self):
+        """
+        Decodes whole rom again. Call it after writing to `self.rom` directly
+        """
+        self.frozen_rom = None
+        self.decoded = [POTADOS_EMULATOR.decode(int(value)) for value in self.rom]
+        self.fast_decoded = [undecorated(entry) for entry in self.decoded]
+
+        if self.cpu is not None:
+            self.cpu.blocks.invalidate()
+
+    def frozen(self) -> np.ndarray:
+        """Read-only copy of rom (for snapshots). It is made once and shared until rom changes"""
+        if self.frozen_rom is None:
+            self.frozen_rom = self.rom.copy()
+            self.frozen_rom.flags.writeable = False
+        return self.frozen_rom
+
+    @staticmethod
+    def is_immutable(array: typing.Any) -> bool:
+        """True for read-only uint32 array that doesn't share memory with any writeable one"""
+        if not isinstance(array, np.ndarray) or array.dtype != np.uint32:
+            return False
+        while isinstance(array, np.ndarray):
+            if array.flags.writeable:
+                return False
+            array = array.base
+        return True
+
+    def load(self, rom: typing.Union[np.ndarray, typing.Sequence[int]]):
+        """Replaces whole rom with `rom`. Immutable `rom` becomes frozen copy of it (snapshots share it)"""
+        words = np.asarray(rom)
+        check_rom_words(words, 'Rom')
+        self.rom = np.array(words, dtype='uint32')
+        self.invalidate()
+        if self.is_immutable(rom):
+            self.frozen_rom = rom
+
+    def load_image(self, path: str):
+        """Loads prebuilt program from rom image (or `.npy`) into the beginning of rom, rest of rom is cleared"""
+        words = load_rom_image(path)
+        if len(words) > len(self.rom):
+            raise error.EmulationError(f'Rom image "{path}" has {len(words)} words, rom has only {len(self.rom)}')
+        rom = np.zeros(len(self.rom), dtype='uint32')
+        rom[:len(words)] = words
+        rom.flags.writeable = False
+        self.load(rom)
+
+    def save_image(self, path: str):
+        save_rom_image(path, self.rom)
+
     def __getitem__(self, address: int) -> Binary:
         return Binary(int(self.rom[address]), lenght=22)
     
-def get_emulator() -> POTADOS_EMULATOR:
-    return POTADOS_EMULATOR()
-
-
-# To pulloff tests just run 
-# python -m unittest profiles\potados_emulator.py 
-# from \Lord-s-asm-for-mc\ 
-# (or debug this file inside vs code)
-
-class RAM_TESTS(unittest.TestCase):
-    def test_get_ram_default(self):
-        ram = RAM(None, None)
-
-        self.assertEqual(ram[0x0100], u16(0))
-        self.assertEqual(ram[0x0101], u16(0))
-        self.assertEqual(ram[0x01FF], u16(0))
-        self.assertEqual(ram[0x0200], u16(0))
-        self.assertEqual(ram.ram.shape, (256,))
-
-    def test_get_ram_ones(self):
-        ram = RAM(None, np.ones((256)))
-
-        self.assertEqual(ram[0x0100], u16(1))
-        self.assertEqual(ram[0x0101], u16(1))
-        self.assertEqual(ram[0x01FF], u16(1))
-        self.assertEqual(ram[0x0200], u16(0))
-        self.assertEqual(ram.ram.shape, (256,))
-
-    def test_get_ram_ones_from_bigger_array(self):
-        ram = RAM(None, np.ones((1024)))
-
-        self.assertEqual(ram[0x0100], u16(1))
-        self.assertEqual(ram[0x0101], u16(1))
-        self.assertEqual(ram[0x01FF], u16(1))
-        self.assertEqual(ram[0x0200], u16(0))
-        self.assertEqual(ram.ram.shape, (256,))
-    
-    def test_set_ram(self):
-        ram = RAM(None, np.ones((256)))
-
-        ram[0x0100] = 255
-        self.assertEqual(ram[0x0100], u16(255))
-        ram[0x0100] = -1
-        self.assertEqual(ram[0x0100], u16(2**16-1)) #u16 max 
-        ram[0x01FF] = 255
-        self.assertEqual(ram[0x01FF], u16(255))
-        ram[0x0200] = 255
-        self.assertEqual(ram[0x0200], u16(0))
-
-    def test_get_io(self):
-        pass
-    def test_set_io(self):
-        pass
-
-class ROM_TESTS(unittest.TestCase):
-    def test_rom(self):
-        rom = ROM(None, 4096)
-
-        rom.program_rom({0: 0, 1: 1, 2: 2, 3: 3})
-
-        self.assertEqual(rom[0], Binary(0, lenght=22))
-        self.assertEqual(rom[1], Binary(1, lenght=22))
-        self.assertEqual(rom[2], Binary(2, lenght=22))
-        self.assertEqual(rom[3], Binary(3, lenght=22))
-        
-        self.assertEqual(rom.rom.shape, (4096,))
-
-
-class REGS_TESTS(unittest.TestCase):
-    def test_read_write(self):
-        potados = POTADOS_EMULATOR()
-        regs = potados.regs
-
-        for i in range(16):
-            self.assertEqual(regs[i], u16(0))
-        
-        for i in range(16):
-            regs[i] = i16(1)
-        
-        self.assertEqual(regs[0], u16(0))
-        self.assertEqual(regs[1], u16(1))
-        self.assertEqual(regs[2], u16(1))
-        self.assertEqual(regs[3], u16(1))
-        self.assertEqual(regs[15], u16(1))
-        self.assertEqual(regs[8], u16(1))
-        self.assertEqual(regs[7], u16(1))
-
-        regs.enable_dummy_reg_writes()
-
-        for i in range(16):
-            regs[i] = i16(255)
-
-        self.assertEqual(regs[0], u16(0))
-        self.assertEqual(regs[1], u16(1))
-        self.assertEqual(regs[2], u16(1))
-        self.assertEqual(regs[3], u16(1))
-        self.assertEqual(regs[15], u16(1))
-        self.assertEqual(regs[8], u16(1))
-        self.assertEqual(regs[7], u16(1))
-
-        regs.disable_dummy_reg_writes()
-
-    def test_pc_modified(self):
-        potados = POTADOS_EMULATOR()
-        regs = potados.regs
-
-        self.assertEqual(regs[potados.PC], u16(0))
-        regs[potados.PC] = i16(1)
+class BLOCK_CACHE:
+    """
+    Translation cache of basic blocks. Straight-line code starting at given pc is translated (once) into single python 
+    function that works directly on integer registers and ram, and returns pc of the next block.
+    Blocks are invalidated when rom is reprogrammed.
+    """
+    MAX_BLOCK_LENGTH = 64
+
+    def __init__(self, potados: POTADOS_EMULATOR) -> None:
+        self.cpu = potados
+        self.blocks: typing.Dict[int, typing.Tuple[typing.Callable, int]] = {}
+        self.start = 0 # start of block being translated
 
-        self.assertTrue(regs.pc_modified)
+    def invalidate(self, addresses: typing.Optional[typing.Iterable[int]] = None):
+        if addresses is None:
+            self.blocks.clear()
+            return
         
-        self.assertEqual(regs[potados.PC], u16(1))
-        regs.increment_pc()
-
-        self.assertEqual(regs[potados.PC], u16(1))
-        regs.increment_pc()
-
-        self.assertEqual(regs[potados.PC], u16(2))
-        regs.increment_pc()
+        addresses = set(addresses)
+        for start, (_, length) in list(self.blocks.items()):
+            if not addresses.isdisjoint(range(start, start + length)):
+                del self.blocks[start]
+
+    def is_applicable(self) -> bool:
+        """Translated blocks skip debug hooks (and disassembly logging), so they can be used only if none is enabled"""
+        return not (self.cpu.regs.DEBUG_FREEZE_WRITES or self.cpu.DEBUG_HALT_ON_NOP or self.cpu.DEBUG_TRACE_DISASSEMBLY or
+                    self.cpu.recorder is not None or self.cpu.journal is not None or self.cpu.profiler is not None or
+                    self.cpu.cycles is not None or self.cpu.ram.io.spin is not None or 
+                    self.cpu.ram.DEBUG_LOG_RAM_MOVMENT or self.cpu.ram.DEBUG_FREEZE_RAM_WRITES)
+
+    def get(self, pc: int) -> typing.Tuple[typing.Callable, int]:
+        block = self.blocks.get(pc)
+        if block is None:
+            block = self.blocks[pc] = self.translate(pc)
+        return block
+
+    def run(self, budget: int) -> int:
+        """
+        Executes whole blocks while they fit in `budget`, then single instructions up to `budget`. 
+        Returns number of executed instructions
+        """
+        cpu = self.cpu
+        R = cpu.regs.regs
+        M = memoryview(cpu.ram.ram)
+        blocks = self.blocks
+        PC = cpu.PC
+        ticks = 0
+
+        if cpu.regs.pc_modified and cpu.is_running_flag and budget > 0:
+            # pc was written from outside - interpreter won't increment it after next instruction
+            cpu.next_tick()
+            ticks += 1
+
+        while cpu.is_running_flag and ticks < budget:
+            block = blocks.get(R[PC])
+            if block is None:
+                if R[PC] >= len(cpu.rom.decoded):
+                    break # let the interpreter fail on the right tick
+                block = self.get(R[PC])
+            function, length = block
+
+            if ticks + length > budget:
+                break
 
-        self.assertEqual(regs[potados.PC], u16(3))
+            R[PC] = function(R, M)
+            cpu.ticks += length
+            ticks += length
 
+        while cpu.is_running_flag and ticks < budget:
+            cpu.next_tick()
+            ticks += 1
 
-        
+        return ticks
 
+    def translate(self, start: int) -> typing.Tuple[typing.Callable, int]:
+        decoded = self.cpu.rom.decoded
+        namespace = {'cpu': self.cpu, 'regs': self.cpu.regs, 'load': self.cpu.load, 'store': self.cpu.store}
+        lines = []
 
-class POTADOS_TESTS(unittest.TestCase):
-    def test_mov(self):
-        potados = POTADOS_EMULATOR()
+        self.start = address = start
+        while True:
+            handler, args = decoded[address]
+            
+            translator = self.TRANSLATORS.get(handler, BLOCK_CACHE.generic)
+            body, is_terminator = translator(self, address, *args)
 
-        potados.load_imm(u16(1), 1)
+            if translator is BLOCK_CACHE.generic:
+                namespace[f'H{address}'] = UNDECORATED.get(handler, handler)
+                namespace[f'A{address}'] = args
+            
+            lines += [f'# {address}: {handler.__name__}{args}'] + body
+            address += 1
 
-        self.assertEqual(potados.regs[1], u16(1))
+            if is_terminator:
+                break
+            if address - start >= self.MAX_BLOCK_LENGTH or address >= len(decoded):
+                lines.append(f'return {address & 0xFFFF}')
+                break
 
-        potados.load_imm(u16(1), 0)
+        source = f'def block_{start}(R, M):\n' + '\n'.join('    ' + line for line in lines)
+        exec(compile(source, f'<potados block {start}>', 'exec'), namespace)
 
-        self.assertEqual(potados.regs[0], u16(0))
-        
-    def test_jump(self): 
-        potados = POTADOS_EMULATOR()
+        return namespace[f'block_{start}'], address - start
 
-        potados.jump(u16(2))
+    ###########
+    # helpers #
+    ###########
 
-        self.assertEqual(potados.regs[potados.PC], u16(2))
+    @staticmethod
+    def reg(index: int, address: int) -> str:
+        """Source operand - r0 is always 0, pc is known at translation time"""
+        if index == 0:
+            return '0'
+        if index == POTADOS_EMULATOR.PC:
+            return str(address)
+        return f'R[{index}]'
+
+    @staticmethod
+    def write(dst: int, expression: str) -> typing.Tuple[typing.List[str], bool]:
+        """Writes masked `expression` to `dst`. Write to pc ends the block"""
+        if dst == 0:
+            return [], False
+        if dst == POTADOS_EMULATOR.PC:
+            return [f'return ({expression}) & 0xFFFF'], True
+        return [f'R[{dst}] = ({expression}) & 0xFFFF'], False
+
+    def load_lines(self, target: str, address_expression: str, address: int) -> typing.List[str]:
+        """Ram read with fast path for plain ram (pc and tick counter are synced before going through `RAM` for io)"""
+        return [
+            f'a = {address_expression}',
+            f'if 0x0100 <= a < 0x0200:',
+            f'    {target} = M[a - 0x0100]',
+            f'else:',
+            f'    R[{POTADOS_EMULATOR.PC}] = {address}',
+            f'    cpu.ticks += {address - self.start}',
+            f'    {target} = load(a)',
+            f'    cpu.ticks -= {address - self.start}',
+        ]
 
-        potados.next_tick()
+    def store_lines(self, address_expression: str, value_expression: str, address: int) -> typing.List[str]:
+        return [
+            f'a = {address_expression}',
+            f'if 0x0100 <= a < 0x0200:',
+            f'    M[a - 0x0100] = {value_expression}',
+            f'else:',
+            f'    R[{POTADOS_EMULATOR.PC}] = {address}',
+            f'    cpu.ticks += {address - self.start}',
+            f'    store(a, {value_expression})',
+            f'    cpu.ticks -= {address - self.start}',
+        ]
 
-        self.assertEqual(potados.regs[potados.PC], u16(2))
+    ###############
+    # translators #
+    ###############
+    # Each one returns (lines, is_terminator) and mirrors handler from `POTADOS_EMULATOR`
 
-        potados.next_tick()
+    def generic(self, address: int, *args) -> typing.Tuple[typing.List[str], bool]:
+        """Calls handler itself. Handlers that can change pc or stop the machine end the block"""
+        handler, _ = self.cpu.rom.decoded[address]
+        PC = POTADOS_EMULATOR.PC
+        lines = [f'R[{PC}] = {address}', f'H{address}(cpu, *A{address})']
 
-        self.assertEqual(potados.regs[potados.PC], u16(3))
+        may_jump = PC in args or handler in (POTADOS_EMULATOR.interupt, POTADOS_EMULATOR.invalid_command)
+        if not may_jump:
+            return lines, False
         
-    def test_call(self):
-        potados = POTADOS_EMULATOR()
-
-        potados.regs[potados.SP] = u16(0x0100)   # type: ignore
-
-        potados.jump(u16(1))
-
-        potados.next_tick()
-
-        potados.call(u16(32))
+        return lines + [
+            f'if regs.pc_modified:',
+            f'    regs.pc_modified = False',
+            f'    return R[{PC}]',
+            f'return {(address + 1) & 0xFFFF}',
+        ], True
+
+    def nop(self, address: int):
+        return [], False
+
+    def halt(self, address: int):
+        return ['cpu.is_running_flag = False', f'return {(address + 1) & 0xFFFF}'], True
+
+    def load_imm(self, address: int, const: int, dst: int):
+        return self.write(dst, str(const))
+
+    def jump(self, address: int, const: int):
+        return [f'return {const}'], True
+
+    def call(self, address: int, const: int):
+        SP = POTADOS_EMULATOR.SP
+        return self.store_lines(f'R[{SP}]', str((address + 1) & 0xFFFF), address) + [
+            f'R[{SP}] = (R[{SP}] + 1) & 0xFFFF',
+            f'return {const}',
+        ], True
+
+    def push(self, address: int, src: int):
+        SP = POTADOS_EMULATOR.SP
+        return self.store_lines(f'R[{SP}]', self.reg(src, address), address) + [
+            f'R[{SP}] = (R[{SP}] + 1) & 0xFFFF',
+        ], False
+
+    def pop(self, address: int, dst: int):
+        SP = POTADOS_EMULATOR.SP
+        lines = [f'R[{SP}] = (R[{SP}] - 1) & 0xFFFF'] + self.load_lines('v', f'R[{SP}]', address)
+        body, is_terminator = self.write(dst, 'v')
+        return lines + body, is_terminator
+
+    def load_ptr_imm(self, address: int, offset: int, ptr: int, dst: int):
+        offset = offset - ((offset & 0b100000) << 1)
+        lines = self.load_lines('v', f'({offset} + {self.reg(ptr, address)}) & 0xFFFF', address)
+        body, is_terminator = self.write(dst, 'v')
+        return lines + body, is_terminator
+
+    def load_ptr_lsh(self, address: int, lsh: int, offset: int, ptr: int, dst: int):
+        offset = offset - ((offset & 0b1000) << 1)
+        PT = self.reg(POTADOS_EMULATOR.PT, address)
+        lines = self.load_lines('v', f'({PT} * {lsh} + {offset} + {self.reg(ptr, address)}) & 0xFFFF', address)
+        body, is_terminator = self.write(dst, 'v')
+        return lines + body, is_terminator
+
+    def store_ptr_imm(self, address: int, offset: int, ptr: int, src: int):
+        offset = offset - ((offset & 0b100000) << 1)
+        return self.store_lines(f'({offset} + {self.reg(ptr, address)}) & 0xFFFF', self.reg(src, address), address), False
+
+    def store_ptr_lsh(self, address: int, lsh: int, offset: int, ptr: int, src: int):
+        offset = offset - ((offset & 0b1000) << 1)
+        PT = self.reg(POTADOS_EMULATOR.PT, address)
+        return self.store_lines(f'({PT} * {lsh} + {offset} + {self.reg(ptr, address)}) & 0xFFFF', self.reg(src, address), address), False
+
+    def flaged(self, dst: int, expression: str):
+        FL = POTADOS_EMULATOR.FL
+        lines = [
+            f't = {expression}',
+            f'R[{FL}] = (R[{FL}] & 0xFFF0) | ((t & 0xFFFF) == 0) | (t >> 16) << 1 | ((t >> 15) & 1) << 2 | (t >> 16) << 3',
+        ]
+        body, is_terminator = self.write(dst, 't')
+        return lines + body, is_terminator
+
+    def alu_add_imm(self, address: int, r1_imm: int, r2_reg: int, dst: int):
+        return self.flaged(dst, f'{r1_imm} + {self.reg(r2_reg, address)}')
+    def alu_add_reg(self, address: int, r1_reg: int, r2_reg: int, dst: int):
+        return self.flaged(dst, f'{self.reg(r1_reg, address)} + {self.reg(r2_reg, address)}')
+    def alu_sub_imm(self, address: int, r1_imm: int, r2_reg: int, dst: int):
+        return self.flaged(dst, f'{self.reg(r2_reg, address)} + {r1_imm ^ 0xFFFF} + 1')
+    def alu_sub_reg(self, address: int, r1_reg: int, r2_reg: int, dst: int):
+        return self.flaged(dst, f'{self.reg(r2_reg, address)} + ({self.reg(r1_reg, address)} ^ 0xFFFF) + 1')
+    def alu_arsh_imm(self, address: int, r1_imm: int, r2_reg: int, dst: int):
+        return self.write(dst, f'{r1_imm} >> {self.reg(r2_reg, address)}')
+    def alu_arsh_reg(self, address: int, r1_reg: int, r2_reg: int, dst: int):
+        return self.write(dst, f'{self.reg(r1_reg, address)} >> {self.reg(r2_reg, address)}')
+    def alu_rsh_imm(self, address: int, r1_imm: int, r2_reg: int, dst: int):
+        return self.write(dst, f'{self.reg(r2_reg, address)} >> {r1_imm}')
+    def alu_rsh_reg(self, address: int, r1_reg: int, r2_reg: int, dst: int):
+        return self.write(dst, f'{self.reg(r2_reg, address)} >> {self.reg(r1_reg, address)}')
+    def alu_lsh_imm(self, address: int, r1_imm: int, r2_reg: int, dst: int):
+        return self.write(dst, f'{self.reg(r2_reg, address)} << {r1_imm}' if r1_imm < 16 else '0')
+    def alu_lsh_reg(self, address: int, r1_reg: int, r2_reg: int, dst: int):
+        r1 = self.reg(r1_reg, address)
+        return self.write(dst, f'{self.reg(r2_reg, address)} << {r1} if {r1} < 16 else 0')
+    def alu_mul_imm(self, address: int, r1_imm: int, r2_reg: int, dst: int):
+        return self.write(dst, f'{self.reg(r2_reg, address)} * {r1_imm}')
+    def alu_mul_reg(self, address: int, r1_reg: int, r2_reg: int, dst: int):
+        return self.write(dst, f'{self.reg(r2_reg, address)} * {self.reg(r1_reg, address)}')
+
+    def short_operands(self, address: int, r1: int, r2: int, r1_neg: str, r2_neg: str) -> typing.Tuple[str, str]:
+        # negated r2 reads r1 - same as in `POTADOS_EMULATOR.alu_xor` & co.
+        r1_imm = self.reg(r1, address) if r1_neg == "" else f'({self.reg(r1, address)} ^ 0xFFFF)'
+        r2_imm = self.reg(r2, address) if r2_neg == "" else f'({self.reg(r1, address)} ^ 0xFFFF)'
+        return r1_imm, r2_imm
+
+    def alu_xor(self, address: int, r1: int, r2: int, dst: int, r1_neg: str, r2_neg: str):
+        r1_imm, r2_imm = self.short_operands(address, r1, r2, r1_neg, r2_neg)
+        return self.write(dst, f'{r2_imm} ^ {r1_imm}')
+    def alu_xnor(self, address: int, r1: int, r2: int, dst: int, r1_neg: str, r2_neg: str):
+        r1_imm, r2_imm = self.short_operands(address, r1, r2, r1_neg, r2_neg)
+        return self.write(dst, f'{r2_imm} ^ {r1_imm} ^ 0xFFFF')
+    def alu_or(self, address: int, r1: int, r2: int, dst: int, r1_neg: str, r2_neg: str):
+        r1_imm, r2_imm = self.short_operands(address, r1, r2, r1_neg, r2_neg)
+        return self.write(dst, f'{r2_imm} | {r1_imm}')
+    def alu_nor(self, address: int, r1: int, r2: int, dst: int, r1_neg: str, r2_neg: str):
+        r1_imm, r2_imm = self.short_operands(address, r1, r2, r1_neg, r2_neg)
+        return self.write(dst, f'({r2_imm} | {r1_imm}) ^ 0xFFFF')
+
+    def branch(self, address: int, condition: str, offset: int, prelude: typing.Sequence[str] = ()):
+        return list(prelude) + [f'return {(address + offset) & 0xFFFF} if {condition} else {(address + 1) & 0xFFFF}'], True
+
+    def jge(self, address: int, r1_value: int, r2_value: int, offset: int):
+        return self.branch(address, f'{self.reg(r1_value, address)} ^ 0x8000 >= {self.reg(r2_value, address)} ^ 0x8000', offset)
+    def jl(self, address: int, r1_value: int, r2_value: int, offset: int):
+        return self.branch(address, f'{self.reg(r1_value, address)} ^ 0x8000 < {self.reg(r2_value, address)} ^ 0x8000', offset)
+    def je(self, address: int, r1_value: int, r2_value: int, offset: int):
+        return self.branch(address, f'{self.reg(r1_value, address)} == {self.reg(r2_value, address)}', offset)
+    def jne(self, address: int, r1_value: int, r2_value: int, offset: int):
+        return self.branch(address, f'{self.reg(r1_value, address)} != {self.reg(r2_value, address)}', offset)
+    def jae(self, address: int, r1_value: int, r2_value: int, offset: int):
+        return self.branch(address, f'{self.reg(r1_value, address)} >= {self.reg(r2_value, address)}', offset)
+    def jb(self, address: int, r1_value: int, r2_value: int, offset: int):
+        return self.branch(address, f'{self.reg(r1_value, address)} < {self.reg(r2_value, address)}', offset)
+
+    def jge_inc_dec(self, address: int, r1_value: str, r2_value: int, offset: int):
+        step = '+ 1' if r1_value == "++" else '- 1'
+        return self.branch(address, f'R[1] ^ 0x8000 >= {self.reg(r2_value, address)} ^ 0x8000', offset, [f'R[1] = (R[1] {step}) & 0xFFFF'])
+    def jne_inc_dec(self, address: int, r1_value: str, r2_value: int, offset: int):
+        step = '+ 1' if r1_value == "++" else '- 1'
+        return self.branch(address, f'R[1] != {self.reg(r2_value, address)}', offset, [f'R[1] = (R[1] {step}) & 0xFFFF'])
+
+    TRANSLATORS = {
+        POTADOS_EMULATOR.nop: nop, POTADOS_EMULATOR.halt: halt,
+        POTADOS_EMULATOR.load_imm: load_imm, POTADOS_EMULATOR.jump: jump, POTADOS_EMULATOR.call: call,
+        POTADOS_EMULATOR.push: push, POTADOS_EMULATOR.pop: pop,
+        POTADOS_EMULATOR.load_ptr_imm: load_ptr_imm, POTADOS_EMULATOR.load_ptr_lsh: load_ptr_lsh,
+        POTADOS_EMULATOR.store_ptr_imm: store_ptr_imm, POTADOS_EMULATOR.store_ptr_lsh: store_ptr_lsh,
+        POTADOS_EMULATOR.alu_add_imm: alu_add_imm, POTADOS_EMULATOR.alu_add_reg: alu_add_reg,
+        POTADOS_EMULATOR.alu_sub_imm: alu_sub_imm, POTADOS_EMULATOR.alu_sub_reg: alu_sub_reg,
+        POTADOS_EMULATOR.alu_arsh_imm: alu_arsh_imm, POTADOS_EMULATOR.alu_arsh_reg: alu_arsh_reg,
+        POTADOS_EMULATOR.alu_rsh_imm: alu_rsh_imm, POTADOS_EMULATOR.alu_rsh_reg: alu_rsh_reg,
+        POTADOS_EMULATOR.alu_lsh_imm: alu_lsh_imm, POTADOS_EMULATOR.alu_lsh_reg: alu_lsh_reg,
+        POTADOS_EMULATOR.alu_mul_imm: alu_mul_imm, POTADOS_EMULATOR.alu_mul_reg: alu_mul_reg,
+        POTADOS_EMULATOR.alu_xor: alu_xor, POTADOS_EMULATOR.alu_xnor: alu_xnor,
+        POTADOS_EMULATOR.alu_or: alu_or, POTADOS_EMULATOR.alu_nor: alu_nor,
+        POTADOS_EMULATOR.jge: jge, POTADOS_EMULATOR.jl: jl, POTADOS_EMULATOR.je: je, POTADOS_EMULATOR.jne: jne,
+        POTADOS_EMULATOR.jae: jae, POTADOS_EMULATOR.jb: jb,
+        POTADOS_EMULATOR.jge_inc_dec: jge_inc_dec, POTADOS_EMULATOR.jne_inc_dec: jne_inc_dec,
+    }
+
+class BatchPotados:
+    """
+    Runs many PotaDOS machines with the same rom in lockstep. Registers are held as (N, 16) and ram as (N, 256) uint16 arrays.
+    Each tick machines are grouped by pc, and every group executes its (predecoded) instruction with vectorized numpy ops.
+    Instructions without vectorized form (io, invalid commands, pc outside of rom, debug hooks) fall back to `POTADOS_EMULATOR`,
+    one machine at a time. Machine that raises is stopped and its exception is kept in `errors`.
+    Every machine has its own io devices (timer, clock, gpu - with their scheduled events), clocked by its own ticks. 
+    Only console output is shared. Devices attached to `cpu` are not seen by machines.
+    """
+    def __init__(self, count: int, rom_size: int = 1024) -> None:
+        self.cpu = POTADOS_EMULATOR() # holds rom and executes fallback instructions
+        self.cpu.disable_disassembly_trace()
+        self.cpu.rom = ROM(self.cpu, rom_size)
+        self.rom = self.cpu.rom
+
+        self.regs = np.zeros((count, 16), dtype='uint16')
+        self.ram = np.zeros((count, 256), dtype='uint16')
+        self.running = np.ones((count), dtype=bool)
+        self.ticks = np.zeros((count), dtype='int64')
+        self.errors: typing.Dict[int, Exception] = {}
+        self.pc_written = np.zeros((count), dtype=bool)
+        self.io: typing.Dict[int, IO_BUS] = {} # created on the first fallback of machine
+
+    def __len__(self) -> int:
+        return len(self.regs)
+
+    def machine_io(self, index: int) -> IO_BUS:
+        bus = self.io.get(index)
+        if bus is None:
+            bus = self.io[index] = IO_BUS(self.cpu, self.cpu.ram, self.cpu.ram.io.output)
+        return bus
 
-        potados.next_tick()
+    def program_rom(self, data: dict):
+        self.rom.program_rom(data)
 
-        self.assertEqual(potados.regs[potados.SP], u16(0x0100+1))
-        self.assertEqual(potados.regs[potados.PC], u16(32))
-        self.assertEqual(potados.ram[0x0100], u16(2)) # Next address after call
+    def load_machine(self, index: int, potados: POTADOS_EMULATOR):
+        """Copies registers, ram and running flag of `potados` into machine `index`"""
+        self.regs[index] = np.frombuffer(potados.regs.regs, dtype='uint16')
+        self.ram[index] = potados.ram.ram
+        self.running[index] = potados.is_running_flag
 
-    def test_cjumps(self):
+    def get_machine(self, index: int) -> POTADOS_EMULATOR:
+        """Returns standalone emulator with state (and rom) of machine `index`"""
         potados = POTADOS_EMULATOR()
+        potados.rom.rom[:len(self.rom.rom)] = self.rom.rom
+        potados.rom.invalidate()
+        self.store_machine(index, potados)
+        return potados
 
-        potados.regs[1] = u16(1)
-        potados.regs[2] = u16(3)
-
-        potados.regs[potados.PC] = u16(10)
+    def store_machine(self, index: int, potados: POTADOS_EMULATOR):
+        potados.regs.regs[:] = array('H', self.regs[index].tolist())
+        potados.regs.pc_modified = False
+        potados.ram.ram[:] = self.ram[index]
+        potados.is_running_flag = bool(self.running[index])
+        potados.ticks = int(self.ticks[index])
+
+    def run(self, max_ticks: int) -> int:
+        """Executes up to `max_ticks` ticks, stops early when all machines halt. Returns number of executed ticks"""
+        ticks = 0
+        while ticks < max_ticks and self.step():
+            ticks += 1
+        return ticks
+
+    def step(self) -> int:
+        """Executes single instruction on every running machine. Returns number of machines that executed it"""
+        active = np.flatnonzero(self.running)
+        if not len(active):
+            return 0
+
+        pcs = self.regs[active, POTADOS_EMULATOR.PC]
+        order = np.argsort(pcs, kind='stable')
+        pcs = pcs[order]
+        bounds = np.flatnonzero(pcs[1:] != pcs[:-1]) + 1
+        groups = np.split(active[order], bounds)
+
+        decoded = self.rom.decoded
+        vectorize = self.cpu.blocks.is_applicable()
+        for pc, rows in zip(pcs[np.concatenate(([0], bounds))].tolist(), groups):
+            if pc >= len(decoded):
+                self.fallback(rows)
+                continue
+            handler, args = decoded[pc]
+            vector = self.VECTORIZED.get(handler) if vectorize else None
+            if vector is None:
+                self.fallback(rows)
+            else:
+                vector(self, rows, *args)
+
+        self.ticks[active] += 1
+        step = active[~self.pc_written[active]]
+        self.regs[step, POTADOS_EMULATOR.PC] += 1
+        self.pc_written[active] = False
+        return len(active)
+
+    def fallback(self, rows: np.ndarray):
+        """Executes current instruction of each machine from `rows` with `POTADOS_EMULATOR`"""
+        cpu = self.cpu
+        shared_io = cpu.ram.io
+        for row in rows.tolist():
+            self.store_machine(row, cpu)
+            cpu.ram.io = self.machine_io(row)
+            try:
+                cpu.next_tick()
+            except Exception as e:
+                self.errors[row] = e
+                cpu.is_running_flag = False
+                self.ticks[row] -= 1 # instruction didn't complete
+            finally:
+                cpu.ram.io = shared_io
+            self.load_machine(row, cpu)
+            self.pc_written[row] = True
 
-        potados.jge(2, 1, u16(10))
-        self.assertEqual(potados.regs[potados.PC], 20)
-        #self.assertEqual(potados.regs[potados.FL], u16('01010'))
+    ###########
+    # helpers #
+    ###########
 
-        potados.regs[potados.PC] = u16(10)
-        
-        potados.jge(1, 2, u16(10))
-        self.assertEqual(potados.regs[potados.PC], 10)
-        #self.assertEqual(potados.regs[potados.FL], u16('10100'))
+    def read(self, rows: np.ndarray, index: int) -> np.ndarray:
+        return self.regs[rows, index].astype('int64')
 
-        potados.regs[3] = i16(-1)
-        potados.regs[4] = i16(1)
+    def write(self, rows: np.ndarray, dst: int, values: typing.Union[int, np.ndarray]):
+        if dst == 0:
+            return
+        if dst == POTADOS_EMULATOR.PC:
+            self.pc_written[rows] = True
+        self.regs[rows, dst] = np.bitwise_and(values, 0xFFFF)
+
+    def update_flags_for_add_sub(self, rows: np.ndarray, out: np.ndarray):
+        FL = POTADOS_EMULATOR.FL
+        overflow = out >> 16
+        out = out & 0xFFFF
+        self.write(rows, FL, (self.read(rows, FL) & 0xFFF0) | (out == 0) | overflow << 1 | (out >> 15) << 2 | overflow << 3)
+
+    def split_io(self, rows: np.ndarray, addresses: np.ndarray) -> typing.Tuple[np.ndarray, np.ndarray]:
+        """Sends machines accessing io to `fallback`. Returns remaining rows (and their addresses)"""
+        io = addresses < 0x0100
+        if not io.any():
+            return rows, addresses
+        self.fallback(rows[io])
+        return rows[~io], addresses[~io]
+
+    def load(self, rows: np.ndarray, addresses: np.ndarray) -> np.ndarray:
+        values = np.zeros((len(rows)), dtype='int64')
+        inside = addresses < 0x0200
+        values[inside] = self.ram[rows[inside], addresses[inside] - 0x0100]
+        return values
+
+    def store(self, rows: np.ndarray, addresses: np.ndarray, values: np.ndarray):
+        inside = addresses < 0x0200
+        self.ram[rows[inside], addresses[inside] - 0x0100] = values[inside] & 0xFFFF
+
+    def pointer(self, rows: np.ndarray, ptr: int, offset: int, lsh: int = 0) -> np.ndarray:
+        address = self.read(rows, ptr) + offset
+        if lsh:
+            address += self.read(rows, POTADOS_EMULATOR.PT) * lsh
+        return address & 0xFFFF
+
+    def fp16(self, rows: np.ndarray, index: int) -> np.ndarray:
+        return self.regs[rows, index].view('float16')
+
+    ###########################
+    # vectorized instructions #
+    ###########################
+    # Each one mirrors handler from `POTADOS_EMULATOR`, with `rows` - machines executing it
+
+    def nop(self, rows: np.ndarray):
+        pass
 
-        potados.jge(3, 4, i16(-10))
-        self.assertEqual(potados.regs[potados.PC], 10)
-        #self.assertEqual(potados.regs[potados.FL], u16('10100'))
+    def halt(self, rows: np.ndarray):
+        self.running[rows] = False
 
-        potados.jl(4, 3, u16(10))
-        self.assertEqual(potados.regs[potados.PC], 10)
-        #self.assertEqual(potados.regs[potados.FL], u16('01010'))
-        
-        potados.je(3, 3, u16(10))
-        self.assertEqual(potados.regs[potados.PC], 20)
-        #self.assertEqual(potados.regs[potados.FL], u16('01101'))
-
-        # -1 casted to unsigned (all ones) >= 1 casted to unsigned 
-        potados.jae(3, 4, u16(10))
-        self.assertEqual(potados.regs[potados.PC], 30)
-    def test_cjumps2(self):
-        R1 = list(range(-5, 0)) + list(range(5))
-        R2 = list(range(-5, 0)) + list(range(5))
-
-        def get(r1, r2):
-            potados = POTADOS_EMULATOR()
-            potados.regs[1] = Binary(r1, lenght=16)
-            potados.regs[2] = Binary(r2, lenght=16)
-            potados.regs[potados.PC] = u16(10)
-            return potados
-
-        for r1 in R1:
-            for r2 in R2:
-                potados = get(r1, r2)
-                potados.jge(1, 2, i16(-10))
-                self.assertEqual(potados.regs[potados.PC]==0, r1>=r2, f'{r1} >= {r2} but {potados.regs[potados.PC]}')
-
-                potados = get(r1, r2)
-                potados.je(1, 2, i16(-10))
-                self.assertEqual(potados.regs[potados.PC]==0, r1==r2, f'{r1} == {r2} but {potados.regs[potados.PC]}')
-
-                potados = get(r1, r2)
-                potados.jne(1, 2, i16(-10))
-                self.assertEqual(potados.regs[potados.PC]==0, r1!=r2, f'{r1} != {r2} but {potados.regs[potados.PC]}')
-
-                potados = get(r1, r2)
-                potados.jae(1, 2, i16(-10))
-                self.assertEqual(potados.regs[potados.PC]==0, ops.cast(i16(r1), 'unsigned')>=ops.cast(i16(r2), 'unsigned'))
-
-                potados = get(r1, r2)
-                potados.jb(1, 2, i16(-10))
-                self.assertEqual(potados.regs[potados.PC]==0, ops.cast(i16(r1), 'unsigned')<ops.cast(i16(r2), 'unsigned'))
-
-class POTADOS_COMPILATION_TESTS(unittest.TestCase):
+    def interupt(self, rows: np.ndarray, i: int):
+        if i == 0:
+            self.running[rows] = False
+
+    def load_imm(self, rows: np.ndarray, const: int, dst: int):
+        self.write(rows, dst, const)
+
+    def jump(self, rows: np.ndarray, const: int):
+        self.write(rows, POTADOS_EMULATOR.PC, const)
+
+    def call(self, rows: np.ndarray, const: int):
+        SP, PC = POTADOS_EMULATOR.SP, POTADOS_EMULATOR.PC
+        rows, sp = self.split_io(rows, self.read(rows, SP))
+        self.store(rows, sp, self.read(rows, PC) + 1)
+        self.write(rows, SP, sp + 1)
+        self.write(rows, PC, const)
+
+    def push(self, rows: np.ndarray, src: int):
+        SP = POTADOS_EMULATOR.SP
+        rows, sp = self.split_io(rows, self.read(rows, SP))
+        self.store(rows, sp, self.read(rows, src))
+        self.write(rows, SP, sp + 1)
+
+    def pop(self, rows: np.ndarray, dst: int):
+        SP = POTADOS_EMULATOR.SP
+        rows, sp = self.split_io(rows, (self.read(rows, SP) - 1) & 0xFFFF)
+        self.write(rows, SP, sp)
+        self.write(rows, dst, self.load(rows, sp))
+
+    def load_ptr_lsh(self, rows: np.ndarray, lsh: int, offset: int, ptr: int, dst: int):
+        rows, address = self.split_io(rows, self.pointer(rows, ptr, offset - ((offset & 0b1000) << 1), lsh))
+        self.write(rows, dst, self.load(rows, address))
+
+    def load_ptr_imm(self, rows: np.ndarray, offset: int, ptr: int, dst: int):
+        rows, address = self.split_io(rows, self.pointer(rows, ptr, offset - ((offset & 0b100000) << 1)))
+        self.write(rows, dst, self.load(rows, address))
+
+    def store_ptr_lsh(self, rows: np.ndarray, lsh: int, offset: int, ptr: int, src: int):
+        rows, address = self.split_io(rows, self.pointer(rows, ptr, offset - ((offset & 0b1000) << 1), lsh))
+        self.store(rows, address, self.read(rows, src))
+
+    def store_ptr_imm(self, rows: np.ndarray, offset: int, ptr: int, src: int):
+        rows, address = self.split_io(rows, self.pointer(rows, ptr, offset - ((offset & 0b100000) << 1)))
+        self.store(rows, address, self.read(rows, src))
+
+    def alu_add(self, rows: np.ndarray, r1: np.ndarray, r2: np.ndarray, dst: int):
+        out = r1 + r2
+        self.update_flags_for_add_sub(rows, out)
+        self.write(rows, dst, out)
+    def alu_add_imm(self, rows: np.ndarray, r1_imm: int, r2_reg: int, dst: int):
+        self.alu_add(rows, r1_imm, self.read(rows, r2_reg), dst)
+    def alu_add_reg(self, rows: np.ndarray, r1_reg: int, r2_reg: int, dst: int):
+        self.alu_add(rows, self.read(rows, r1_reg), self.read(rows, r2_reg), dst)
+
+    def alu_sub(self, rows: np.ndarray, r1: np.ndarray, r2: np.ndarray, dst: int):
+        out = r2 + (r1 ^ 0xFFFF) + 1
+        self.update_flags_for_add_sub(rows, out)
+        self.write(rows, dst, out)
+    def alu_sub_imm(self, rows: np.ndarray, r1_imm: int, r2_reg: int, dst: int):
+        self.alu_sub(rows, r1_imm, self.read(rows, r2_reg), dst)
+    def alu_sub_reg(self, rows: np.ndarray, r1_reg: int, r2_reg: int, dst: int):
+        self.alu_sub(rows, self.read(rows, r1_reg), self.read(rows, r2_reg), dst)
+
+    # numpy shifts by 64+ bits are undefined, values are 16 bit so shift amount can be clamped to 16
+    def alu_arsh_imm(self, rows: np.ndarray, r1_imm: int, r2_reg: int, dst: int):
+        self.write(rows, dst, r1_imm >> np.minimum(self.read(rows, r2_reg), 16))
+    def alu_arsh_reg(self, rows: np.ndarray, r1_reg: int, r2_reg: int, dst: int):
+        self.write(rows, dst, self.read(rows, r1_reg) >> np.minimum(self.read(rows, r2_reg), 16))
+    def alu_rsh_imm(self, rows: np.ndarray, r1_imm: int, r2_reg: int, dst: int):
+        self.write(rows, dst, self.read(rows, r2_reg) >> min(r1_imm, 16))
+    def alu_rsh_reg(self, rows: np.ndarray, r1_reg: int, r2_reg: int, dst: int):
+        self.write(rows, dst, self.read(rows, r2_reg) >> np.minimum(self.read(rows, r1_reg), 16))
+    def alu_lsh_imm(self, rows: np.ndarray, r1_imm: int, r2_reg: int, dst: int):
+        self.write(rows, dst, self.read(rows, r2_reg) << r1_imm if r1_imm < 16 else 0)
+    def alu_lsh_reg(self, rows: np.ndarray, r1_reg: int, r2_reg: int, dst: int):
+        r1 = self.read(rows, r1_reg)
+        self.write(rows, dst, np.where(r1 < 16, self.read(rows, r2_reg) << np.minimum(r1, 16), 0))
+    def alu_mul_imm(self, rows: np.ndarray, r1_imm: int, r2_reg: int, dst: int):
+        self.write(rows, dst, self.read(rows, r2_reg) * r1_imm)
+    def alu_mul_reg(self, rows: np.ndarray, r1_reg: int, r2_reg: int, dst: int):
+        self.write(rows, dst, self.read(rows, r2_reg) * self.read(rows, r1_reg))
+
+    def carried(self, rows: np.ndarray, r1: int) -> np.ndarray:
+        carry = (self.read(rows, POTADOS_EMULATOR.FL) & 0b10) != 0
+        return np.where(carry, (self.read(rows, r1) + 1) & 0xFFFF, 0)
+    def alu_adc(self, rows: np.ndarray, r1: int, r2: int, dst: int):
+        self.alu_add(rows, self.carried(rows, r1), self.read(rows, r2), dst)
+    def alu_sbc(self, rows: np.ndarray, r1: int, r2: int, dst: int):
+        self.alu_sub(rows, self.carried(rows, r1), self.read(rows, r2), dst)
+
+    def short_operands(self, rows: np.ndarray, r1: int, r2: int, r1_neg: str, r2_neg: str) -> typing.Tuple[np.ndarray, np.ndarray]:
+        # negated r2 reads r1 - same as in `POTADOS_EMULATOR.alu_xor` & co.
+        r1_imm = self.read(rows, r1) if r1_neg == "" else self.read(rows, r1) ^ 0xFFFF
+        r2_imm = self.read(rows, r2) if r2_neg == "" else self.read(rows, r1) ^ 0xFFFF
+        return r1_imm, r2_imm
+    def alu_xor(self, rows: np.ndarray, r1: int, r2: int, dst: int, r1_neg: str, r2_neg: str):
+        r1_imm, r2_imm = self.short_operands(rows, r1, r2, r1_neg, r2_neg)
+        self.write(rows, dst, r2_imm ^ r1_imm)
+    def alu_xnor(self, rows: np.ndarray, r1: int, r2: int, dst: int, r1_neg: str, r2_neg: str):
+        r1_imm, r2_imm = self.short_operands(rows, r1, r2, r1_neg, r2_neg)
+        self.write(rows, dst, r2_imm ^ r1_imm ^ 0xFFFF)
+    def alu_or(self, rows: np.ndarray, r1: int, r2: int, dst: int, r1_neg: str, r2_neg: str):
+        r1_imm, r2_imm = self.short_operands(rows, r1, r2, r1_neg, r2_neg)
+        self.write(rows, dst, r2_imm | r1_imm)
+    def alu_nor(self, rows: np.ndarray, r1: int, r2: int, dst: int, r1_neg: str, r2_neg: str):
+        r1_imm, r2_imm = self.short_operands(rows, r1, r2, r1_neg, r2_neg)
+        self.write(rows, dst, (r2_imm | r1_imm) ^ 0xFFFF)
+
+    # fp16 math is done by the same numpy loops as in `POTADOS_EMULATOR` (so results are bit identical)
+    def fadd(self, rows: np.ndarray, r1: int, r2: int, dst: int):
+        with np.errstate(all='ignore'):
+            self.write(rows, dst, (self.fp16(rows, r1) + self.fp16(rows, r2)).view('uint16'))
+    def fsub(self, rows: np.ndarray, r1: int, r2: int, dst: int):
+        with np.errstate(all='ignore'):
+            self.write(rows, dst, (self.fp16(rows, r2) - self.fp16(rows, r1)).view('uint16'))
+    def fmul(self, rows: np.ndarray, r1: int, r2: int, dst: int):
+        with np.errstate(all='ignore'):
+            self.write(rows, dst, (self.fp16(rows, r1) * self.fp16(rows, r2)).view('uint16'))
+    def fdiv(self, rows: np.ndarray, r1: int, r2: int, dst: int):
+        with np.errstate(all='ignore'):
+            self.write(rows, dst, (self.fp16(rows, r1) / self.fp16(rows, r2)).view('uint16'))
+    def ftoi(self, rows: np.ndarray, src: int, dst: int):
+        value = self.fp16(rows, src)
+        finite = np.isfinite(value)
+        if not finite.all():
+            self.fallback(rows[~finite]) # inf / nan can't be converted - let emulator raise
+            rows, value = rows[finite], value[finite]
+        self.write(rows, dst, np.trunc(value).astype('int64'))
+    def itof(self, rows: np.ndarray, src: int, dst: int):
+        value = self.read(rows, src)
+        with np.errstate(over='ignore'):
+            self.write(rows, dst, (value - ((value & 0x8000) << 1)).astype('float16').view('uint16'))
+    def utof(self, rows: np.ndarray, src: int, dst: int):
+        with np.errstate(over='ignore'):
+            self.write(rows, dst, self.read(rows, src).astype('float16').view('uint16'))
+
+    def branch(self, rows: np.ndarray, condition: np.ndarray, offset: int):
+        rows = rows[condition]
+        self.write(rows, POTADOS_EMULATOR.PC, self.read(rows, POTADOS_EMULATOR.PC) + offset)
+
+    def jge(self, rows: np.ndarray, r1_value: int, r2_value: int, offset: int):
+        self.branch(rows, self.read(rows, r1_value) ^ 0x8000 >= self.read(rows, r2_value) ^ 0x8000, offset)
+    def jl(self, rows: np.ndarray, r1_value: int, r2_value: int, offset: int):
+        self.branch(rows, self.read(rows, r1_value) ^ 0x8000 < self.read(rows, r2_value) ^ 0x8000, offset)
+    def je(self, rows: np.ndarray, r1_value: int, r2_value: int, offset: int):
+        self.branch(rows, self.read(rows, r1_value) == self.read(rows, r2_value), offset)
+    def jne(self, rows: np.ndarray, r1_value: int, r2_value: int, offset: int):
+        self.branch(rows, self.read(rows, r1_value) != self.read(rows, r2_value), offset)
+    def jae(self, rows: np.ndarray, r1_value: int, r2_value: int, offset: int):
+        self.branch(rows, self.read(rows, r1_value) >= self.read(rows, r2_value), offset)
+    def jb(self, rows: np.ndarray, r1_value: int, r2_value: int, offset: int):
+        self.branch(rows, self.read(rows, r1_value) < self.read(rows, r2_value), offset)
+
+    def inc_dec(self, rows: np.ndarray, r1_value: str) -> np.ndarray:
+        self.write(rows, 1, self.read(rows, 1) + (1 if r1_value == "++" else -1))
+        return self.read(rows, 1)
+    def jge_inc_dec(self, rows: np.ndarray, r1_value: str, r2_value: int, offset: int):
+        r1 = self.inc_dec(rows, r1_value)
+        self.branch(rows, r1 ^ 0x8000 >= self.read(rows, r2_value) ^ 0x8000, offset)
+    def jne_inc_dec(self, rows: np.ndarray, r1_value: str, r2_value: int, offset: int):
+        r1 = self.inc_dec(rows, r1_value)
+        self.branch(rows, r1 != self.read(rows, r2_value), offset)
+
+    VECTORIZED = {
+        POTADOS_EMULATOR.nop: nop, POTADOS_EMULATOR.halt: halt, POTADOS_EMULATOR.interupt: interupt,
+        POTADOS_EMULATOR.load_imm: load_imm, POTADOS_EMULATOR.jump: jump, POTADOS_EMULATOR.call: call,
+        POTADOS_EMULATOR.push: push, POTADOS_EMULATOR.pop: pop,
+        POTADOS_EMULATOR.load_ptr_imm: load_ptr_imm, POTADOS_EMULATOR.load_ptr_lsh: load_ptr_lsh,
+        POTADOS_EMULATOR.store_ptr_imm: store_ptr_imm, POTADOS_EMULATOR.store_ptr_lsh: store_ptr_lsh,
+        POTADOS_EMULATOR.alu_add_imm: alu_add_imm, POTADOS_EMULATOR.alu_add_reg: alu_add_reg,
+        POTADOS_EMULATOR.alu_sub_imm: alu_sub_imm, POTADOS_EMULATOR.alu_sub_reg: alu_sub_reg,
+        POTADOS_EMULATOR.alu_arsh_imm: alu_arsh_imm, POTADOS_EMULATOR.alu_arsh_reg: alu_arsh_reg,
+        POTADOS_EMULATOR.alu_rsh_imm: alu_rsh_imm, POTADOS_EMULATOR.alu_rsh_reg: alu_rsh_reg,
+        POTADOS_EMULATOR.alu_lsh_imm: alu_lsh_imm, POTADOS_EMULATOR.alu_lsh_reg: alu_lsh_reg,
+        POTADOS_EMULATOR.alu_mul_imm: alu_mul_imm, POTADOS_EMULATOR.alu_mul_reg: alu_mul_reg,
+        POTADOS_EMULATOR.alu_adc: alu_adc, POTADOS_EMULATOR.alu_sbc: alu_sbc,
+        POTADOS_EMULATOR.alu_xor: alu_xor, POTADOS_EMULATOR.alu_xnor: alu_xnor,
+        POTADOS_EMULATOR.alu_or: alu_or, POTADOS_EMULATOR.alu_nor: alu_nor,
+        POTADOS_EMULATOR.fadd: fadd, POTADOS_EMULATOR.fsub: fsub, POTADOS_EMULATOR.fmul: fmul, POTADOS_EMULATOR.fdiv: fdiv,
+        POTADOS_EMULATOR.ftoi: ftoi, POTADOS_EMULATOR.itof: itof, POTADOS_EMULATOR.utof: utof,
+        POTADOS_EMULATOR.jge: jge, POTADOS_EMULATOR.jl: jl, POTADOS_EMULATOR.je: je, POTADOS_EMULATOR.jne: jne,
+        POTADOS_EMULATOR.jae: jae, POTADOS_EMULATOR.jb: jb,
+        POTADOS_EMULATOR.jge_inc_dec: jge_inc_dec, POTADOS_EMULATOR.jne_inc_dec: jne_inc_dec,
+    }
+
+class FarmJob(typing.NamedTuple):
+    regs: typing.Dict[int, int] = {}  # register index -> value, applied on top of snapshot
+    ram: typing.Dict[int, int] = {}   # ram address -> value, applied on top of snapshot
+    max_ticks: int = 100000
+
+class FarmResult(typing.NamedTuple):
+    result: typing.Optional[RunResult] # None when emulation raised
+    regs: typing.List[int]
+    ram: np.ndarray
+    elapsed: float
+    error: typing.Optional[str] = None
+
+#################
+# profile cache #
+#################
+
+# modules that turn profile source into parsed profile - their change (e.g. core upgrade) invalidates compiled profile
+PROFILE_COMPILERS = ('core.profile.profile', 'core.quick')
+
+def profile_source_path() -> str:
+    """
+    Profile source that core parses. Core looks profiles up by name relative to working directory
+    (`profiles/potados/potados.jsonc`, where `potados_gen.py` writes it) - `PROFILE_PATH` is used when there is none
+    """
+    path = os.path.join('profiles', 'potados', 'potados.jsonc')
+    return os.path.abspath(path) if os.path.isfile(path) else PROFILE_PATH
+
+def profile_hash(source: typing.Optional[bytes] = None) -> str:
+    """
+    Hash of profile `source` (read from `profile_source_path` by default), version and sources of the assembler 
+    that parses it and python version (pickles are not guaranteed to be portable between them)
+    """
+    import hashlib
+    import importlib.util
+    import core
+    if source is None:
+        with open(profile_source_path(), 'rb') as f:
+            source = f.read()
+    digest = hashlib.sha256(source)
+    digest.update(repr((sys.version_info[:2], getattr(core, '__version__', None))).encode())
+    for name in PROFILE_COMPILERS:
+        spec = importlib.util.find_spec(name)
+        if spec is not None and spec.origin is not None and os.path.isfile(spec.origin):
+            with open(spec.origin, 'rb') as f:
+                digest.update(f.read())
+    return digest.hexdigest()
+
+def compile_profile(path: str = COMPILED_PROFILE_PATH):
+    """
+    Parses profile and stores it pickled next to hash of its source. Returns parsed profile. The hash is taken 
+    before parsing from the file core parses, so profile edited meanwhile makes the pickle stale (never mislabeled)
+    """
+    import pickle
+    import tempfile
+    from core.profile.profile import load_profile_from_file
+    with open(profile_source_path(), 'rb') as f:
+        digest = profile_hash(f.read())
     profile = load_profile_from_file('potados', load_emulator=False)
-    def test_compile(self):
-        output, context = quick.translate([
-            'mov reg[1], 1',
-            'add reg[1], reg[2], reg[3]',
-            'LABEL:',
-            'jne reg[1], reg[2], LABEL',
-            'mov reg[1], ram[reg[2]+3]',
-        ], 
-        POTADOS_COMPILATION_TESTS.profile)
-
-        parsed = [line.parsed_command for line in output]
-
-        self.assertEqual(parsed, 
-            [
-                {'const16': {'pdec': 0, 'const': 1, 'dst': 1}}, 
-                {'aluimm': {'pridec': 1, 'secdec': 1, 'r2': 2, 'I': 0, 'R1': 3, 'dst': 1}}, 
-                {'branch': {'pridec': 2, 'secdec': 3, 'r2': 2, 'pad': 0, 'offset': 0, 'r1': 1}}, 
-                {'indirect': {'pridec': 1, 'secdec': 0, 'ptr': 2, '3th': 7, 'offset': 3, 'srcdst': 1}},
-            ]
-        )
-
-        self.assertEqual(context.labels, {'LABEL': 3})
-        self.assertEqual(context.physical_adresses, {'LABEL': 2})
-
-    def test_compile_to_binary(self):
-        output, _ = quick.translate([
-            'mov reg[1], 1',
-            'add reg[1], reg[2], 1',
-        ], 
-        POTADOS_COMPILATION_TESTS.profile)
-
-        EXPECTED = [int(Binary("00  00000000 00000001  0001", 22)), int(Binary("01 001  0010 1 00000001 0001", 22))]
-
-        gathered, _ = quick.gather_instructions(output, POTADOS_COMPILATION_TESTS.profile.adressing)
-
-        self.assertEqual(gathered, {0: [EXPECTED[0]], 1: [EXPECTED[1]]})
-
-        packed = quick.pack_adresses(gathered)
-
-        self.assertEqual(packed, {0: EXPECTED[0], 1: EXPECTED[1]})
-
-    def run_emulation(self, potados: POTADOS_EMULATOR, program : typing.List[str], limit = 1000):
-        output, _ = quick.translate(program, POTADOS_COMPILATION_TESTS.profile)
 
-        gathered, _ = quick.gather_instructions(output, POTADOS_COMPILATION_TESTS.profile.adressing)
-        packed = quick.pack_adresses(gathered)
-
-        potados.rom.program_rom(packed)
+    f = tempfile.NamedTemporaryFile('wb', dir=os.path.dirname(path) or '.', delete=False)
+    replaced = False
+    try:
+        with f:
+            pickle.dump(digest, f)
+            pickle.dump(profile, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(f.name, path)
+        replaced = True
+    except (pickle.PicklingError, TypeError, AttributeError):
+        pass # profile can't be pickled - it is just parsed every time
+    finally:
+        if not replaced:
+            os.unlink(f.name)
+    return profile
+
+loaded_profiles: typing.Dict[str, typing.Any] = {} # compiled profile path -> profile loaded from it
+
+def load_profile(path: str = COMPILED_PROFILE_PATH):
+    """
+    Profile for assembling. Compiled profile is used when its hash matches current profile source, 
+    otherwise (or if it can't be read) profile is parsed and compiled again
+    """
+    key = os.path.abspath(path)
+    if key in loaded_profiles:
+        return loaded_profiles[key]
+
+    import pickle
+    try:
+        with open(path, 'rb') as f:
+            if pickle.load(f) == profile_hash():
+                loaded_profiles[key] = pickle.load(f)
+                return loaded_profiles[key]
+    except (OSError, EOFError, pickle.UnpicklingError, AttributeError, ImportError):
+        pass
 
-        for _ in range(limit):
-            potados.next_tick()
-            if not potados.is_running():
-                break
+    loaded_profiles[key] = compile_profile(path)
+    return loaded_profiles[key]
+
+class POTADOS_FARM:
+    """
+    Runs many jobs of one program over `ProcessPoolExecutor`. Program is assembled and programmed once, then initialized
+    emulator is snapshotted and sent to each worker (once). Jobs carry only changes of registers / ram.
+    """
+    profile = None
+
+    def __init__(self, program: typing.Union[typing.List[str], dict, str], workers: typing.Optional[int] = None, 
+                 setup: typing.Optional[typing.Callable[[POTADOS_EMULATOR], None]] = None) -> None:
+        """
+        `program` is either assembly source, already packed `{address: word}` or path to rom image. 
+        `setup` can initialize emulator (ram tables etc.) before snapshot is taken. `workers=0` runs jobs in this process.
+        """
+        potados = POTADOS_EMULATOR()
+        if isinstance(program, str):
+            potados.rom.load_image(program)
         else:
-            raise Exception(f'Program did not finish within {limit} ticks')
+            potados.rom.program_rom(self.assemble(program) if isinstance(program, list) else program)
+        if setup is not None:
+            setup(potados)
+
+        self.workers = workers
+        self.snapshot = potados.snapshot()
+
+    @classmethod
+    def assemble(cls, program: typing.List[str]) -> dict:
+        """Assembles `program` into `{address: word}` ready for `ROM.program_rom`"""
+        if cls.profile is None:
+            cls.profile = load_profile()
+
+        import core.quick as quick
+        output, _ = quick.translate(program, cls.profile)
+        gathered, _ = quick.gather_instructions(output, cls.profile.adressing)
+        return quick.pack_adresses(gathered)
+
+    def run(self, jobs: typing.Iterable[FarmJob], chunksize: int = 16) -> typing.List[FarmResult]:
+        """Runs `jobs`, results are returned in the same order"""
+        if self.workers == 0:
+            POTADOS_FARM.worker_init(self.snapshot)
+            return [POTADOS_FARM.worker_run(job) for job in jobs]
+
+        import concurrent.futures
+        with concurrent.futures.ProcessPoolExecutor(self.workers, initializer=POTADOS_FARM.worker_init, initargs=(self.snapshot,)) as pool:
+            return list(pool.map(POTADOS_FARM.worker_run, jobs, chunksize=chunksize))
+
+    ##########
+    # worker #
+    ##########
+
+    worker_emulator: typing.Optional[POTADOS_EMULATOR] = None
+    worker_snapshot: typing.Optional[Snapshot] = None
+
+    @staticmethod
+    def worker_init(snapshot: Snapshot):
+        potados = POTADOS_EMULATOR()
+        potados.disable_disassembly_trace()
+        potados.restore(snapshot)
 
-        return potados
+        POTADOS_FARM.worker_emulator = potados
+        POTADOS_FARM.worker_snapshot = snapshot
 
-    def test_fibonacci(self):
-        potados = POTADOS_EMULATOR()
-        FIBONACCI_CODE = [
-            'mov reg[1], 1',
-            'mov reg[2], 1',
-            'mov reg[4], 15',
-            'mov reg[5], 0',
-            'LABEL:',
-            'add reg[3], reg[1], reg[2]',
-            'mov reg[1], reg[2]',
-            'mov reg[2], reg[3]',
-            'inc reg[5]',
-            'jne reg[5], reg[4], LABEL',
-            'int 0'
-        ]
-        
-        try:
-            potados = self.run_emulation(potados, FIBONACCI_CODE, 1000)
-        except Exception as e:
-            raise Exception(f'Fibonacci failed: {e}')
-
-        # fibonacii is 1 1 2 3 5 8 13 21 34 55 89 144 233 377 610 987 1597 2584 4181 6765 
-        #                                                         ^^^ ^^^^
-        #                  1 2 3 4 5  6  7  8  9  19  11  12  13  14  15 
-        self.assertEqual(potados.regs[1], 987)
-        self.assertEqual(potados.regs[2], 1597)
-        self.assertEqual(potados.regs[3], 1597)
-        self.assertEqual(potados.regs[4], 15)
-        self.assertEqual(potados.regs[5], 15)
-        self.assertEqual(potados.regs[potados.PC], 10)
-
-    def test_memcpy(self):
-        potados = POTADOS_EMULATOR()
-        MEMCPY_CODE = [
-            'mov reg[1], 0x0100',
-            'add reg[2], reg[1], 0x0010',
-            'add reg[3], reg[1], 0x0010',
-            'MEMCPY_loop:',
-            'mov reg[4], ram[reg[1]]',
-            'mov ram[reg[3]], reg[4]', 
-            'inc reg[3]',
-            'jne reg[1]++, reg[2], MEMCPY_loop',
-            'int 0'
-        ]
-        for i in range(0, 16):
-            potados.ram[0x0100+i] = i
+    @staticmethod
+    def worker_run(job: FarmJob) -> FarmResult:
+        potados = POTADOS_FARM.worker_emulator
+        # rom is the same, so it is left as is - translated blocks are reused between jobs
+        potados.restore(POTADOS_FARM.worker_snapshot)
 
-        try:
-            potados = self.run_emulation(potados, MEMCPY_CODE, 1000)
-        except Exception as e:
-            raise Exception(f'Memcpy failed: {e}')
-        
-        for i in range(0, 16):
-            self.assertEqual(potados.ram[0x0100+i], potados.ram[0x0100+0x0010+i])
+        for index, value in job.regs.items():
+            potados.regs.regs[index] = value & 0xFFFF
+        for address, value in job.ram.items():
+            potados.ram[address] = value
 
-    def test_fibonacci_floats(self):
-        potados = POTADOS_EMULATOR()
-        FIBONACCI_CODE = [
-                'mov reg[1], 0',
-                'mov reg[2], 0',
-                'mov reg[3], 1',
-                'mov reg[4], 8',
-                'mov reg[5], 0x5640', # 100.0f16
-                'LOOP:',
-                'add reg[2], reg[2], reg[3]',
-                #'dbg reg[2]',
-                'add reg[3], reg[3], reg[2]',
-                #'dbg reg[3]',
-                'jne reg[1]++, reg[4], LOOP',
-                'itof reg[2], reg[2]',
-                'itof reg[3], reg[3]',
-                'fdiv reg[1], reg[2], reg[3]',
-                'fmul reg[1], reg[1], reg[5]',
-                'ftoi reg[1], reg[1]',
-                #'dbg reg[1]',
-                'int 0',
-        ]
-        
+        start = time.perf_counter()
         try:
-            potados = self.run_emulation(potados, FIBONACCI_CODE, 1000)
+            result, error_message = potados.run(job.max_ticks), None
         except Exception as e:
-            raise Exception(f'Fibonacci failed: {e}')
-
-        self.assertEqual(potados.regs[1], 161)
-
+            result, error_message = None, f'{type(e).__name__}: {e}'
+        elapsed = time.perf_counter() - start
+
+        return FarmResult(result, list(potados.regs.regs), potados.ram.ram.copy(), elapsed, error_message)
+
+########################
+# incremental assembly #
+########################
+
+class AssembledLine(typing.NamedTuple):
+    words: typing.Tuple[int, ...]
+    label: typing.Optional[str] = None                          # label referenced by the line
+    field: typing.Optional[typing.Tuple[int, int, bool]] = None # (shift, mask, relative) of label field, None if it is unknown
+    word: int = 0                                               # index of expanded word that holds the label field
+
+class ASSEMBLY_SESSION:
+    """
+    Incremental assembler for edit-run loop. Every source line is translated alone and cached by its text, so after
+    an edit only new or changed lines go through `quick.translate`. Labels are resolved by the session itself -
+    label constants and branch offsets are patched into cached words whenever label addresses move.
+    `update` returns only rom words that changed and `patch` writes them into (running) emulator.
+
+    Lines are expected to be instructions (or macros) and `NAME:` label definitions - source that relies on 
+    context between lines has to be assembled with `POTADOS_FARM.assemble`. When it is not clear which expanded word
+    of a line holds the label, the whole program is assembled again instead of patched.
+    """
+    LABEL_DEFINITION = re.compile(r'^\s*([A-Za-z_]\w*)\s*:\s*$')
+    TOKEN = re.compile(r'[A-Za-z_]\w*')
+    OPERAND_KEYWORDS = frozenset(('reg', 'ram'))
+    FILL = 0 # `nop`
+    label_fields: typing.Optional[typing.Dict[str, typing.Tuple[int, int, bool]]] = None
+
+    def __init__(self, profile=None) -> None:
+        self.profile = profile
+        self.cache: typing.Dict[typing.Tuple[str, typing.Optional[str]], AssembledLine] = {}
+        self.lines: typing.List[str] = []
+        self.labels: typing.Dict[str, int] = {}
+        self.program: typing.Dict[int, int] = {}
+        self.translated = 0 # lines sent to assembler
+
+    @classmethod
+    def load_label_fields(cls) -> typing.Dict[str, typing.Tuple[int, int, bool]]:
+        """Layout -> (shift, mask, relative) of field that holds label argument, read from profile commands"""
+        if cls.label_fields is None:
+            profile = CYCLE_COUNTER.load_profile()
+            layouts = profile['ARGUMENTS']['variants']
+            cls.label_fields = {}
+            for command in profile['COMMANDS'].values():
+                match = re.search(r'\{(\w+):(offset_label|label)\}', command['pattern'])
+                if match is None:
+                    continue
+                argument, kind = match.groups()
+                fields = layouts[command['command_layout']]
+                field = next(name for name, value in command['bin'].items() if value == argument)
+                names = list(fields)
+                shift = sum(fields[name]['size'] for name in names[names.index(field) + 1:])
+                cls.label_fields[command['command_layout']] = (shift, (1 << fields[field]['size']) - 1, kind == 'offset_label')
+        return cls.label_fields
+
+    def translate_lines(self, lines: typing.List[str]) -> typing.Tuple[list, typing.Dict[int, int]]:
+        """Assembler output and `{address: word}` of `lines`"""
+        import core.quick as quick
+        if self.profile is None:
+            self.profile = load_profile()
+
+        output, _ = quick.translate(lines, self.profile)
+        gathered, _ = quick.gather_instructions(output, self.profile.adressing)
+        packed = quick.pack_adresses(gathered)
+        self.translated += sum(self.LABEL_DEFINITION.match(line) is None for line in lines)
+        return output, {address: int(word) for address, word in packed.items()}
+
+    def locate_label(self, output: list, words: typing.Tuple[int, ...]) -> typing.Optional[typing.Tuple[int, typing.Tuple[int, int, bool]]]:
+        """
+        Index of expanded word and its label field that hold label defined right after the line. Candidates are words
+        which layout has label field holding address of that label, None if there isn't exactly one of them
+        """
+        if len(output) != len(words):
+            return None
+        fields = self.load_label_fields()
+        target = len(words)
+        found = []
+        for index, (instruction, word) in enumerate(zip(output, words)):
+            field = fields.get(next(iter(instruction.parsed_command)))
+            if field is not None:
+                shift, mask, relative = field
+                if (word >> shift) & mask == (target - index if relative else target) & mask:
+                    found.append((index, field))
+        return found[0] if len(found) == 1 else None
+
+    def translate(self, line: str, label: typing.Optional[str]) -> AssembledLine:
+        key = (line, label)
+        cached = self.cache.get(key)
+        if cached is not None:
+            return cached
+
+        # referenced label is defined right after the line, its field is cleared and filled during resolving
+        output, packed = self.translate_lines([line] if label is None else [line, f'{label}:'])
+        words = tuple(packed[address] for address in sorted(packed))
+
+        if label is None or not words:
+            cached = AssembledLine(words)
+        else:
+            located = self.locate_label(output, words)
+            if located is None: # label is resolved by assembling whole program
+                cached = AssembledLine(words, label)
+            else:
+                index, field = located
+                shift, mask, _ = field
+                cached = AssembledLine(words[:index] + (words[index] & ~(mask << shift),) + words[index + 1:], label, field, index)
+
+        self.cache[key] = cached
+        return cached
+
+    def references(self, line: str, names: typing.Set[str]) -> typing.List[str]:
+        """Labels from `names` referenced by `line` - its first token (mnemonic) and `reg` / `ram` never are"""
+        return [token for token in self.TOKEN.findall(line)[1:] if token in names and token not in self.OPERAND_KEYWORDS]
+
+    def assemble(self, lines: typing.List[str]) -> typing.Dict[int, int]:
+        """Whole program as `{address: word}` (the same as `POTADOS_FARM.assemble`), from cache where possible"""
+        names = {match.group(1) for match in map(self.LABEL_DEFINITION.match, lines) if match is not None}
+
+        labels: typing.Dict[str, int] = {}
+        placed: typing.List[typing.Tuple[int, AssembledLine]] = []
+        address = 0
+        for line in lines:
+            definition = self.LABEL_DEFINITION.match(line)
+            if definition is not None:
+                labels[definition.group(1)] = address
+                continue
+            references = self.references(line, names)
+            if len(references) > 1:
+                raise error.EmulationError(f'Line "{line}" references more than one label')
+            assembled = self.translate(line, references[0] if references else None)
+            placed.append((address, assembled))
+            address += len(assembled.words)
+
+        program: typing.Dict[int, int] = {}
+        if any(assembled.label is not None and assembled.field is None for _, assembled in placed):
+            _, program = self.translate_lines(list(lines))
+        else:
+            for address, assembled in placed:
+                program.update(zip(range(address, address + len(assembled.words)), assembled.words))
+                if assembled.label is not None:
+                    shift, mask, relative = assembled.field
+                    target, address = labels[assembled.label], address + assembled.word
+                    program[address] |= ((target - address if relative else target) & mask) << shift
+
+        self.lines = list(lines)
+        self.labels = labels
+        return program
+
+    def update(self, lines: typing.List[str]) -> typing.Dict[int, int]:
+        """Assembles edited program and returns only words that differ from previous one (removed tail is filled with `nop`)"""
+        program = self.assemble(lines)
+        changes = {address: word for address, word in program.items() if self.program.get(address) != word}
+        changes.update({address: self.FILL for address in self.program if address not in program})
+        self.program = program
+        return changes
+
+    def patch(self, potados: typing.Union[POTADOS_EMULATOR, 'BatchPotados'], lines: typing.List[str]) -> typing.Dict[int, int]:
+        """Writes changed words of edited program into rom of `potados` (decoded entries and translated blocks follow)"""
+        changes = self.update(lines)
+        if changes:
+            potados.rom.program_rom(changes)
+        return changes
 
-if __name__ == "__main__":
-    unittest.main()
-    
\ No newline at end of file
+def get_emulator() -> POTADOS_EMULATOR:
+    return POTADOS_EMULATOR()
@@ -0,0 +1,1316 @@
+if __name__ == "__main__":
+    import sys
+    import os
+    sys.path.append(os.getcwd())
+
+import typing
+import os
+import pickle
+import tempfile
+import unittest
+import warnings
+import numpy as np
+from bitvec import Binary, arithm as ops
+from bitvec.alias import  u16, i16
+import core.error as error
+import core.quick as quick
+import potados_emulator
+from potados_emulator import (POTADOS_EMULATOR, RAM, ROM, RunResult, StopReason, Snapshot, TRACE_RECORDER, CYCLE_COUNTER, 
+                              SHARED_STATE, TIMER_DEVICE, GPU_DEVICE, BatchPotados, POTADOS_FARM, FarmJob, 
+                              ASSEMBLY_SESSION, load_profile, compile_profile, profile_hash, save_rom_image, load_rom_image)
+
+# To pulloff tests just run 
+# python -m unittest profiles\potados_emulator_test.py 
+# from \Lord-s-asm-for-mc\ 
+# (or debug this file inside vs code)
+
+class RAM_TESTS(unittest.TestCase):
+    def test_get_ram_default(self):
+        ram = RAM(None, None)
+
+        self.assertEqual(ram[0x0100], u16(0))
+        self.assertEqual(ram[0x0101], u16(0))
+        self.assertEqual(ram[0x01FF], u16(0))
+        self.assertEqual(ram[0x0200], u16(0))
+        self.assertEqual(ram.ram.shape, (256,))
+
+    def test_get_ram_ones(self):
+        ram = RAM(None, np.ones((256)))
+
+        self.assertEqual(ram[0x0100], u16(1))
+        self.assertEqual(ram[0x0101], u16(1))
+        self.assertEqual(ram[0x01FF], u16(1))
+        self.assertEqual(ram[0x0200], u16(0))
+        self.assertEqual(ram.ram.shape, (256,))
+
+    def test_get_ram_ones_from_bigger_array(self):
+        ram = RAM(None, np.ones((1024)))
+
+        self.assertEqual(ram[0x0100], u16(1))
+        self.assertEqual(ram[0x0101], u16(1))
+        self.assertEqual(ram[0x01FF], u16(1))
+        self.assertEqual(ram[0x0200], u16(0))
+        self.assertEqual(ram.ram.shape, (256,))
+    
+    def test_set_ram(self):
+        ram = RAM(None, np.ones((256)))
+
+        ram[0x0100] = 255
+        self.assertEqual(ram[0x0100], u16(255))
+        ram[0x0100] = -1
+        self.assertEqual(ram[0x0100], u16(2**16-1)) #u16 max 
+        ram[0x01FF] = 255
+        self.assertEqual(ram[0x01FF], u16(255))
+        ram[0x0200] = 255
+        self.assertEqual(ram[0x0200], u16(0))
+
+    def test_get_io(self):
+        class DEVICE:
+            def read(self, port: int) -> typing.Optional[int]:
+                return 0x1234 if port == 0x10 else None
+            def write(self, port: int, value: int):
+                pass
+
+        ram = RAM(None, np.arange(256))
+        self.assertEqual(ram[0x0008], 8)   # unmapped port reads ram underneath
+        self.assertEqual(ram[0x001F], 31)
+        ram.io.attach(DEVICE(), 0x0010, 0x0011)
+        self.assertEqual(ram[0x0010], 0x1234)
+        self.assertEqual(ram[0x0011], 0x11)
+        self.assertEqual(ram[0x0003], 0)    # timer flags
+        ram.io.detach(0x0010, 0x0011)
+        self.assertEqual(ram[0x0010], 0x10)
+        self.assertNotIn(0x0010, [first for first, _, _ in ram.io.devices])
+
+    def test_set_io(self):
+        ram = RAM(None, None)
+        lines = []
+        ram.io.output.target = lines
+        ram.io.output.batch = 2
+
+        ram[0x0006] = 42
+        self.assertEqual(lines, [])
+        ram[0x0005] = 5
+        self.assertEqual(lines, ['[PotaDOS] [DBG] 42', '\tBINARY DISPLAY  -  0000000000000101  -'])
+        self.assertEqual(ram[0x0006], 42)  # io writes are mirrored into ram
+
+        ram[0x0019] = 7                     # unmapped ports only write ram
+        self.assertEqual(ram[0x0119], 7)
+
+        batches = []
+        ram.io.output.target = batches.append
+        ram[0x0006] = 1
+        ram.io.flush()
+        self.assertEqual(batches, [['[PotaDOS] [DBG] 1']])
+
+class ROM_TESTS(unittest.TestCase):
+    def test_rom(self):
+        rom = ROM(None, 4096)
+
+        rom.program_rom({0: 0, 1: 1, 2: 2, 3: 3})
+
+        self.assertEqual(rom[0], Binary(0, lenght=22))
+        self.assertEqual(rom[1], Binary(1, lenght=22))
+        self.assertEqual(rom[2], Binary(2, lenght=22))
+        self.assertEqual(rom[3], Binary(3, lenght=22))
+        
+        self.assertEqual(rom.rom.shape, (4096,))
+
+    def test_rom_decoded(self):
+        rom = ROM(None, 16)
+        
+        self.assertEqual(rom.decoded[0], (POTADOS_EMULATOR.nop, ()))
+
+        rom.program_rom({0: POTADOS_EMULATOR.INTERUPT_0_AS_INT, 1: int(Binary("00 00000000 00000101 0011", 22))})
+
+        self.assertEqual(rom.decoded[0], (POTADOS_EMULATOR.halt, ()))
+        self.assertEqual(rom.decoded[1], (POTADOS_EMULATOR.load_imm, (5, 3)))
+
+        # reprogramming invalidates decoded entry
+        rom.program_rom({0: POTADOS_EMULATOR.NOP_AS_INT})
+        self.assertEqual(rom.decoded[0], (POTADOS_EMULATOR.nop, ()))
+
+        rom.rom[2] = POTADOS_EMULATOR.INTERUPT_0_AS_INT
+        rom.invalidate()
+        self.assertEqual(rom.decoded[2], (POTADOS_EMULATOR.halt, ()))
+
+    def test_load(self):
+        potados = POTADOS_EMULATOR()
+        words = np.zeros(1024, dtype='uint32')
+        words[1] = POTADOS_EMULATOR.INTERUPT_0_AS_INT
+
+        # caller's array is copied, snapshot doesn't change with it
+        potados.rom.load(words)
+        snapshot = potados.snapshot()
+        words[0] = 5
+        self.assertEqual((snapshot.rom[0], potados.rom.rom[0]), (0, 0))
+        self.assertEqual(potados.rom.decoded[1], (POTADOS_EMULATOR.halt, ()))
+
+        potados.rom.load(words.tolist())
+        self.assertIsInstance(potados.snapshot().rom, np.ndarray)
+        self.assertEqual(potados.snapshot().rom[0], 5)
+
+        # read-only array is shared, unless its memory can still be written through another array
+        frozen = words.copy()
+        frozen.flags.writeable = False
+        potados.rom.load(frozen)
+        self.assertIs(potados.snapshot().rom, frozen)
+        view = words[:]
+        view.flags.writeable = False
+        potados.rom.load(view)
+        self.assertIsNot(potados.snapshot().rom, view)
+
+        for invalid in ([1 << 22], [-1], np.ones(4, dtype='float32'), np.ones((2, 2), dtype='uint32')):
+            with self.assertRaises(error.EmulationError):
+                potados.rom.load(invalid)
+
+    def test_rom_image(self):
+        program = {0: int(Binary("00 00000000 00000101 0011", 22)), 1: POTADOS_EMULATOR.INTERUPT_0_AS_INT, 3: 0x3FFFFF}
+
+        with tempfile.TemporaryDirectory() as directory:
+            for name in ('program.rom', 'program.npy'):
+                path = os.path.join(directory, name)
+                save_rom_image(path, program)
+
+                words = load_rom_image(path)
+                self.assertEqual(words.tolist(), [program[0], program[1], 0, program[3]])
+                if name.endswith('.rom'):
+                    self.assertIsInstance(words, np.memmap)
+                    self.assertEqual(os.path.getsize(path), 16 + 4 * 4)
+
+                potados = POTADOS_EMULATOR()
+                potados.disable_disassembly_trace()
+                potados.rom.program_rom({10: 1})
+                potados.rom.load_image(path)
+                self.assertEqual(potados.rom.rom[:5].tolist(), [program[0], program[1], 0, program[3], 0])
+                self.assertEqual(potados.rom.rom[10], 0)
+                self.assertEqual(potados.rom.decoded[1], (POTADOS_EMULATOR.halt, ()))
+                self.assertEqual(potados.run(100).ticks, 2)
+                self.assertEqual(potados.regs[3], 5)
+
+            path = os.path.join(directory, 'saved.rom')
+            potados.rom.save_image(path)
+            self.assertEqual(load_rom_image(path).tolist(), potados.rom.rom.tolist())
+
+            with self.assertRaises(error.EmulationError):
+                save_rom_image(path, {0: 1 << 22})
+            with open(path, 'r+b') as f:
+                f.truncate(20)
+            with self.assertRaises(error.EmulationError):
+                load_rom_image(path)
+            with self.assertRaises(error.EmulationError):
+                ROM(None, 2).load_image(os.path.join(directory, 'program.rom'))
+
+            # words that don't fit in rom are rejected by load as well as by save
+            with self.assertRaises(error.EmulationError):
+                save_rom_image(path, [1, -1])
+            with open(path, 'wb') as f:
+                f.write(potados_emulator.ROM_IMAGE_HEADER.pack(potados_emulator.ROM_IMAGE_MAGIC, 22, 2))
+                f.write(np.array([1, 1 << 22], dtype='<u4').tobytes())
+            with self.assertRaises(error.EmulationError):
+                load_rom_image(path)
+
+            path = os.path.join(directory, 'invalid.npy')
+            for words in (np.array([1.0, 2.0]), np.array([1, -1], dtype='int16'), np.array([1, 1 << 22], dtype='int64'), np.ones((2, 2), dtype='uint32')):
+                np.save(path, words)
+                with self.assertRaises(error.EmulationError):
+                    load_rom_image(path)
+            np.save(path, np.array([1, (1 << 22) - 1], dtype='int64'))
+            self.assertEqual(load_rom_image(path).tolist(), [1, (1 << 22) - 1])
+
+
+class REGS_TESTS(unittest.TestCase):
+    def test_read_write(self):
+        potados = POTADOS_EMULATOR()
+        regs = potados.regs
+
+        for i in range(16):
+            self.assertEqual(regs[i], u16(0))
+        
+        for i in range(16):
+            regs[i] = i16(1)
+        
+        self.assertEqual(regs[0], u16(0))
+        self.assertEqual(regs[1], u16(1))
+        self.assertEqual(regs[2], u16(1))
+        self.assertEqual(regs[3], u16(1))
+        self.assertEqual(regs[15], u16(1))
+        self.assertEqual(regs[8], u16(1))
+        self.assertEqual(regs[7], u16(1))
+
+        regs.enable_dummy_reg_writes()
+
+        for i in range(16):
+            regs[i] = i16(255)
+
+        self.assertEqual(regs[0], u16(0))
+        self.assertEqual(regs[1], u16(1))
+        self.assertEqual(regs[2], u16(1))
+        self.assertEqual(regs[3], u16(1))
+        self.assertEqual(regs[15], u16(1))
+        self.assertEqual(regs[8], u16(1))
+        self.assertEqual(regs[7], u16(1))
+
+        regs.disable_dummy_reg_writes()
+
+    def test_integer_storage(self):
+        potados = POTADOS_EMULATOR()
+        regs = potados.regs
+
+        regs[1] = -1
+        regs[2] = 0x1FFFF
+        regs[3] = u16(0x1234)
+
+        self.assertEqual(regs[1], 0xFFFF)
+        self.assertEqual(regs[2], 0xFFFF)
+        self.assertEqual(regs[3], 0x1234)
+        self.assertIsInstance(regs[3], int)
+        self.assertEqual(regs.view(3), u16(0x1234))
+        self.assertEqual(list(potados.get_regs_ref()[:4]), [0, 0xFFFF, 0xFFFF, 0x1234])
+
+    def test_pc_modified(self):
+        potados = POTADOS_EMULATOR()
+        regs = potados.regs
+
+        self.assertEqual(regs[potados.PC], u16(0))
+        regs[potados.PC] = i16(1)
+
+        self.assertTrue(regs.pc_modified)
+        
+        self.assertEqual(regs[potados.PC], u16(1))
+        regs.increment_pc()
+
+        self.assertEqual(regs[potados.PC], u16(1))
+        regs.increment_pc()
+
+        self.assertEqual(regs[potados.PC], u16(2))
+        regs.increment_pc()
+
+        self.assertEqual(regs[potados.PC], u16(3))
+
+
+        
+
+
+class POTADOS_TESTS(unittest.TestCase):
+    def test_mov(self):
+        potados = POTADOS_EMULATOR()
+
+        potados.load_imm(u16(1), 1)
+
+        self.assertEqual(potados.regs[1], u16(1))
+
+        potados.load_imm(u16(1), 0)
+
+        self.assertEqual(potados.regs[0], u16(0))
+        
+    def test_jump(self): 
+        potados = POTADOS_EMULATOR()
+
+        potados.jump(u16(2))
+
+        self.assertEqual(potados.regs[potados.PC], u16(2))
+
+        potados.next_tick()
+
+        self.assertEqual(potados.regs[potados.PC], u16(2))
+
+        potados.next_tick()
+
+        self.assertEqual(potados.regs[potados.PC], u16(3))
+        
+    def test_call(self):
+        potados = POTADOS_EMULATOR()
+
+        potados.regs[potados.SP] = u16(0x0100)   # type: ignore
+
+        potados.jump(u16(1))
+
+        potados.next_tick()
+
+        potados.call(u16(32))
+
+        potados.next_tick()
+
+        self.assertEqual(potados.regs[potados.SP], u16(0x0100+1))
+        self.assertEqual(potados.regs[potados.PC], u16(32))
+        self.assertEqual(potados.ram[0x0100], u16(2)) # Next address after call
+
+    def test_cjumps(self):
+        potados = POTADOS_EMULATOR()
+
+        potados.regs[1] = u16(1)
+        potados.regs[2] = u16(3)
+
+        potados.regs[potados.PC] = u16(10)
+
+        potados.jge(2, 1, 10)
+        self.assertEqual(potados.regs[potados.PC], 20)
+        #self.assertEqual(potados.regs[potados.FL], u16('01010'))
+
+        potados.regs[potados.PC] = u16(10)
+        
+        potados.jge(1, 2, 10)
+        self.assertEqual(potados.regs[potados.PC], 10)
+        #self.assertEqual(potados.regs[potados.FL], u16('10100'))
+
+        potados.regs[3] = i16(-1)
+        potados.regs[4] = i16(1)
+
+        potados.jge(3, 4, -10)
+        self.assertEqual(potados.regs[potados.PC], 10)
+        #self.assertEqual(potados.regs[potados.FL], u16('10100'))
+
+        potados.jl(4, 3, 10)
+        self.assertEqual(potados.regs[potados.PC], 10)
+        #self.assertEqual(potados.regs[potados.FL], u16('01010'))
+        
+        potados.je(3, 3, 10)
+        self.assertEqual(potados.regs[potados.PC], 20)
+        #self.assertEqual(potados.regs[potados.FL], u16('01101'))
+
+        # -1 casted to unsigned (all ones) >= 1 casted to unsigned 
+        potados.jae(3, 4, 10)
+        self.assertEqual(potados.regs[potados.PC], 30)
+    def test_cjumps2(self):
+        R1 = list(range(-5, 0)) + list(range(5))
+        R2 = list(range(-5, 0)) + list(range(5))
+
+        def get(r1, r2):
+            potados = POTADOS_EMULATOR()
+            potados.regs[1] = Binary(r1, lenght=16)
+            potados.regs[2] = Binary(r2, lenght=16)
+            potados.regs[potados.PC] = u16(10)
+            return potados
+
+        for r1 in R1:
+            for r2 in R2:
+                potados = get(r1, r2)
+                potados.jge(1, 2, -10)
+                self.assertEqual(potados.regs[potados.PC]==0, r1>=r2, f'{r1} >= {r2} but {potados.regs[potados.PC]}')
+
+                potados = get(r1, r2)
+                potados.je(1, 2, -10)
+                self.assertEqual(potados.regs[potados.PC]==0, r1==r2, f'{r1} == {r2} but {potados.regs[potados.PC]}')
+
+                potados = get(r1, r2)
+                potados.jne(1, 2, -10)
+                self.assertEqual(potados.regs[potados.PC]==0, r1!=r2, f'{r1} != {r2} but {potados.regs[potados.PC]}')
+
+                potados = get(r1, r2)
+                potados.jae(1, 2, -10)
+                self.assertEqual(potados.regs[potados.PC]==0, ops.cast(i16(r1), 'unsigned')>=ops.cast(i16(r2), 'unsigned'))
+
+                potados = get(r1, r2)
+                potados.jb(1, 2, -10)
+                self.assertEqual(potados.regs[potados.PC]==0, ops.cast(i16(r1), 'unsigned')<ops.cast(i16(r2), 'unsigned'))
+
+    def test_run(self):
+        def make():
+            potados = POTADOS_EMULATOR()
+            potados.rom.program_rom({
+                0: int(Binary("00 00000000 00000101 0010", 22)), # mov reg[2], 5
+                1: int(Binary("01 001 0001 1 00000001 0001", 22)), # inc reg[1]
+                2: int(Binary("10 011 0010 0 11111111 0001", 22)), # jne reg[1], reg[2], -1
+                3: POTADOS_EMULATOR.INTERUPT_0_AS_INT,
+            })
+            return potados
+
+        potados = make()
+        self.assertEqual(potados.run(1000), RunResult(12, StopReason.HALTED, 4))
+        self.assertEqual(potados.regs[1], 5)
+        self.assertEqual(potados.run(1000), RunResult(0, StopReason.HALTED, 4))
+
+        potados = make()
+        self.assertEqual(potados.run(5), RunResult(5, StopReason.TICK_LIMIT, 1))
+        self.assertEqual(potados.run(1000, breakpoints={3}), RunResult(6, StopReason.BREAKPOINT, 3))
+        self.assertEqual(potados.run(1000), RunResult(1, StopReason.HALTED, 4))
+
+        potados = make()
+        self.assertEqual(potados.run(1000, until=lambda cpu: cpu.regs[1] == 3), RunResult(6, StopReason.UNTIL, 2))
+
+        potados = make()
+        self.assertEqual(potados.run(1000, deadline=0).reason, StopReason.DEADLINE)
+
+    def test_fpu_matches_numpy(self):
+        potados = POTADOS_EMULATOR()
+        to_fp16, from_fp16 = potados.cast_to_fp16, potados.cast_from_fp16
+
+        for value in range(0, 0x10000, 7):
+            potados.regs[2] = value
+            potados.itof(2, 3)
+            potados.utof(2, 4)
+            self.assertEqual(potados.regs[3], from_fp16(value - ((value & 0x8000) << 1)))
+            self.assertEqual(potados.regs[4], from_fp16(value))
+            if np.isfinite(to_fp16(value)):
+                potados.ftoi(2, 5)
+                self.assertEqual(potados.regs[5], int(to_fp16(value)) & 0xFFFF)
+
+        SPECIAL = [0x0000, 0x8000, 0x0001, 0x3C00, 0xC000, 0x7BFF, 0xFBFF, 0x7C00, 0xFC00, 0x7E00, 0xFD55]
+        with np.errstate(all='ignore'):
+            for a in SPECIAL:
+                for b in SPECIAL:
+                    potados.regs[2], potados.regs[3] = a, b
+                    for handler, expected in ((potados.fadd, to_fp16(a) + to_fp16(b)), (potados.fsub, to_fp16(b) - to_fp16(a)),
+                                              (potados.fmul, to_fp16(a) * to_fp16(b)), (potados.fdiv, to_fp16(a) / to_fp16(b))):
+                        handler(2, 3, 4)
+                        self.assertEqual(potados.regs[4], from_fp16(expected), (handler.__name__, hex(a), hex(b)))
+
+    def test_trace_recorder(self):
+        potados = POTADOS_EMULATOR()
+        potados.rom.program_rom({
+            0: int(Binary("00 00000001 00000000 0001", 22)), # mov reg[1], 0x0100
+            1: int(Binary("00 00000000 00000111 0010", 22)), # mov reg[2], 7
+            2: int(Binary("01 000 0001 101 000000 0010", 22)), # mov ram[reg[1]], reg[2]
+            3: int(Binary("01 000 0001 111 000000 0011", 22)), # mov reg[3], ram[reg[1]]
+            4: POTADOS_EMULATOR.INTERUPT_0_AS_INT,
+        })
+        potados.enable_trace_recorder(capacity=3)
+
+        self.assertEqual(potados.run(100), RunResult(5, StopReason.HALTED, 5))
+        self.assertEqual(len(potados.recorder), 3)
+
+        records = potados.recorder.records()
+        self.assertEqual(records['tick'].tolist(), [2, 3, 4])
+        self.assertEqual(records['pc'].tolist(), [2, 3, 4])
+        self.assertEqual(records['word'][2], POTADOS_EMULATOR.INTERUPT_0_AS_INT)
+        self.assertEqual(records[['dst', 'value', 'address']].tolist(), [(-1, 7, 0x0100), (3, 7, 0x0100), (-1, -1, -1)])
+
+        with tempfile.TemporaryDirectory() as directory:
+            dumped = potados.recorder.dump(os.path.join(directory, 'trace.npy'))
+            loaded = TRACE_RECORDER.load(os.path.join(directory, 'trace.npy'))
+            self.assertTrue((loaded == records).all())
+            del dumped, loaded
+
+    def test_snapshot(self):
+        potados = POTADOS_EMULATOR()
+        potados.rom.program_rom({
+            0: int(Binary("01 001 0001 1 00000001 0001", 22)), # inc reg[1]
+            1: int(Binary("01 000 0001 101 000000 0001", 22)), # mov ram[reg[1]], reg[1]
+            2: int(Binary("10 011 0010 0 11111110 0001", 22)), # jne reg[1], reg[2], -2
+            3: POTADOS_EMULATOR.INTERUPT_0_AS_INT,
+        })
+        potados.regs[1] = 0x0100
+        potados.regs[2] = 0x0104
+
+        self.assertEqual(potados.run(3), RunResult(3, StopReason.TICK_LIMIT, 0))
+        snapshot = potados.snapshot()
+        self.assertIs(potados.snapshot().rom, snapshot.rom)
+
+        first = potados.run(100)
+        final_regs = list(potados.regs.regs)
+        self.assertEqual(potados.ram.ram[1:5].tolist(), [0x0101, 0x0102, 0x0103, 0x0104])
+        self.assertFalse(potados.is_running_flag)
+
+        potados.restore(snapshot)
+        self.assertTrue(potados.is_running_flag)
+        self.assertEqual(potados.ram.ram[2], 0)
+        self.assertEqual(potados.run(100), first)
+
+        # restoring other rom decodes it again
+        potados.rom.program_rom({3: POTADOS_EMULATOR.NOP_AS_INT})
+        potados.restore(snapshot)
+        self.assertEqual(potados.rom.decoded[3], (POTADOS_EMULATOR.halt, ()))
+
+        with tempfile.TemporaryDirectory() as directory:
+            snapshot.save(os.path.join(directory, 'state.npz'))
+            loaded = Snapshot.load(os.path.join(directory, 'state.npz'))
+
+        copy = POTADOS_EMULATOR()
+        copy.restore(loaded)
+        self.assertEqual(copy.run(100), first)
+        self.assertEqual(list(copy.regs.regs), final_regs)
+
+    def test_time_travel(self):
+        def make():
+            potados = POTADOS_EMULATOR()
+            potados.rom.program_rom({
+                0: int(Binary("01 001 0001 1 00000001 0001", 22)), # inc reg[1]
+                1: int(Binary("01 000 0001 101 000000 0001", 22)), # mov ram[reg[1]], reg[1]
+                2: int(Binary("10 011 0010 0 11111110 0001", 22)), # jne reg[1], reg[2], -2
+                3: POTADOS_EMULATOR.INTERUPT_0_AS_INT,
+            })
+            potados.regs[1] = 0x0100
+            potados.regs[2] = 0x0110
+            potados.regs.pc_modified = False
+            return potados
+
+        def state(potados: POTADOS_EMULATOR):
+            return list(potados.regs.regs), potados.ram.ram.tolist(), potados.is_running_flag
+
+        potados = make()
+        potados.enable_time_travel(snapshot_interval=8, max_ticks=8)
+        self.assertEqual(potados.run(1000).reason, StopReason.HALTED)
+
+        self.assertEqual(potados.run_back_to_write(0x0110), 3)
+        self.assertEqual(potados.regs[potados.PC], 1)
+        self.assertEqual(potados.ram.ram[0x10], 0)
+        potados.next_tick()
+        self.assertEqual(potados.ram.ram[0x10], 0x0110)
+        self.assertIsNone(potados.run_back_to_write(0x01F0))
+        self.assertIsNone(potados.run_back_to_write(0x0101)) # dropped from journal
+
+        for back in (1, 5, 20):
+            reference = make()
+            reference.run(potados.journal.tick - back)
+            self.assertEqual(potados.step_back(back), back)
+            self.assertEqual(state(potados), state(reference))
+
+        # older than journal - replayed from snapshot
+        self.assertLess(len(potados.journal), potados.journal.tick - 3)
+        reference = make()
+        reference.run(3)
+        potados.step_back(potados.journal.tick - 3)
+        self.assertEqual(state(potados), state(reference))
+
+    def test_profiler(self):
+        potados = POTADOS_EMULATOR()
+        potados.disable_disassembly_trace()
+        potados.rom.program_rom({
+            0: int(Binary("00 00000000 00000101 0010", 22)),   # mov reg[2], 5
+            1: int(Binary("01 001 0001 1 00000001 0001", 22)), # inc reg[1]
+            2: int(Binary("01 011 0011 01000 0001 0011", 22)), # xor reg[3], reg[3], reg[1]
+            3: int(Binary("10 011 0010 0 11111110 0001", 22)), # jne reg[1], reg[2], -2
+            4: POTADOS_EMULATOR.INTERUPT_0_AS_INT,
+        })
+        potados.enable_profiler()
+        self.assertEqual(potados.run(1000).ticks, 17)
+
+        self.assertEqual(potados.profiler.counts[:6].tolist(), [1, 5, 5, 5, 1, 0])
+        counts = potados.profiler.opcode_counts()
+        self.assertEqual((counts['load_imm'], counts['alu_long'], counts['alu_short']), (1, 5, 5))
+        self.assertEqual((counts['branch_taken'], counts['branch_not_taken'], counts['other']), (4, 1, 1))
+
+        labels = {'start': 0, 'loop': 1, 'end': 4}
+        self.assertEqual(potados.profiler.hot_spots(2, labels), [(1, 5, 'loop'), (2, 5, 'loop+1')])
+        self.assertEqual(potados.profiler.functions(labels), {'loop': 15, 'start': 1, 'end': 1})
+        self.assertIn('loop+2', potados.profiler.report(labels=labels))
+
+    def test_cycle_accounting(self):
+        potados = POTADOS_EMULATOR()
+        potados.disable_disassembly_trace()
+        potados.rom.program_rom({
+            0: int(Binary("00 00000000 00000101 0010", 22)),   # mov reg[2], 5
+            1: int(Binary("01 001 0001 1 00000001 0001", 22)), # inc reg[1]
+            2: int(Binary("01 011 0011 01000 0001 0011", 22)), # xor reg[3], reg[3], reg[1]
+            3: int(Binary("10 011 0010 0 11111110 0001", 22)), # jne reg[1], reg[2], -2
+            4: POTADOS_EMULATOR.INTERUPT_0_AS_INT,
+        })
+        self.assertEqual(potados.get_machine_cycles(), 1)
+        potados.enable_cycle_accounting()
+
+        # 1 + 5 * (1 + 1 + 1) + 4 taken branches + int (layout `other`)
+        result = potados.run(1000)
+        self.assertEqual((result.ticks, result.cycles), (17, 22))
+        self.assertEqual(potados.get_machine_cycles(), 2)
+        self.assertAlmostEqual(potados.cycles.time(), 22 * CYCLE_COUNTER.load_profile()['time_per_cycle'])
+        self.assertEqual({name: cycles for name, (cycles, _) in potados.cycles.functions({'loop': 1, 'end': 4}).items()}, 
+                         {'loop': 19, None: 1, 'end': 2})
+
+        costs = {'default': 1, 'layouts': {'aluimm': 5}, 'commands': {'add const': 3}}
+        potados.enable_cycle_accounting(costs, time_per_cycle=0.5)
+        self.assertEqual(potados.cycles.cost(potados.rom.decoded[1][0]), 3)
+        self.assertEqual(potados.cycles.cost(potados.rom.fast_decoded[1][0]), 3)
+        self.assertEqual(potados.cycles.cost(POTADOS_EMULATOR.decode(int(Binary("01 001 0011 0 00000001 0011", 22)))[0]), 5)
+        self.assertEqual(potados.cycles.cost(potados.rom.decoded[3][0]), 1)
+        self.assertEqual(potados.cycles.time(4), 2.0)
+
+        # branches are costed by profile command names, aliases share encoding
+        potados.enable_cycle_accounting({'commands': {'branch jne ': 4, 'branch jge imm': 6, 'branch jle ': 6}})
+        self.assertEqual(potados.cycles.cost(potados.rom.decoded[3][0]), 4)
+        self.assertEqual(potados.cycles.cost(POTADOS_EMULATOR.decode(int(Binary("10 000 0010 0 00000001 0001", 22)))[0]), 6)
+        for costs in ({'commands': {'jne': 4}}, {'layouts': {'jumps': 2}}, {'commands': {'branch jge imm': 6, 'branch jle ': 5}}):
+            with self.assertRaises(error.EmulationError):
+                potados.enable_cycle_accounting(costs)
+
+    def test_shared_memory(self):
+        program = {
+            0: int(Binary("01 001 0001 1 00000001 0001", 22)), # inc reg[1]
+            1: int(Binary("01 000 0001 101 000000 0001", 22)), # mov ram[reg[1]], reg[1]
+            2: int(Binary("10 011 0010 0 11111110 0001", 22)), # jne reg[1], reg[2], -2
+            3: POTADOS_EMULATOR.INTERUPT_0_AS_INT,
+        }
+        with tempfile.TemporaryDirectory() as directory:
+            for kwargs in ({}, {'path': os.path.join(directory, 'state.bin')}):
+                potados = POTADOS_EMULATOR()
+                potados.disable_disassembly_trace()
+                potados.rom.program_rom(program)
+                potados.regs[1] = 0x0100
+                potados.regs[2] = 0x0110
+                potados.regs.pc_modified = False
+                potados.ram[0x0120] = 7
+
+                shared = potados.enable_shared_memory(**kwargs)
+                viewer = SHARED_STATE(name=shared.name, path=kwargs.get('path'), create=False)
+                self.assertEqual(viewer.ram[0x20], 7)
+
+                potados.run(10)
+                self.assertEqual(viewer.regs.tolist(), list(potados.regs.regs))
+                potados.run(1000)
+                self.assertEqual(viewer.ram[0x01:0x11].tolist(), list(range(0x0101, 0x0111)))
+                self.assertEqual(viewer.regs[1], 0x0110)
+
+                snapshot = potados.snapshot()
+                viewer.close()
+                potados.disable_shared_memory()
+                self.assertIsNone(potados.shared)
+                self.assertEqual(potados.snapshot().regs, snapshot.regs)
+                self.assertEqual(potados.ram.ram.tolist(), snapshot.ram.tolist())
+
+    TIMER_PROGRAM = {
+        0: int(Binary("00 00000000 01100100 0010", 22)),   # mov reg[2], 100
+        1: int(Binary("01 000 0000 101 000010 0010", 22)), # tim set reg[2]
+        2: int(Binary("00 00000000 00000001 0011", 22)),   # mov reg[3], 1
+        3: int(Binary("00 00000000 00000010 0101", 22)),   # mov reg[5], 2
+        4: int(Binary("01 000 0000 101 000011 0011", 22)), # tim state set reg[3] (enable)
+        5: int(Binary("01 000 0000 111 000011 0100", 22)), # tim state get reg[4]
+        6: int(Binary("10 011 0101 0 11111111 0100", 22)), # jne reg[4], reg[5], -1
+        7: POTADOS_EMULATOR.INTERUPT_0_AS_INT,
+    }
+
+    def test_timer(self):
+        program = self.TIMER_PROGRAM
+        def make(trace: bool) -> POTADOS_EMULATOR:
+            potados = POTADOS_EMULATOR()
+            if not trace:
+                potados.disable_disassembly_trace()
+            potados.rom.program_rom(program)
+            return potados
+
+        # enabled at 4, expires at 104 - first poll after it is at 105
+        for trace in (True, False):
+            potados = make(trace)
+            self.assertEqual(potados.run(1000).ticks, 108)
+            self.assertEqual(potados.regs[4], TIMER_DEVICE.EXPIRED)
+
+        potados = make(False)
+        potados.run(7)
+        self.assertEqual(potados.ram[TIMER_DEVICE.VALUE], 97)
+        self.assertEqual(potados.fast_forward(), 97)
+        self.assertEqual(potados.fast_forward(), 0)
+        self.assertEqual(potados.run(1000).ticks, 3)
+        self.assertEqual(potados.now(), 107)
+
+        potados.ram[0x0001] = 10
+        potados.idle_cycles += 25
+        self.assertEqual(potados.ram[0x0001], 1)
+        self.assertEqual(potados.ram[0x0001], 0)
+        potados.fast_forward()
+        self.assertEqual(potados.now(), 107 + 30)
+        self.assertEqual(potados.ram[0x0001], 1)
+
+        # repeating timer
+        potados.ram[TIMER_DEVICE.VALUE] = 5
+        potados.ram[TIMER_DEVICE.FLAGS] = TIMER_DEVICE.ENABLED | TIMER_DEVICE.REPEAT
+        potados.idle_cycles += 12
+        self.assertEqual(potados.ram[TIMER_DEVICE.FLAGS], TIMER_DEVICE.ENABLED | TIMER_DEVICE.REPEAT | TIMER_DEVICE.EXPIRED)
+        self.assertEqual(potados.ram[TIMER_DEVICE.VALUE], 3)
+
+        # the same program with spin detection - polling loop is skipped up to the expiry
+        for trace in (True, False):
+            potados = make(trace)
+            potados.enable_spin_detection()
+            # first poll differs in flags (jne didn't run yet), so loop is detected on the third one
+            self.assertEqual(potados.run(1000).ticks, 108)
+            self.assertEqual((potados.ticks, potados.regs[4]), (108, TIMER_DEVICE.EXPIRED))
+            self.assertEqual(potados.ram.io.spin.skipped_iterations, 47)
+            self.assertEqual(potados.ram.io.spin.skipped_ticks, 94)
+
+        # skipped ticks count towards `max_ticks`
+        potados = make(False)
+        potados.enable_spin_detection()
+        result = potados.run(50)
+        self.assertEqual((result.ticks, result.reason, potados.ticks), (50, StopReason.TICK_LIMIT, 50))
+        self.assertEqual(potados.run(1000).ticks, 58)
+        self.assertEqual(potados.regs[4], TIMER_DEVICE.EXPIRED)
+
+        potados = make(False)
+        potados.enable_spin_detection()
+        potados.enable_cycle_accounting({'default': 1, 'branch_taken': 2})
+        result = potados.run(1000)
+        self.assertEqual((potados.now(), result.cycles), (potados.cycles.total, potados.cycles.total))
+        self.assertEqual(int(potados.cycles.per_pc.sum()), potados.cycles.total)
+        self.assertEqual(result.ticks, potados.ticks)
+        self.assertLess(potados.ram.io.spin.skipped_ticks, potados.ticks)
+        self.assertGreaterEqual(potados.now(), 104)
+        self.assertEqual(potados.regs[4], TIMER_DEVICE.EXPIRED)
+
+    def test_timer_snapshot(self):
+        def make() -> POTADOS_EMULATOR:
+            potados = POTADOS_EMULATOR()
+            potados.disable_disassembly_trace()
+            potados.rom.program_rom(self.TIMER_PROGRAM)
+            return potados
+
+        def at(ticks: int) -> POTADOS_EMULATOR:
+            reference = make()
+            reference.run(ticks)
+            return reference
+
+        # snapshot in the middle of countdown carries time, timer and its expiry event
+        potados = make()
+        potados.run(20)
+        snapshot = potados.snapshot()
+        with tempfile.TemporaryDirectory() as directory:
+            snapshot.save(os.path.join(directory, 'state.npz'))
+            loaded = Snapshot.load(os.path.join(directory, 'state.npz'))
+
+        for state in (snapshot, loaded):
+            copy = make()
+            copy.restore(state)
+            self.assertEqual(copy.ticks, 20)
+            self.assertEqual(copy.run(1000)[:2], (88, StopReason.HALTED))
+            self.assertEqual(copy.regs[4], TIMER_DEVICE.EXPIRED)
+
+        # restoring into running machine drops its events
+        potados.run(1000)
+        potados.restore(snapshot)
+        self.assertEqual(potados.ram[TIMER_DEVICE.VALUE], at(20).ram[TIMER_DEVICE.VALUE])
+        self.assertEqual(potados.run(1000).ticks, 88)
+
+        # time travel back over expiry (undone from journal) and further (replayed from snapshot)
+        potados = make()
+        potados.enable_time_travel(snapshot_interval=16, max_ticks=16)
+        self.assertEqual(potados.run(1000).ticks, 108)
+        for back, ticks in ((10, 98), (80, 28)):
+            potados.step_back(back)
+            reference = at(ticks)
+            self.assertEqual(potados.ticks, ticks)
+            self.assertEqual(potados.ram[TIMER_DEVICE.FLAGS], reference.ram[TIMER_DEVICE.FLAGS])
+            self.assertEqual(potados.ram[TIMER_DEVICE.VALUE], reference.ram[TIMER_DEVICE.VALUE])
+            self.assertEqual(potados.run(1000).ticks, reference.run(1000).ticks)
+            self.assertEqual((potados.ticks, potados.regs[4]), (108, TIMER_DEVICE.EXPIRED))
+
+    def test_gpu(self):
+        G = GPU_DEVICE
+        commands = [G.CLEAR, 7, G.RECT, 2, 3, 4, 5, 1, G.LINE, 0, 0, 31, 31, 14, G.BLIT, 10, 10, 2, 2, 0x0180, G.PIXEL, 31, 0, 4, G.PRESENT, G.END]
+        program = {
+            0: int(Binary("00 00000001 01000000 0001", 22)),   # mov reg[1], 0x0140
+            1: int(Binary("01 000 0000 101 001101 0001", 22)), # gpu invoke reg[1]
+            2: int(Binary("01 000 0000 111 001100 0010", 22)), # gpu status reg[2]
+            3: int(Binary("10 011 0000 0 11111111 0010", 22)), # jne reg[2], reg[0], -1
+            4: POTADOS_EMULATOR.INTERUPT_0_AS_INT,
+        }
+        for spin in (False, True):
+            potados = POTADOS_EMULATOR()
+            potados.disable_disassembly_trace()
+            if spin:
+                potados.enable_spin_detection()
+            potados.rom.program_rom(program)
+            for i, word in enumerate(commands):
+                potados.ram[0x0140 + i] = word
+            for i, word in enumerate([1, 2, 3, 4]):
+                potados.ram[0x0180 + i] = word
+
+            # 7 commands and 1081 pixels take 2 * 7 + 68 cycles after invoke at 1, first poll after it is at 84
+            potados.run(1000)
+            self.assertEqual((potados.ticks, potados.regs[2]), (87, 0))
+
+        gpu = potados.ram.io.gpu
+        self.assertEqual(gpu.frames, 1)
+        self.assertEqual(int((gpu.front[3:8, 2:6] == 1).sum()), 20 - 3) # diagonal line crosses the rect
+        self.assertEqual(np.diagonal(gpu.front).tolist(), [14] * 10 + [1, 4] + [14] * 20) # sprite is drawn over the line
+        self.assertEqual(gpu.front[10:12, 10:12].tolist(), [[1, 2], [3, 4]])
+        self.assertEqual((gpu.front[0, 31], gpu.front[31, 0]), (4, 7))
+        self.assertEqual(gpu.rgb()[0, 31].tolist(), list(G.PALETTE[4]))
+
+        with tempfile.TemporaryDirectory() as directory:
+            gpu.save(os.path.join(directory, 'frame.npy'))
+            self.assertTrue((np.load(os.path.join(directory, 'frame.npy')) == gpu.front).all())
+            gpu.save(os.path.join(directory, 'frame.png'))
+            with open(os.path.join(directory, 'frame.png'), 'rb') as f:
+                self.assertEqual(f.read(16), b'\x89PNG\r\n\x1a\n\x00\x00\x00\x0dIHDR')
+
+        potados.ram[0x0160] = 99
+        potados.ram[G.INVOKE] = 0x0160
+        self.assertEqual(potados.ram[G.STATUS], G.ERROR)
+
+        # blit is clipped to the framebuffer before the sprite is read, only drawn pixels take time
+        for i, word in enumerate([G.BLIT, 30, 31, 0xFFFF, 0xFFFF, 0x0180, G.END]):
+            potados.ram[0x0160 + i] = word
+        potados.ram[G.INVOKE] = 0x0160
+        self.assertEqual(potados.ram[G.STATUS], G.BUSY)
+        self.assertEqual(gpu.busy_until - potados.now(), 2 * G.COMMAND_CYCLES + 1)
+        self.assertEqual(gpu.back[31, 30:].tolist(), [1, 2])
+
+    def test_block_translation(self):
+        program = {
+            0: int(Binary("00 00000000 00000101 0010", 22)), # mov reg[2], 5
+            1: int(Binary("01 001 0001 1 00000001 0001", 22)), # inc reg[1]
+            2: int(Binary("01 001 0011 0 00000001 0011", 22)), # add reg[3], reg[3], reg[1]
+            3: int(Binary("10 011 0010 0 11111110 0001", 22)), # jne reg[1], reg[2], -2
+            4: POTADOS_EMULATOR.INTERUPT_0_AS_INT,
+        }
+        interpreted = POTADOS_EMULATOR()
+        interpreted.disable_block_translation()
+        interpreted.rom.program_rom(program)
+        translated = POTADOS_EMULATOR()
+        translated.disable_disassembly_trace()
+        translated.rom.program_rom(program)
+
+        for limit in (1, 3, 7, 1000):
+            self.assertEqual(translated.run(limit), interpreted.run(limit))
+            self.assertEqual(list(translated.regs.regs), list(interpreted.regs.regs))
+        self.assertEqual(translated.regs[3], 15)
+        self.assertIn(1, translated.blocks.blocks)
+
+        # reprogramming drops blocks that contain changed address
+        translated.rom.program_rom({2: POTADOS_EMULATOR.NOP_AS_INT})
+        self.assertNotIn(1, translated.blocks.blocks)
+
+class BATCH_TESTS(unittest.TestCase):
+    def test_against_emulator(self):
+        program = {
+            0: int(Binary("01 000 0000 00110 0010 0011", 22)), # itof reg[3], reg[2]
+            1: int(Binary("01 000 0011 00001 0011 0100", 22)), # fadd reg[4], reg[3], reg[3]
+            2: int(Binary("01 000 0000 00101 0100 0101", 22)), # ftoi reg[5], reg[4]
+            3: int(Binary("01 001 0001 1 00000001 0001", 22)), # inc reg[1]
+            4: int(Binary("10 011 0010 0 11111111 0001", 22)), # jne reg[1], reg[2], -1
+            5: POTADOS_EMULATOR.INTERUPT_0_AS_INT,
+        }
+        batch = BatchPotados(8)
+        batch.program_rom(program)
+        emulators = []
+        for index in range(len(batch)):
+            potados = POTADOS_EMULATOR()
+            potados.rom.program_rom(program)
+            potados.regs[2] = index + 1
+            batch.load_machine(index, potados)
+            emulators.append(potados)
+
+        self.assertEqual(batch.run(1000), 20) # machines leave the loop one by one
+        self.assertFalse(batch.running.any())
+
+        for index, potados in enumerate(emulators):
+            result = potados.run(100000)
+            self.assertEqual(batch.ticks[index], result.ticks)
+            self.assertEqual(batch.regs[index].tolist(), list(potados.regs.regs))
+            self.assertEqual(batch.regs[index, 5], 2 * (index + 1))
+
+        self.assertEqual(list(batch.get_machine(4).regs.regs), batch.regs[4].tolist())
+
+        # conversions of values out of fp16 range (>= 65520 is inf) don't warn, just as emulator tables
+        program = {
+            0: int(Binary("01 000 0000 00111 0010 0011", 22)), # utof reg[3], reg[2]
+            1: int(Binary("01 000 0000 00110 0010 0100", 22)), # itof reg[4], reg[2]
+            2: POTADOS_EMULATOR.INTERUPT_0_AS_INT,
+        }
+        values = [0, 1, 2049, 0x7FFF, 0x8000, 65504, 65519, 65520, 0xFFFF]
+        batch = BatchPotados(len(values))
+        batch.program_rom(program)
+        batch.regs[:, 2] = values
+        with warnings.catch_warnings():
+            warnings.simplefilter('error')
+            batch.run(10)
+        for index, value in enumerate(values):
+            potados = POTADOS_EMULATOR()
+            potados.disable_disassembly_trace()
+            potados.rom.program_rom(program)
+            potados.regs[2] = value
+            potados.run(10)
+            self.assertEqual(batch.regs[index].tolist(), list(potados.regs.regs))
+        self.assertEqual(batch.regs[-1, 3], 0x7C00) # inf
+
+    def test_fallback(self):
+        batch = BatchPotados(2)
+        batch.program_rom({
+            0: int(Binary("01 000 0000 01000 0000 0000", 22)), # invalid
+            1: POTADOS_EMULATOR.INTERUPT_0_AS_INT,
+        })
+        batch.regs[1, POTADOS_EMULATOR.PC] = 1
+
+        self.assertEqual(batch.step(), 2)
+        self.assertIsInstance(batch.errors[0], error.EmulationError)
+        self.assertEqual(batch.running.tolist(), [False, False])
+        self.assertEqual(batch.ticks.tolist(), [0, 1])
+        self.assertEqual(batch.regs[:, POTADOS_EMULATOR.PC].tolist(), [0, 2])
+
+    def test_devices_per_machine(self):
+        program = {
+            0: POTADOS_EMULATOR.NOP_AS_INT,                    # reg[2] holds delay
+            1: int(Binary("01 000 0000 101 000010 0010", 22)), # tim set reg[2]
+            2: int(Binary("00 00000000 00000001 0011", 22)),   # mov reg[3], 1
+            3: int(Binary("00 00000000 00000010 0101", 22)),   # mov reg[5], 2
+            4: int(Binary("01 000 0000 101 000011 0011", 22)), # tim state set reg[3] (enable)
+            5: int(Binary("01 000 0000 111 000011 0100", 22)), # tim state get reg[4]
+            6: int(Binary("10 011 0101 0 11111111 0100", 22)), # jne reg[4], reg[5], -1
+            7: int(Binary("01 000 0000 111 000001 0110", 22)), # clk get reg[6]
+            8: POTADOS_EMULATOR.INTERUPT_0_AS_INT,
+        }
+        batch = BatchPotados(3)
+        batch.program_rom(program)
+        emulators = []
+        for index in range(len(batch)):
+            potados = POTADOS_EMULATOR()
+            potados.disable_disassembly_trace()
+            potados.rom.program_rom(program)
+            potados.regs[2] = 10 * (index + 1)
+            batch.load_machine(index, potados)
+            emulators.append(potados)
+
+        batch.run(1000)
+        self.assertFalse(batch.running.any())
+        self.assertEqual(len(batch.io), 3)
+
+        for index, potados in enumerate(emulators):
+            result = potados.run(1000)
+            self.assertEqual(batch.ticks[index], result.ticks)
+            self.assertEqual(batch.regs[index].tolist(), list(potados.regs.regs))
+            self.assertEqual(batch.regs[index, 4], TIMER_DEVICE.EXPIRED)
+        self.assertLess(batch.ticks[0], batch.ticks[1])
+
+class FARM_TESTS(unittest.TestCase):
+    PROGRAM = {
+        0: int(Binary("01 000 0001 111 000000 0011", 22)), # mov reg[3], ram[reg[1]]
+        1: int(Binary("01 001 0001 1 00000001 0001", 22)), # inc reg[1]
+        2: int(Binary("10 011 0010 0 11111110 0001", 22)), # jne reg[1], reg[2], -2
+        3: POTADOS_EMULATOR.INTERUPT_0_AS_INT,
+    }
+
+    def setup(self, potados: POTADOS_EMULATOR):
+        potados.regs[1] = 0x0100
+        potados.ram[0x0105] = 42
+
+    def test_run(self):
+        jobs = [FarmJob(regs={2: 0x0100 + n}) for n in range(1, 8)] + [FarmJob(regs={2: 0x0180}, max_ticks=10)]
+
+        for workers in (0, 2):
+            results = POTADOS_FARM(self.PROGRAM, workers=workers, setup=self.setup).run(jobs)
+
+            for n, farm_result in enumerate(results[:-1], 1):
+                self.assertIsNone(farm_result.error)
+                self.assertEqual(farm_result.result, RunResult(3 * n + 1, StopReason.HALTED, 4))
+                self.assertEqual(farm_result.regs[3], 42 if n == 6 else 0)
+                self.assertEqual(farm_result.ram[5], 42)
+            self.assertEqual(results[-1].result.reason, StopReason.TICK_LIMIT)
+
+    def test_error(self):
+        farm = POTADOS_FARM({0: int(Binary("01 000 0000 01000 0000 0000", 22))}, workers=0)
+
+        farm_result, = farm.run([FarmJob()])
+
+        self.assertIsNone(farm_result.result)
+        self.assertTrue(farm_result.error.startswith('EmulationError'))
+
+class PROFILE_CACHE_TESTS(unittest.TestCase):
+    def test_stale_cache_is_recompiled(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'potados.profile.pickle')
+            with open(path, 'wb') as f:
+                pickle.dump('stale', f)
+                pickle.dump('stale profile', f)
+
+            self.assertNotEqual(load_profile(path), 'stale profile')
+            with open(path, 'rb') as f:
+                self.assertEqual(pickle.load(f), profile_hash())
+
+            # fresh one is loaded without parsing
+            with open(path, 'wb') as f:
+                pickle.dump(profile_hash(), f)
+                pickle.dump('compiled profile', f)
+            self.assertNotEqual(load_profile(path), 'compiled profile') # loaded already
+            del potados_emulator.loaded_profiles[os.path.abspath(path)]
+            self.assertEqual(load_profile(path), 'compiled profile')
+
+            # profiles compiled into other paths are loaded separately
+            other = os.path.join(directory, 'other.profile.pickle')
+            with open(other, 'wb') as f:
+                pickle.dump(profile_hash(), f)
+                pickle.dump('other profile', f)
+            self.assertEqual(load_profile(other), 'other profile')
+            self.assertEqual(load_profile(path), 'compiled profile')
+
+    def test_hash_is_taken_before_parsing(self):
+        # profile edited while it is parsed is compiled with hash of what was read before - stale on next load
+        import core.profile.profile as profile_module
+        original = profile_module.load_profile_from_file
+        with open(potados_emulator.profile_source_path(), 'rb') as f:
+            source = f.read()
+        def edited(*args, **kwargs):
+            potados_emulator.profile_source_path = lambda: edited_path
+            return original(*args, **kwargs)
+
+        with tempfile.TemporaryDirectory() as directory:
+            edited_path = os.path.join(directory, 'potados.jsonc')
+            with open(edited_path, 'wb') as f:
+                f.write(source + b' ')
+            source_path = potados_emulator.profile_source_path
+            profile_module.load_profile_from_file = edited
+            try:
+                path = os.path.join(directory, 'potados.profile.pickle')
+                compile_profile(path)
+                with open(path, 'rb') as f:
+                    self.assertEqual(pickle.load(f), profile_hash(source))
+                self.assertNotEqual(profile_hash(), profile_hash(source))
+            finally:
+                profile_module.load_profile_from_file = original
+                potados_emulator.profile_source_path = source_path
+
+    def test_failed_compilation_leaves_no_temp_file(self):
+        with tempfile.TemporaryDirectory() as directory:
+            target = os.path.join(directory, 'potados.profile.pickle')
+            os.mkdir(target) # replace fails
+            with self.assertRaises(OSError):
+                compile_profile(target)
+            self.assertEqual(os.listdir(directory), ['potados.profile.pickle'])
+
+    def test_hash_depends_on_core_version(self):
+        import core
+        original = profile_hash()
+        previous = getattr(core, '__version__', None)
+        core.__version__ = 'upgraded'
+        try:
+            self.assertNotEqual(profile_hash(), original)
+        finally:
+            if previous is None:
+                del core.__version__
+            else:
+                core.__version__ = previous
+        self.assertEqual(profile_hash(), original)
+
+class POTADOS_COMPILATION_TESTS(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.profile = load_profile()
+
+    def test_compile(self):
+        output, context = quick.translate([
+            'mov reg[1], 1',
+            'add reg[1], reg[2], reg[3]',
+            'LABEL:',
+            'jne reg[1], reg[2], LABEL',
+            'mov reg[1], ram[reg[2]+3]',
+        ], 
+        POTADOS_COMPILATION_TESTS.profile)
+
+        parsed = [line.parsed_command for line in output]
+
+        self.assertEqual(parsed, 
+            [
+                {'const16': {'pdec': 0, 'const': 1, 'dst': 1}}, 
+                {'aluimm': {'pridec': 1, 'secdec': 1, 'r2': 2, 'I': 0, 'R1': 3, 'dst': 1}}, 
+                {'branch': {'pridec': 2, 'secdec': 3, 'r2': 2, 'pad': 0, 'offset': 0, 'r1': 1}}, 
+                {'indirect': {'pridec': 1, 'secdec': 0, 'ptr': 2, '3th': 7, 'offset': 3, 'srcdst': 1}},
+            ]
+        )
+
+        self.assertEqual(context.labels, {'LABEL': 3})
+        self.assertEqual(context.physical_adresses, {'LABEL': 2})
+
+    def test_compile_to_binary(self):
+        output, _ = quick.translate([
+            'mov reg[1], 1',
+            'add reg[1], reg[2], 1',
+        ], 
+        POTADOS_COMPILATION_TESTS.profile)
+
+        EXPECTED = [int(Binary("00  00000000 00000001  0001", 22)), int(Binary("01 001  0010 1 00000001 0001", 22))]
+
+        gathered, _ = quick.gather_instructions(output, POTADOS_COMPILATION_TESTS.profile.adressing)
+
+        self.assertEqual(gathered, {0: [EXPECTED[0]], 1: [EXPECTED[1]]})
+
+        packed = quick.pack_adresses(gathered)
+
+        self.assertEqual(packed, {0: EXPECTED[0], 1: EXPECTED[1]})
+
+    def run_emulation(self, potados: POTADOS_EMULATOR, program : typing.List[str], limit = 1000):
+        potados.rom.program_rom(POTADOS_FARM.assemble(program))
+
+        result = potados.run(limit)
+        if result.reason != StopReason.HALTED:
+            raise Exception(f'Program did not finish within {limit} ticks')
+
+        return potados
+
+    def test_fibonacci(self):
+        potados = POTADOS_EMULATOR()
+        FIBONACCI_CODE = [
+            'mov reg[1], 1',
+            'mov reg[2], 1',
+            'mov reg[4], 15',
+            'mov reg[5], 0',
+            'LABEL:',
+            'add reg[3], reg[1], reg[2]',
+            'mov reg[1], reg[2]',
+            'mov reg[2], reg[3]',
+            'inc reg[5]',
+            'jne reg[5], reg[4], LABEL',
+            'int 0'
+        ]
+        
+        try:
+            potados = self.run_emulation(potados, FIBONACCI_CODE, 1000)
+        except Exception as e:
+            raise Exception(f'Fibonacci failed: {e}')
+
+        # fibonacii is 1 1 2 3 5 8 13 21 34 55 89 144 233 377 610 987 1597 2584 4181 6765 
+        #                                                         ^^^ ^^^^
+        #                  1 2 3 4 5  6  7  8  9  19  11  12  13  14  15 
+        self.assertEqual(potados.regs[1], 987)
+        self.assertEqual(potados.regs[2], 1597)
+        self.assertEqual(potados.regs[3], 1597)
+        self.assertEqual(potados.regs[4], 15)
+        self.assertEqual(potados.regs[5], 15)
+        self.assertEqual(potados.regs[potados.PC], 10)
+
+    def test_memcpy(self):
+        potados = POTADOS_EMULATOR()
+        MEMCPY_CODE = [
+            'mov reg[1], 0x0100',
+            'add reg[2], reg[1], 0x0010',
+            'add reg[3], reg[1], 0x0010',
+            'MEMCPY_loop:',
+            'mov reg[4], ram[reg[1]]',
+            'mov ram[reg[3]], reg[4]', 
+            'inc reg[3]',
+            'jne reg[1]++, reg[2], MEMCPY_loop',
+            'int 0'
+        ]
+        for i in range(0, 16):
+            potados.ram[0x0100+i] = i
+
+        try:
+            potados = self.run_emulation(potados, MEMCPY_CODE, 1000)
+        except Exception as e:
+            raise Exception(f'Memcpy failed: {e}')
+        
+        for i in range(0, 16):
+            self.assertEqual(potados.ram[0x0100+i], potados.ram[0x0100+0x0010+i])
+
+    def test_fibonacci_floats(self):
+        potados = POTADOS_EMULATOR()
+        FIBONACCI_CODE = [
+                'mov reg[1], 0',
+                'mov reg[2], 0',
+                'mov reg[3], 1',
+                'mov reg[4], 8',
+                'mov reg[5], 0x5640', # 100.0f16
+                'LOOP:',
+                'add reg[2], reg[2], reg[3]',
+                #'dbg reg[2]',
+                'add reg[3], reg[3], reg[2]',
+                #'dbg reg[3]',
+                'jne reg[1]++, reg[4], LOOP',
+                'itof reg[2], reg[2]',
+                'itof reg[3], reg[3]',
+                'fdiv reg[1], reg[2], reg[3]',
+                'fmul reg[1], reg[1], reg[5]',
+                'ftoi reg[1], reg[1]',
+                #'dbg reg[1]',
+                'int 0',
+        ]
+        
+        try:
+            potados = self.run_emulation(potados, FIBONACCI_CODE, 1000)
+        except Exception as e:
+            raise Exception(f'Fibonacci failed: {e}')
+
+        self.assertEqual(potados.regs[1], 161)
+
+    def test_incremental_assembly(self):
+        PROGRAM = [
+            'jmp START',
+            'LOOP:',
+            'add reg[3], reg[1], reg[2]',
+            'mov reg[1], reg[2]',
+            'mov reg[2], reg[3]',
+            'inc reg[5]',
+            'jne reg[5], reg[4], LOOP',
+            'int 0',
+            'START:',
+            'mov reg[1], 1',
+            'mov reg[2], 1',
+            'mov reg[4], 15',
+            'mov reg[5], 0',
+            'jmp LOOP',
+        ]
+        session = ASSEMBLY_SESSION(POTADOS_COMPILATION_TESTS.profile)
+        potados = POTADOS_EMULATOR()
+        potados.disable_disassembly_trace()
+
+        changes = session.patch(potados, PROGRAM)
+        self.assertEqual(changes, POTADOS_FARM.assemble(PROGRAM))
+        self.assertEqual(session.labels, {'LOOP': 1, 'START': 7})
+        potados.run(1000)
+        self.assertEqual(potados.regs[1], 987)
+
+        # edited constant - one line is translated, one word is patched
+        translated = session.translated
+        edited = PROGRAM[:11] + ['mov reg[4], 16'] + PROGRAM[12:]
+        self.assertEqual(session.update(edited), {9: POTADOS_FARM.assemble(['mov reg[4], 16'])[0]})
+        self.assertEqual(session.translated, translated + 1)
+
+        # inserted line moves START - only moved words and `jmp START` change, nothing else is translated
+        inserted = edited[:8] + ['nop'] + edited[8:]
+        translated = session.translated
+        changes = session.patch(potados, inserted)
+        self.assertEqual(session.program, POTADOS_FARM.assemble(inserted))
+        self.assertEqual(sorted(changes), [0, 7, 8, 9, 10, 11, 12])
+        self.assertEqual(session.translated, translated + 1)
+
+        potados.regs[7] = 0
+        potados.is_running_flag = True
+        potados.run(1000)
+        self.assertEqual(potados.regs[1], 1597)
+
+        # removed tail is filled with nops
+        self.assertEqual(session.update(inserted[:-1]), {12: ASSEMBLY_SESSION.FILL})
+
+    @staticmethod
+    def profile_with_macros(macros: dict):
+        """Potados profile with additional `macros`, parsed by core (which finds profiles relative to working directory)"""
+        import json
+        from core.profile.profile import load_profile_from_file
+        with open(potados_emulator.PROFILE_PATH) as f:
+            source = json.load(f)
+        source['CPU']['MACROS'].update(macros)
+
+        cwd = os.getcwd()
+        with tempfile.TemporaryDirectory() as directory:
+            os.makedirs(os.path.join(directory, 'profiles', 'potados'))
+            with open(os.path.join(directory, 'profiles', 'potados', 'potados.jsonc'), 'w') as f:
+                json.dump(source, f)
+            os.chdir(directory)
+            try:
+                return load_profile_from_file('potados', load_emulator=False)
+            finally:
+                os.chdir(cwd)
+
+    def test_incremental_assembly_macro(self):
+        # label of `loop` is in the second expanded word (`jne`), the first one (`dec`) is left as it is
+        profile = self.profile_with_macros({"loop": {"pattern": "loop reg[{counter:token}], {label:token}", "process": {}, 
+                                                     "expansion": ["dec reg[{counter}]", "jne reg[{counter}], reg[0], {label}"]}})
+        assemble = lambda lines: ASSEMBLY_SESSION(profile).translate_lines(lines)[1]
+        PROGRAM = [
+            'mov reg[1], 0',
+            'mov reg[5], 10',
+            'LOOP:',
+            'add reg[1], reg[1], 3',
+            'loop reg[5], LOOP',
+            'int 0',
+        ]
+        session = ASSEMBLY_SESSION(profile)
+        self.assertEqual(session.assemble(PROGRAM), assemble(PROGRAM))
+        self.assertEqual(session.translate('loop reg[5], LOOP', 'LOOP').word, 1)
+
+        translated = session.translated
+        inserted = ['nop'] + PROGRAM
+        self.assertEqual(session.assemble(inserted), assemble(inserted))
+        self.assertEqual(session.translated, translated + 1)
+
+        potados = POTADOS_EMULATOR()
+        potados.disable_disassembly_trace()
+        session.patch(potados, inserted)
+        potados.run(1000)
+        self.assertEqual(potados.regs[1], 30)
+
+        # label named like mnemonic is not referenced by it
+        named = ['loop:', 'loop reg[2], end', 'end:']
+        self.assertEqual(session.references(named[1], {'loop', 'end'}), ['end'])
+        self.assertEqual(session.assemble(named), assemble(named))
+
+
+if __name__ == "__main__":
+    unittest.main()
+    
\ No newline at end of file
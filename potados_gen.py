@@ -594,43 +594,100 @@ def gen_macro_store_imm(pattern, process):
              "expansion":["mov ram[reg[{ptr}] + {offset}], reg[{dst}]"]}}
 base["CPU"]["COMMANDS"].update(gen_base())
 
+#
+# address expressions
+#
+# Every macro below is one ordering of up to three terms of ram[...] address: base register (reg[ptr]),
+# scaled index (lsh*reg[8]) and displacement (+-offset). Scales 1, 2, 4, 8 are matched by one `{lsh:token}`
+# pattern instead of one macro per scale (other tokens match too and are rejected only by `lsh` encoding of
+# `load ptr lsh` / `store ptr lsh`), 0*reg[8] is kept literal as it expands into imm form.
+BASE = "reg[{ptr:token}]"
+DISPLACEMENT = "{offset:token}"
+INDEXES = [
+    ("0*reg[8]", "0"),             # literal zero scale - has to come before scaled one
+    ("{lsh:token}*reg[8]", "lsh"),
+    ("reg[8]", "1"),
+]
+
+def join_terms(terms):
+    """Joins (sign, term) pairs into address expression (leading + is dropped)"""
+    return " ".join(f"{sign} {term}" if sign == "-" or i > 0 else term for i, (sign, term) in enumerate(terms))
+
+def parse_address(expression):
+    """Parses ram[...] contents with plain numbers into (ptr, index scale, offset)"""
+    import re
+    terms = re.findall(r"([+-]?)([^+-]+)", expression.replace(" ", ""))
+    registers, scale, offset = [], 0, 0
+    for sign, term in terms:
+        scaled = re.fullmatch(r"(\d+)\*reg\[8\]", term)
+        register = re.fullmatch(r"reg\[(\d+)\]", term)
+        if scaled and sign != "-":
+            scale = int(scaled[1])
+        elif register and sign != "-":
+            registers.append(int(register[1]))
+        elif term.isdigit():
+            offset += -int(term) if sign == "-" else int(term)
+        else:
+            raise ValueError(f"Invalid address expression: {expression}")
+
+    if len(registers) == 2 and 8 in registers:  # bare reg[8] next to base register is index
+        registers.remove(8)
+        scale = 1
+    if len(registers) > 1:
+        raise ValueError(f"Invalid address expression: {expression}")
+    return (registers[0] if registers else 0, scale, offset)
+
 def gen_all(gen_func):
     import itertools
 
+    def add(terms, process):
+        base["CPU"]["MACROS"].update(gen_func(join_terms(terms), dict(process)))
+
     # base
-    base["CPU"]["MACROS"].update(gen_func("reg[{ptr:token}]", {"offset":"0"}))
-    # base + displ
-    base["CPU"]["MACROS"].update(gen_func("{offset:token} + reg[{ptr:token}]", {"offset":"offset"}))
+    add([("+", BASE)], {"offset":"0"})
+    # displ + base (base + displ is plain command)
+    add([("+", DISPLACEMENT), ("+", BASE)], {"offset":"offset"})
     # displ
-    base["CPU"]["MACROS"].update(gen_func("{offset:token}", {"ptr":"0", "offset":"offset"}))
-    # base + negative displ
-    base["CPU"]["MACROS"].update(gen_func("reg[{ptr:token}] - {offset:token}", {"offset":"-int(offset)"}))
-    base["CPU"]["MACROS"].update(gen_func("- {offset:token} + reg[{ptr:token}]", {"offset":"-int(offset)"}))
-    # base + index + displ
-    for lsh in [0, 1, 2, 4, 8]:
-        for (a,b,c) in itertools.islice(itertools.permutations(["reg[{ptr:token}]", f"{lsh}*reg[8]", "{offset:token}"]), 1, None):
-            base["CPU"]["MACROS"].update(gen_func(f"{a} + {b} + {c}", {"lsh":f"{lsh}", "offset":"offset"}))
-    for (a,b,c) in itertools.permutations(["reg[{ptr:token}]", f"reg[8]", "{offset:token}"]):
-            base["CPU"]["MACROS"].update(gen_func(f"{a} + {b} + {c}", {"lsh":"1", "offset":"offset"}))
-    # base + index
-    for lsh in [0, 1, 2, 4, 8]:
-        for (a,b) in itertools.permutations(["reg[{ptr:token}]", f"{lsh}*reg[8]"]):
-            base["CPU"]["MACROS"].update(gen_func(f"{a} + {b}", {"lsh":f"{lsh}", "offset":"0"}))
-    for (a,b) in itertools.permutations(["reg[{ptr:token}]", "reg[8]"]):
-        base["CPU"]["MACROS"].update(gen_func(f"{a} + {b}", {"lsh":"1", "offset":"0"}))
-    # index
-    for lsh in [0, 1, 2, 4, 8]:
-        base["CPU"]["MACROS"].update(gen_func(f"{lsh}*reg[8]", {"ptr":"0", "offset":"0"}))
-    # base + index + negative displ
-    for lsh in [0, 1, 2, 4, 8]:
-        for (a,b,c) in itertools.permutations(["+ reg[{ptr:token}]", f"+ {lsh}*reg[8]", "- {offset:token}"]):
-            base["CPU"]["MACROS"].update(gen_func(f"{a.strip('+')} {b} {c}", { "lsh":f"{lsh}", "offset":"-int(offset)"}))
-    for (a,b,c) in itertools.permutations(["+ reg[{ptr:token}]", f"+ reg[8]", "- {offset:token}"]):
-            base["CPU"]["MACROS"].update(gen_func(f"{a.strip('+')} {b} {c}", { "lsh":"1", "offset":"-int(offset)"}))
+    add([("+", DISPLACEMENT)], {"ptr":"0", "offset":"offset"})
+    # base - displ
+    add([("+", BASE), ("-", DISPLACEMENT)], {"offset":"-int(offset)"})
+    add([("-", DISPLACEMENT), ("+", BASE)], {"offset":"-int(offset)"})
+
+    for index, lsh in INDEXES:
+        # base + index + displ (base + lsh*index + displ is plain command)
+        orders = list(itertools.permutations([("+", BASE), ("+", index), ("+", DISPLACEMENT)]))
+        for terms in orders if index == "reg[8]" else orders[1:]:
+            add(terms, {"lsh":lsh, "offset":"offset"})
+        # base + index
+        for terms in itertools.permutations([("+", BASE), ("+", index)]):
+            add(terms, {"lsh":lsh, "offset":"0"})
+        # index
+        if index != "reg[8]":
+            add([("+", index)], {"lsh":lsh, "ptr":"0", "offset":"0"})
+        # base + index - displ
+        for terms in itertools.permutations([("+", BASE), ("+", index), ("-", DISPLACEMENT)]):
+            add(terms, {"lsh":lsh, "offset":"-int(offset)"})
+
+def check_address_macros(macros):
+    """Instantiates every address macro with sample operands and checks that expansion addresses the same word"""
+    import re
+    sample = {"dst": "1", "ptr": "3", "offset": "5", "lsh": "4"}
+    for name, macro in macros.items():
+        pattern, expansion = macro["pattern"], macro["expansion"][0]
+        values = {key: value for key, value in sample.items() if "{" + key + ":" in pattern}
+        values.update({key: str(eval(expression, {}, dict(values))) for key, expression in macro["process"].items()})
+
+        address = lambda text: re.search(r"ram\[(.*?)\](?=,|$)", text)[1]
+        matched = parse_address(re.sub(r"\{(\w+):\w+\}", lambda m: sample[m[1]], address(pattern)))
+        expanded = parse_address(address(expansion.format(**values)).replace("+ -", "- "))
+        if matched != expanded:
+            raise AssertionError(f"{name}: {pattern} addresses {matched}, but expands to {expanded}")
 
 gen_all(gen_macro_load)
 gen_all(gen_macro_store)
 
+check_address_macros(base["CPU"]["MACROS"])
+
 base["CPU"]["MACROS"].update({f"store index 0":{ "pattern": "mov ram[reg[{ptr:token}] + 0*reg[8]+{offset:token}], reg[{dst:token}]", "process": {}, "expansion":["mov ram[reg[{ptr}] + {offset}], reg[{dst}]"]}})
 base["CPU"]["MACROS"].update({f"load index 0": { "pattern": "mov reg[{dst:token}], ram[reg[{ptr:token}]+0*reg[8] + {offset:token}]", "process": {}, "expansion":["mov reg[{dst}], ram[reg[{ptr}] + {offset}]"]}})
 
@@ -740,7 +797,7 @@ IOSCHEM="""
 """
 
 def add_io(name, is_load, address):
-    formated = decoder.decode(IOSCHEM.format(name=name, ls = 4 if is_load else 2, address=address))
+    formated = decoder.decode(IOSCHEM.format(name=name, ls = 5 if is_load else 7, address=address)) # store / load ptr imm
     base["CPU"]["COMMANDS"].update(formated)
 
 add_io("print", True, 0x0005)
@@ -751,8 +808,42 @@ add_io("tim set", True, 0x0002)
 add_io("tim get", False, 0x0002)
 add_io("tim state set", True, 0x0003)
 add_io("tim state get", False, 0x0003)
-add_io("gpu status", True, 0x000c)
-add_io("gpu invoke", False, 0x000d)
+add_io("gpu status", False, 0x000c)
+add_io("gpu invoke", True, 0x000d)
+
+#
+# cycle costs
+#
+# Cost of command is taken from "commands" (by profile command name, e.g. "branch jne "), 
+# then from "layouts" (by command layout), then "default". Changing pc costs additional "branch_taken" cycles
+base["CPU"]["CYCLES"] = {
+    "default": 1,
+    "branch_taken": 1,
+    "layouts": {
+        "indirect": 2,
+        "indirectlsh": 2,
+        "other": 2
+    },
+    "commands": {
+        "call": 2,
+        "mul": 2,
+        "mul const": 2,
+        "fadd": 3,
+        "fsub": 3,
+        "fmul": 4,
+        "fdiv": 8,
+        "ftoi": 2,
+        "itof": 2,
+        "utof": 2
+    }
+}
 
 with open('profiles/potados/potados.jsonc', 'w') as f:
     json.dump(base, f, indent=4)
+
+# compiled profile (parsed profile pickled with hash of the json above) for fast startup
+import sys
+import os
+sys.path.append(os.getcwd())
+from potados_emulator import compile_profile
+compile_profile()
@@ -0,0 +1,295 @@
+if __name__ == "__main__":
+    import sys
+    import os
+    sys.path.append(os.getcwd())
+
+import typing
+import os
+import gzip
+import json
+import struct
+import numpy as np
+import core.error as error
+from potados_emulator import PROFILE_PATH
+
+# Rom export into Minecraft schematic (Sponge format) described by `SCHEMATIC` section of profile. Bits of every word
+# are placed over `potados_blank.schem` as `high` (1) / `low` (0) blocks at positions given by nested `layout`.
+# The same layout is used to read words back from built schematic - to verify it against source or to load it into rom.
+
+#######
+# NBT #
+#######
+# Tags are kept as (tag id, value) so file can be written back unchanged. Compound is dict of name -> (tag, value),
+# list is (element tag, [values]), arrays are numpy arrays
+
+TAG_END, TAG_BYTE, TAG_SHORT, TAG_INT, TAG_LONG, TAG_FLOAT, TAG_DOUBLE = 0, 1, 2, 3, 4, 5, 6
+TAG_BYTE_ARRAY, TAG_STRING, TAG_LIST, TAG_COMPOUND, TAG_INT_ARRAY, TAG_LONG_ARRAY = 7, 8, 9, 10, 11, 12
+
+NBT_SCALARS = {TAG_BYTE: '>b', TAG_SHORT: '>h', TAG_INT: '>i', TAG_LONG: '>q', TAG_FLOAT: '>f', TAG_DOUBLE: '>d'}
+NBT_ARRAYS = {TAG_BYTE_ARRAY: 'u1', TAG_INT_ARRAY: '>i4', TAG_LONG_ARRAY: '>i8'}
+
+class NBT_READER:
+    def __init__(self, data: bytes) -> None:
+        self.data = data
+        self.pos = 0
+
+    def unpack(self, fmt: str) -> typing.Any:
+        value, = struct.unpack_from(fmt, self.data, self.pos)
+        self.pos += struct.calcsize(fmt)
+        return value
+
+    def string(self) -> str:
+        length = self.unpack('>H')
+        self.pos += length
+        return self.data[self.pos - length:self.pos].decode('utf-8')
+
+    def payload(self, tag: int) -> typing.Any:
+        if tag in NBT_SCALARS:
+            return self.unpack(NBT_SCALARS[tag])
+        if tag in NBT_ARRAYS:
+            length = self.unpack('>i')
+            dtype = np.dtype(NBT_ARRAYS[tag])
+            array = np.frombuffer(self.data, dtype=dtype, count=length, offset=self.pos).copy()
+            self.pos += length * dtype.itemsize
+            return array
+        if tag == TAG_STRING:
+            return self.string()
+        if tag == TAG_LIST:
+            element, length = self.unpack('>b'), self.unpack('>i')
+            return (element, [self.payload(element) for _ in range(length)])
+        if tag == TAG_COMPOUND:
+            compound = {}
+            while True:
+                child = self.unpack('>b')
+                if child == TAG_END:
+                    return compound
+                name = self.string()
+                compound[name] = (child, self.payload(child))
+        raise error.EmulationError(f'Unknown nbt tag {tag}')
+
+def read_nbt(path: str) -> typing.Tuple[str, dict]:
+    """Reads gzipped nbt file, returns name and contents of root compound"""
+    with gzip.open(path, 'rb') as f:
+        reader = NBT_READER(f.read())
+    if reader.unpack('>b') != TAG_COMPOUND:
+        raise error.EmulationError(f'"{path}" is not nbt file')
+    name = reader.string()
+    return name, reader.payload(TAG_COMPOUND)
+
+def pack_string(value: str) -> bytes:
+    encoded = value.encode('utf-8')
+    return struct.pack('>H', len(encoded)) + encoded
+
+def pack_nbt(tag: int, value: typing.Any) -> bytes:
+    if tag in NBT_SCALARS:
+        return struct.pack(NBT_SCALARS[tag], value)
+    if tag in NBT_ARRAYS:
+        return struct.pack('>i', len(value)) + np.asarray(value, dtype=NBT_ARRAYS[tag]).tobytes()
+    if tag == TAG_STRING:
+        return pack_string(value)
+    if tag == TAG_LIST:
+        element, values = value
+        return struct.pack('>bi', element, len(values)) + b''.join(pack_nbt(element, item) for item in values)
+    if tag == TAG_COMPOUND:
+        return b''.join(struct.pack('>b', child) + pack_string(name) + pack_nbt(child, item)
+                        for name, (child, item) in value.items()) + struct.pack('>b', TAG_END)
+    raise error.EmulationError(f'Unknown nbt tag {tag}')
+
+def write_nbt(path: str, name: str, root: dict):
+    with gzip.open(path, 'wb') as f:
+        f.write(struct.pack('>b', TAG_COMPOUND) + pack_string(name) + pack_nbt(TAG_COMPOUND, root))
+
+#############
+# schematic #
+#############
+
+def load_schematic_description() -> dict:
+    with open(PROFILE_PATH) as f:
+        return json.load(f)['CPU']['SCHEMATIC']
+
+def layout_coordinates(layout: dict) -> np.ndarray:
+    """
+    Positions of all bits of nested `layout` as array of shape (sizes of all levels..., 3), computed by broadcasting
+    `offset + index * stride` of every level. Vectors are (x, z, y) - order of axes in `BlockData` (width, length, height)
+    """
+    levels = []
+    while layout is not None:
+        levels.append(layout)
+        layout = layout['layout']
+
+    shape = [level['size'] for level in levels]
+    coordinates = np.zeros(shape + [3], dtype='int64')
+    for depth, level in enumerate(levels):
+        index = np.arange(level['size']).reshape([-1 if i == depth else 1 for i in range(len(levels))] + [1])
+        coordinates += np.asarray(level['offset']) + index * np.asarray(level['stride'])
+    return coordinates
+
+def layout_indices(layout: dict, width: int, length: int, height: int) -> np.ndarray:
+    """`BlockData` index of every bit as (words, bits) array - the innermost level of `layout` is word"""
+    coordinates = layout_coordinates(layout)
+    coordinates = coordinates.reshape(-1, coordinates.shape[-2], 3)
+    if np.any(coordinates < 0) or np.any(coordinates.max(axis=(0, 1)) >= (width, length, height)):
+        raise error.EmulationError(f'Schematic layout does not fit into schematic ({width}x{length}x{height})')
+    x, z, y = np.moveaxis(coordinates, -1, 0)
+    return (y * length + z) * width + x
+
+def decode_varints(data: np.ndarray) -> np.ndarray:
+    """Decodes `BlockData` (unsigned LEB128 varints) into palette ids, without python loop over blocks"""
+    data = np.asarray(data, dtype='uint8')
+    ends = np.flatnonzero(data < 0x80)
+    if len(ends) == len(data):
+        return data.astype('int64')
+    if len(ends) == 0 or ends[-1] != len(data) - 1:
+        raise error.EmulationError('Block data ends in the middle of varint')
+
+    starts = np.concatenate(([0], ends[:-1] + 1))
+    shift = 7 * (np.arange(len(data)) - np.repeat(starts, ends - starts + 1))
+    return np.add.reduceat((data & 0x7F).astype('int64') << shift, starts)
+
+class SCHEMATIC_EXPORTER:
+    """
+    Writes rom (`{address: word}`, array of words or emulator) into copy of blank schematic. Block indices of all bits
+    are computed once, so export is one numpy `where` over (words, bits) plus gzip of block data.
+    Last export is remembered - `diff=True` writes schematic with only blocks that changed since then
+    (everything else is air, so it can be pasted over the old one with `//paste -a`).
+    Bit 0 (lsb) of word is at the first position of the innermost level.
+    """
+    def __init__(self, description: typing.Optional[dict] = None, blank: typing.Optional[str] = None) -> None:
+        self.description = load_schematic_description() if description is None else description
+        blank = self.description['blank'] if blank is None else blank
+        if not os.path.isabs(blank):
+            blank = os.path.join(os.path.dirname(PROFILE_PATH), blank)
+
+        self.name, self.root = read_nbt(blank)
+        width, length, height = (self.root[axis][1] for axis in ('Width', 'Length', 'Height'))
+
+        self.indices = layout_indices(self.description['layout'], width, length, height)
+        self.words, self.bits = self.indices.shape
+
+        self.high = self.block_id(self.description['high'])
+        self.low = self.block_id(self.description['low'])
+        self.air = self.block_id('minecraft:air')
+
+        self.data = self.root['BlockData'][1]
+        if self.data.size != width * length * height:
+            raise error.EmulationError('Block data of blank schematic uses multi-byte varints, it is not supported')
+        self.exported: typing.Optional[np.ndarray] = None # block ids at bit positions of last export
+
+        # nbt around block data is serialized once - export only streams block data in between
+        root = dict(self.root)
+        root['BlockData'] = (TAG_BYTE_ARRAY, np.zeros(0, dtype='uint8'))
+        serialized = struct.pack('>b', TAG_COMPOUND) + pack_string(self.name) + pack_nbt(TAG_COMPOUND, root)
+        marker = struct.pack('>b', TAG_BYTE_ARRAY) + pack_string('BlockData') + struct.pack('>i', 0)
+        split = serialized.index(marker) + len(marker) - 4
+        self.head, self.tail = serialized[:split] + struct.pack('>i', self.data.size), serialized[split + 4:]
+
+    def block_id(self, block: str) -> int:
+        """Palette id of `block`, it is added to palette if missing (ids have to fit in single varint byte)"""
+        palette = self.root['Palette'][1]
+        if block not in palette:
+            palette[block] = (TAG_INT, len(palette))
+            self.root['PaletteMax'] = (TAG_INT, len(palette))
+        block_id = palette[block][1]
+        if block_id >= 0x80:
+            raise error.EmulationError(f'Palette id of "{block}" does not fit into one byte')
+        return block_id
+
+    def rom_words(self, rom: typing.Union[dict, np.ndarray, typing.Any]) -> np.ndarray:
+        """Words of schematic rom, raises if `rom` has words outside of it (zeros past its end are `nop` fill)"""
+        words = np.zeros(self.words, dtype='uint32')
+        if isinstance(rom, dict):
+            addresses = np.fromiter(rom.keys(), dtype='int64', count=len(rom))
+            values = np.fromiter(rom.values(), dtype='uint32', count=len(rom))
+            outside = (addresses < 0) | (addresses >= self.words)
+            if outside.any():
+                raise error.EmulationError(f'Program does not fit into schematic, address {int(addresses[outside][0])}')
+            words[addresses] = values
+        else:
+            while hasattr(rom, 'rom'): # emulator -> ROM -> array
+                rom = rom.rom
+            rom = np.asarray(rom, dtype='uint32')
+            if rom[self.words:].any():
+                raise error.EmulationError(f'Program does not fit into schematic, address {self.words + int(np.flatnonzero(rom[self.words:])[0])}')
+            words[:min(len(rom), self.words)] = rom[:self.words]
+        return words
+
+    def blocks(self, rom: typing.Union[dict, np.ndarray, typing.Any]) -> np.ndarray:
+        """Block id of every bit of rom as (words, bits) array"""
+        bits = (self.rom_words(rom)[:, None] >> np.arange(self.bits, dtype='uint32')) & 1
+        return np.where(bits.astype(bool), np.uint8(self.high), np.uint8(self.low))
+
+    def export(self, rom: typing.Union[dict, np.ndarray, typing.Any], path: str, diff: bool = False) -> int:
+        """Writes `rom` as schematic into `path`, returns number of blocks that changed since last export"""
+        blocks = self.blocks(rom)
+        changed = np.ones(blocks.shape, dtype=bool) if self.exported is None else blocks != self.exported
+        self.data[self.indices[changed]] = blocks[changed]
+        self.exported = blocks
+
+        if diff:
+            data = np.full(self.data.shape, self.air, dtype='uint8')
+            data[self.indices[changed]] = blocks[changed]
+        else:
+            data = self.data
+
+        with gzip.open(path, 'wb', compresslevel=6) as f:
+            f.write(self.head)
+            f.write(data.tobytes())
+            f.write(self.tail)
+        return int(changed.sum())
+
+class SCHEMATIC_IMPORTER:
+    """
+    Reads words back from schematic (e.g. exported from the world) using the same layout. Block data is decoded 
+    and gathered for all bits at once. Bits with block other than `high` / `low` (missing or foreign blocks) are 
+    marked in `invalid`
+    """
+    def __init__(self, path: str, description: typing.Optional[dict] = None) -> None:
+        self.description = load_schematic_description() if description is None else description
+        _, root = read_nbt(path)
+        blocks = root['Blocks'][1] if 'Blocks' in root else root # version 3 keeps palette and data in `Blocks`
+        data_name = 'Data' if 'Blocks' in root else 'BlockData'
+        width, length, height = (root[axis][1] for axis in ('Width', 'Length', 'Height'))
+
+        palette = {name: value for name, (_, value) in blocks['Palette'][1].items()}
+        ids = decode_varints(blocks[data_name][1])
+        if len(ids) != width * length * height:
+            raise error.EmulationError(f'Schematic "{path}" has {len(ids)} blocks, expected {width * length * height}')
+
+        indices = layout_indices(self.description['layout'], width, length, height)
+        found = ids[indices]
+        high = found == palette.get(self.description['high'], -1)
+        self.invalid: np.ndarray = ~high & (found != palette.get(self.description['low'], -1))
+        self.words: np.ndarray = (high.astype('uint32') << np.arange(indices.shape[1], dtype='uint32')).sum(axis=1, dtype='uint32')
+
+    def invalid_words(self) -> np.ndarray:
+        """Addresses of words with at least one missing / foreign block"""
+        return np.flatnonzero(self.invalid.any(axis=1))
+
+    def verify(self, program: typing.Union[dict, np.ndarray]) -> typing.Dict[int, typing.Tuple[int, typing.Optional[int]]]:
+        """
+        Compares built words with assembled `program` (`{address: word}` or array, missing addresses are `nop`).
+        Returns `{address: (expected, built)}` of every difference, built is None if word has invalid blocks
+        """
+        expected = np.zeros(len(self.words), dtype='uint32')
+        if isinstance(program, dict):
+            for address, word in program.items():
+                if address >= len(expected):
+                    raise error.EmulationError(f'Program does not fit into schematic, address {address}')
+                expected[address] = word
+        else:
+            program = np.asarray(program, dtype='uint32')
+            expected[:len(program)] = program[:len(expected)]
+
+        invalid = self.invalid.any(axis=1)
+        differences = np.flatnonzero((expected != self.words) | invalid)
+        return {int(address): (int(expected[address]), None if invalid[address] else int(self.words[address])) 
+                for address in differences}
+
+    def load(self, potados: typing.Any):
+        """Loads words into rom of `potados` (emulator or `BatchPotados`), rest of rom is cleared"""
+        bad = self.invalid_words()
+        if len(bad):
+            raise error.EmulationError(f'Schematic has missing or foreign blocks in words {bad[:8].tolist()}')
+        rom = np.zeros(len(potados.rom.rom), dtype='uint32')
+        rom[:len(self.words)] = self.words[:len(rom)]
+        potados.rom.load(rom)
@@ -0,0 +1,130 @@
+if __name__ == "__main__":
+    import sys
+    import os
+    sys.path.append(os.getcwd())
+
+import os
+import gzip
+import struct
+import tempfile
+import unittest
+import numpy as np
+import core.error as error
+from potados_emulator import POTADOS_EMULATOR
+from potados_schematic import (SCHEMATIC_EXPORTER, SCHEMATIC_IMPORTER, TAG_COMPOUND, TAG_INT, layout_coordinates, 
+                               decode_varints, read_nbt, write_nbt, pack_nbt, pack_string)
+
+# To pulloff tests just run
+# python -m unittest profiles\potados_schematic_test.py
+# from \Lord-s-asm-for-mc\
+
+class SCHEMATIC_TESTS(unittest.TestCase):
+    def test_nbt_round_trip(self):
+        exporter = SCHEMATIC_EXPORTER()
+        blank = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'potados_blank.schem')
+        name, root = read_nbt(blank)
+        with gzip.open(blank, 'rb') as f:
+            self.assertEqual(f.read(), struct.pack('>b', TAG_COMPOUND) + pack_string(name) + pack_nbt(TAG_COMPOUND, root))
+
+        # every bit position of layout holds `low` block in blank schematic
+        self.assertTrue(np.all(root['BlockData'][1][exporter.indices] == exporter.low))
+        self.assertEqual(exporter.indices.shape, (1024, 22))
+        self.assertEqual(len(np.unique(exporter.indices)), 1024 * 22)
+
+    def test_layout_coordinates(self):
+        coordinates = layout_coordinates({'offset': [1, 0, 0], 'stride': [0, 0, 6], 'size': 2,
+                                          'layout': {'offset': [0, 0, 0], 'stride': [0, 2, 0], 'size': 3, 'layout': None}})
+        self.assertEqual(coordinates.tolist(), [[[1, 0, 0], [1, 2, 0], [1, 4, 0]], [[1, 0, 6], [1, 2, 6], [1, 4, 6]]])
+
+    def test_export(self):
+        exporter = SCHEMATIC_EXPORTER()
+        rom = {0: 0b1, 33: 0b1011, 1023: (1 << 22) - 1}
+
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'rom.schem')
+            self.assertEqual(exporter.export(rom, path), 1024 * 22)
+
+            _, root = read_nbt(path)
+            self.assertEqual(root['Palette'][1][exporter.description['high']][1], exporter.high)
+            self.assertEqual(root['PaletteMax'][1], len(root['Palette'][1]))
+
+            width, length = root['Width'][1], root['Length'][1]
+            data = root['BlockData'][1].reshape(root['Height'][1], length, width)
+            # word 33 is in the second floor (y = 6), second column (x = 3), lsb first along z
+            self.assertEqual([data[6, 2 * bit, 3] == exporter.high for bit in range(5)], [True, True, False, True, False])
+            self.assertEqual(int((root['BlockData'][1] == exporter.high).sum()), 1 + 3 + 22)
+
+            # only changed blocks are written, rest is air
+            rom[33] = 0b0011
+            rom[2] = 0b100
+            self.assertEqual(exporter.export(rom, path, diff=True), 2)
+            _, root = read_nbt(path)
+            blocks = root['BlockData'][1]
+            self.assertEqual(int((blocks != exporter.air).sum()), 2)
+            self.assertEqual(blocks[exporter.indices[33, 3]], exporter.low)
+            self.assertEqual(blocks[exporter.indices[2, 2]], exporter.high)
+
+            # full export keeps previous state
+            exporter.export(rom, path)
+            _, root = read_nbt(path)
+            self.assertEqual(int((root['BlockData'][1] == exporter.high).sum()), 1 + 2 + 1 + 22)
+
+            # words outside of schematic rom are never dropped
+            for program in ({5000: 1}, {-1: 1}, np.ones(1025, dtype='uint32')):
+                with self.assertRaises(error.EmulationError):
+                    exporter.export(program, path)
+            rom = np.zeros(4096, dtype='uint32') # rom of bigger emulator, rest is nop
+            rom[1023] = 1
+            exporter.export(rom, path)
+
+    def test_decode_varints(self):
+        self.assertEqual(decode_varints(np.array([1, 0, 127], dtype='uint8')).tolist(), [1, 0, 127])
+        self.assertEqual(decode_varints(np.array([0x80, 0x01, 5, 0xFF, 0x7F, 0x81, 0x80, 0x01], dtype='uint8')).tolist(), 
+                         [128, 5, 16383, 16385])
+
+    def test_import(self):
+        exporter = SCHEMATIC_EXPORTER()
+        rom = np.random.default_rng(1).integers(0, 1 << 22, 1024, dtype='uint32')
+
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'rom.schem')
+            exporter.export(rom, path)
+
+            imported = SCHEMATIC_IMPORTER(path)
+            self.assertTrue(np.array_equal(imported.words, rom))
+            self.assertEqual(imported.verify(rom), {})
+
+            program = {address: int(word) for address, word in enumerate(rom[:10])}
+            program[3] ^= 0b100
+            differences = imported.verify(program)
+            self.assertEqual(differences[3], (program[3], int(rom[3])))
+            self.assertEqual(sorted(differences), [3] + list(range(10, 1024))) # rest of program is nop
+
+            potados = POTADOS_EMULATOR()
+            imported.load(potados)
+            self.assertTrue(np.array_equal(potados.rom.rom, rom))
+
+            # missing block (air) and block ids in multi-byte varints
+            name, root = read_nbt(path)
+            blocks = root['BlockData'][1]
+            blocks[exporter.indices[7, 21]] = exporter.air
+            palette = root['Palette'][1]
+            for i in range(200):
+                palette[f'minecraft:filler_{i}'] = (TAG_INT, len(palette))
+            palette[exporter.description['high']], palette['minecraft:filler_199'] = palette['minecraft:filler_199'], palette[exporter.description['high']]
+            high = palette[exporter.description['high']][1]
+            self.assertGreater(high, 0x7F)
+            encoded = [bytes([value]) if value != exporter.high else bytes([0x80 | (high & 0x7F), high >> 7]) for value in blocks.tolist()]
+            root['BlockData'] = (root['BlockData'][0], np.frombuffer(b''.join(encoded), dtype='uint8'))
+            write_nbt(path, name, root)
+
+            imported = SCHEMATIC_IMPORTER(path)
+            self.assertEqual(imported.invalid_words().tolist(), [7])
+            self.assertEqual(imported.verify(rom), {7: (int(rom[7]), None)})
+            self.assertTrue(np.array_equal(np.delete(imported.words, 7), np.delete(rom, 7)))
+            with self.assertRaises(error.EmulationError):
+                imported.load(potados)
+
+
+if __name__ == "__main__":
+    unittest.main()